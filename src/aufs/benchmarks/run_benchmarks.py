@@ -0,0 +1,331 @@
+# src/aufs/benchmarks/run_benchmarks.py
+"""
+Times the main aufs entry points against a synthetic job tree and compares each run with a baseline.
+
+    python src/aufs/benchmarks/run_benchmarks.py --scale medium --save-baseline
+    python src/aufs/benchmarks/run_benchmarks.py --scale medium --fail-on-regression
+
+Every case runs in its own Python process, so the peak RSS it reports is its own. Trees and
+other inputs are kept in the work directory and reused while their config doesn't change.
+"""
+
+import os
+import sys
+import ast
+import json
+import time
+import uuid
+import hashlib
+import platform
+import argparse
+import textwrap
+import subprocess
+import tempfile
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak RSS is reported as None there
+    resource = None
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_path = os.path.join(current_dir, '..', '..', '..')
+sys.path.insert(0, src_path)
+
+from src.aufs.benchmarks.synthetic_trees import TREE_SCALES, tree_config, build_synthetic_tree, iter_synthetic_files
+
+DEFAULT_WORKDIR = os.path.join(tempfile.gettempdir(), 'aufs_benchmarks')
+DEFAULT_BASELINE = os.path.expanduser('~/.aufs/benchmarks/baseline.json')
+# A case regresses when it's this much slower, or uses this much more memory, than the baseline
+DEFAULT_TOLERANCE = 0.2
+# Scrape snapshots written to start/ for the dedup case, each re-scraping most of the tree
+DEDUP_SNAPSHOTS = 4
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if platform.system() == 'Darwin' else 1024), 1)
+
+def tree_root(workdir, config):
+    return os.path.join(workdir, 'tree')
+
+def synthetic_file_paths(workdir, config):
+    root = tree_root(workdir, config)
+    return [os.path.join(root, relative_path).replace('\\', '/')
+            for relative_path, kind in iter_synthetic_files(config) if kind != 'excluded']
+
+# Each case does its own setup and returns (items processed, seconds for the timed part only)
+
+def case_scrape(workdir, config):
+    from src.aufs.user_tools.fs_meta.parquet_get_fs_data_for_source import FileSystemScraper
+
+    root = tree_root(workdir, config)
+    start = time.perf_counter()
+    df = FileSystemScraper().scrape_directories([root])
+    return len(df), time.perf_counter() - start
+
+def case_sequence_info(workdir, config):
+    from src.aufs.user_tools.fs_meta.parquet_tools import sequenceWork
+
+    df = pd.DataFrame({'FILE': synthetic_file_paths(workdir, config)})
+    start = time.perf_counter()
+    sequenceWork.add_sequence_info_v4(df)
+    return len(df), time.perf_counter() - start
+
+def case_seqs_tidyup(workdir, config):
+    from src.aufs.user_tools.fs_meta.parquet_tools import sequenceWork
+    from src.aufs.user_tools.fs_meta.sequences import seqs_tidyup_v2
+
+    df = pd.DataFrame({'FILE': synthetic_file_paths(workdir, config)})
+    df['FILESIZE'] = '1024'
+    df['CREATION_TIME'] = '2024-01-01 12:00:00'
+    df = sequenceWork.add_sequence_info_v4(df).astype(str)
+    rows = len(df)
+    start = time.perf_counter()
+    seqs_tidyup_v2(df)
+    return rows, time.perf_counter() - start
+
+def write_dedup_start_files(start_dir, config, paths):
+    """
+    Writes DEDUP_SNAPSHOTS scrapes of the tree to start_dir as source_main Parquet files. Later
+    snapshots drop some files and add new versions of others, like repeated scrapes of a live job.
+    """
+    marker_path = os.path.join(start_dir, '.dedup_config.json')
+    if os.path.exists(marker_path):
+        with open(marker_path, 'r') as f:
+            if json.load(f) == config:
+                return
+    os.makedirs(start_dir, exist_ok=True)
+    for name in os.listdir(start_dir):
+        os.remove(os.path.join(start_dir, name))
+
+    for snapshot in range(DEDUP_SNAPSHOTS):
+        snapshot_paths = [path for index, path in enumerate(paths) if (index + snapshot) % 10]
+        entry_time = pd.Timestamp('2024-01-01') + pd.Timedelta(days=snapshot)
+        df = pd.DataFrame({
+            'FILE': snapshot_paths,
+            'FILESIZE': [str((index * 7919 + snapshot) % 100000) for index in range(len(snapshot_paths))],
+            'HASHEDFILE': [hashlib.sha256(path.encode('utf-8')).hexdigest() for path in snapshot_paths],
+            'ENTRYTIME': entry_time,
+            'SCRAPEID': f'bench{snapshot}',
+        })
+        df.to_parquet(os.path.join(start_dir, f'source_main-{snapshot:03d}.parquet'), index=False)
+
+    with open(marker_path, 'w') as f:
+        json.dump(config, f)
+
+def case_dedup(workdir, config):
+    from src.aufs.user_tools.fs_meta.spark_tools import source_from_start_pandas_dedup
+
+    start_dir = os.path.join(workdir, 'start')
+    paths = synthetic_file_paths(workdir, config)
+    write_dedup_start_files(start_dir, config, paths)
+    start = time.perf_counter()
+    df = source_from_start_pandas_dedup(start_dir + os.sep)
+    return len(df), time.perf_counter() - start
+
+def case_arrow_dedup(workdir, config):
+    from src.aufs.user_tools.fs_meta.arrow_dedup import arrow_source_dedup
+
+    start_dir = os.path.join(workdir, 'start')
+    paths = synthetic_file_paths(workdir, config)
+    write_dedup_start_files(start_dir, config, paths)
+    start = time.perf_counter()
+    table = arrow_source_dedup(start_dir)
+    return table.num_rows, time.perf_counter() - start
+
+def load_generated_provisioner():
+    """
+    Returns the ParquetProvisioner class exactly as generate_provisioner_script_clean writes it,
+    without importing the Qt tool that generates it.
+    """
+    aufs_path = os.path.join(src_path, 'src', 'aufs', 'user_tools', 'aufs.py')
+    with open(aufs_path, 'r', encoding='utf-8') as f:
+        module = ast.parse(f.read())
+
+    for node in ast.walk(module):
+        if isinstance(node, ast.FunctionDef) and node.name == 'generate_provisioner_script_clean':
+            for statement in ast.walk(node):
+                if (isinstance(statement, ast.Assign) and isinstance(statement.value, ast.JoinedStr)
+                        and any(getattr(target, 'id', None) == 'provisioner_script' for target in statement.targets)):
+                    script = ''.join(part.value for part in statement.value.values if isinstance(part, ast.Constant))
+                    namespace = {'__name__': 'aufs_generated_provisioner'}
+                    exec(compile(textwrap.dedent(script), 'aufs_generated_provisioner', 'exec'), namespace)
+                    return namespace['ParquetProvisioner']
+    raise RuntimeError(f"Could not find the provisioner template in {aufs_path}")
+
+def write_provisioning_parquet(parquet_path, paths):
+    """
+    Writes a link-packaging style Parquet file whose metadata describes the directories of paths.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    uuid_dirname_mapping = {}
+    directory_tree = {}
+    for path in paths:
+        parent_uuid = None
+        directories = path.strip('/').split('/')[:-1]
+        for i, directory in enumerate(directories):
+            dir_uuid = str(uuid.uuid5(uuid.NAMESPACE_URL, '/'.join(directories[:i + 1])))
+            if dir_uuid not in uuid_dirname_mapping:
+                uuid_dirname_mapping[dir_uuid] = directory
+                if parent_uuid:
+                    directory_tree.setdefault(parent_uuid, []).append({"id": dir_uuid, "name": directory})
+            parent_uuid = dir_uuid
+
+    metadata = {
+        b'directory_tree': json.dumps(directory_tree).encode('utf-8'),
+        b'uuid_dirname_mapping': json.dumps(uuid_dirname_mapping).encode('utf-8'),
+        b'platform_scripts': json.dumps({}).encode('utf-8'),
+    }
+    schema = pa.schema([pa.field('DIRS', pa.string())], metadata=metadata)
+    pq.write_table(pa.table({'DIRS': pa.array([], pa.string())}, schema=schema), parquet_path)
+    return len(uuid_dirname_mapping)
+
+def case_provisioner(workdir, config):
+    import pyarrow.parquet as pq
+
+    ParquetProvisioner = load_generated_provisioner()
+    parquet_path = os.path.join(workdir, 'provisioning.parquet')
+    directories = write_provisioning_parquet(parquet_path, synthetic_file_paths(workdir, config))
+
+    provision_dir = tempfile.mkdtemp(prefix='provision_', dir=workdir)
+    original_directory = os.getcwd()
+    os.chdir(provision_dir)
+    try:
+        start = time.perf_counter()
+        provisioner = ParquetProvisioner(parquet_path)
+        # What run() does, minus executing the embedded platform script
+        metadata = pq.read_metadata(provisioner.parquet_path).metadata
+        provisioner.provision_schema(metadata)
+        return directories, time.perf_counter() - start
+    finally:
+        os.chdir(original_directory)
+
+BENCHMARK_CASES = {
+    'scrape': case_scrape,
+    'sequence_info': case_sequence_info,
+    'seqs_tidyup': case_seqs_tidyup,
+    'dedup': case_dedup,
+    'arrow_dedup': case_arrow_dedup,
+    'provisioner': case_provisioner,
+}
+
+def run_case_in_process(name, workdir, config):
+    """
+    Runs one case in this process and returns its result dict.
+    """
+    rss_before = peak_rss_mb()
+    items, seconds = BENCHMARK_CASES[name](workdir, config)
+    return {
+        'items': items,
+        'seconds': round(seconds, 4),
+        'items_per_second': round(items / seconds, 1) if seconds > 0 else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'setup_rss_mb': rss_before,
+    }
+
+def run_case(name, workdir, config):
+    """
+    Runs one case in a fresh Python process and returns its result dict, or one with an
+    'error' key if the case couldn't run (e.g. an optional dependency is missing).
+    """
+    command = [sys.executable, os.path.abspath(__file__), '--run-case', name, '--workdir', workdir,
+               '--config', json.dumps(config)]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith('{'):
+            return json.loads(line)
+    error = (completed.stderr.strip().splitlines() or ['no output'])[-1]
+    return {'error': error}
+
+def compare_to_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares results with a baseline.
+
+    Returns:
+        list of str: One line per regression, empty if there are none.
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous or 'error' in result or 'error' in previous:
+            continue
+        if previous['seconds'] and result['seconds'] > previous['seconds'] * (1 + tolerance):
+            regressions.append(f"{name}: {result['seconds']}s vs {previous['seconds']}s baseline")
+        if previous.get('peak_rss_mb') and result.get('peak_rss_mb') and \
+                result['peak_rss_mb'] > previous['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{name}: {result['peak_rss_mb']} MB peak RSS vs {previous['peak_rss_mb']} MB baseline")
+    return regressions
+
+def print_results(results, baseline):
+    print(f"{'case':<15}{'items':>10}{'seconds':>10}{'items/s':>12}{'peak MB':>10}{'vs baseline':>14}")
+    for name, result in results.items():
+        if 'error' in result:
+            print(f"{name:<15}  skipped: {result['error']}")
+            continue
+        previous = baseline.get(name, {})
+        change = ''
+        if previous.get('seconds'):
+            change = f"{(result['seconds'] / previous['seconds'] - 1) * 100:+.1f}%"
+        print(f"{name:<15}{result['items']:>10}{result['seconds']:>10.3f}{result['items_per_second'] or 0:>12.0f}"
+              f"{result['peak_rss_mb'] or 0:>10.1f}{change:>14}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark aufs against a synthetic job tree")
+    parser.add_argument('--scale', choices=sorted(TREE_SCALES), default='small', help="Size of the synthetic tree")
+    parser.add_argument('--cases', nargs='+', choices=sorted(BENCHMARK_CASES), default=list(BENCHMARK_CASES))
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR, help="Where the tree and other inputs are kept")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline json to compare with")
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run as the baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--fail-on-regression', action='store_true', help="Exit with 1 if any case regressed")
+    parser.add_argument('--output', help="Also write this run's results to a json file")
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    parser.add_argument('--config', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case_in_process(args.run_case, args.workdir, json.loads(args.config))))
+        return
+
+    config = tree_config(args.scale)
+    os.makedirs(args.workdir, exist_ok=True)
+    print(f"Building {args.scale} tree in {args.workdir}...")
+    counts = build_synthetic_tree(tree_root(args.workdir, config), config)
+    print(f"Tree: {counts}")
+
+    results = {name: run_case(name, args.workdir, config) for name in args.cases}
+
+    baseline_key = args.scale
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baselines = json.load(f)
+    baseline = baselines.get(baseline_key, {})
+
+    print_results(results, baseline)
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'scale': args.scale, 'tree': counts, 'results': results}, f, indent=2)
+
+    if args.save_baseline:
+        baselines[baseline_key] = {name: result for name, result in results.items() if 'error' not in result}
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.fail_on_regression and regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
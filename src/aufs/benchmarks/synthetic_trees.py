@@ -0,0 +1,144 @@
+# src/aufs/benchmarks/synthetic_trees.py
+
+import os
+import json
+import random
+import shutil
+
+# Sizes of synthetic job tree, roughly 2k, 60k and 1M files
+TREE_SCALES = {
+    'small': {'shots': 10, 'sequences_per_shot': 4, 'frames_per_sequence': 48},
+    'medium': {'shots': 50, 'sequences_per_shot': 6, 'frames_per_sequence': 200},
+    'large': {'shots': 200, 'sequences_per_shot': 10, 'frames_per_sequence': 500},
+}
+
+DEFAULT_TREE_CONFIG = {
+    'project': 'BENCH',
+    'shots': 10,
+    'sequences_per_shot': 4,
+    'frames_per_sequence': 48,
+    'missing_frame_rate': 0.02,     # Frames randomly left out, so sequences have gaps
+    'singles_per_shot': 6,          # Scripts, notes and other files that aren't sequences
+    'symlinks_per_shot': 2,         # Symlinked frames, plus one symlinked directory per shot
+    'excluded_dirs': 2,             # Folders matching SCRAPE_EXCLUDE_PATTERNS
+    'files_per_excluded_dir': 50,
+    'file_bytes': 0,
+    'seed': 1,
+}
+
+DEPARTMENTS = ['plates', 'comp', 'lighting', 'fx']
+EXTENSIONS = ['.exr', '.dpx', '.exr', '.tif']
+SINGLE_FILES = ['{shot}_comp_v{version:03d}.nk', 'notes_{index}.txt', 'Thumbs.db', '{shot}_track_v{version:03d}.3de',
+                'ref_{index}.mov', '{shot}_lookdev.ma~']
+# Relative to the tree root, matched by SCRAPE_EXCLUDE_PATTERNS
+EXCLUDED_DIRS = ['jobs/PROD/cache_{index}', 'jobs/IO/work/tmp_{index}', 'jobs/{project}/IO/from_client_{index}']
+
+def tree_config(scale='small', **overrides):
+    """
+    Returns a tree config for one of TREE_SCALES, with any keys in overrides replaced.
+    """
+    config = dict(DEFAULT_TREE_CONFIG)
+    config.update(TREE_SCALES[scale])
+    config.update(overrides)
+    return config
+
+def iter_synthetic_files(config):
+    """
+    Yields every file of the synthetic tree as (relative path, kind), where kind is 'frame',
+    'single' or 'excluded'. Symlinks aren't included, see iter_synthetic_symlinks.
+    The same config always gives the same files in the same order.
+    """
+    rng = random.Random(config['seed'])
+    project = config['project']
+
+    for shot_index in range(config['shots']):
+        shot = f"{project}_SH{(shot_index + 1) * 10:04d}"
+        shot_dir = f"jobs/{project}/shots/{shot}"
+
+        for seq_index in range(config['sequences_per_shot']):
+            department = DEPARTMENTS[seq_index % len(DEPARTMENTS)]
+            version = seq_index // len(DEPARTMENTS) + 1
+            extension = EXTENSIONS[seq_index % len(EXTENSIONS)]
+            element_dir = f"{shot_dir}/{department}/{shot}_{department}_v{version:03d}"
+            for frame in range(1001, 1001 + config['frames_per_sequence']):
+                if rng.random() < config['missing_frame_rate']:
+                    continue
+                yield f"{element_dir}/{shot}_{department}_v{version:03d}.{frame:04d}{extension}", 'frame'
+
+        for index in range(config['singles_per_shot']):
+            name = SINGLE_FILES[index % len(SINGLE_FILES)].format(shot=shot, version=index // len(SINGLE_FILES) + 1, index=index)
+            yield f"{shot_dir}/work/{name}", 'single'
+
+    for index in range(config['excluded_dirs']):
+        excluded_dir = EXCLUDED_DIRS[index % len(EXCLUDED_DIRS)].format(project=project, index=index)
+        for file_index in range(config['files_per_excluded_dir']):
+            yield f"{excluded_dir}/cache.{file_index:04d}.bgeo", 'excluded'
+
+def iter_synthetic_symlinks(config):
+    """
+    Yields (relative link path, relative target path) for the tree's symlinks: a few links to
+    frames of the first sequence in each shot, and one link to each shot's plates directory.
+    """
+    project = config['project']
+    for shot_index in range(config['shots']):
+        shot = f"{project}_SH{(shot_index + 1) * 10:04d}"
+        shot_dir = f"jobs/{project}/shots/{shot}"
+        plates_dir = f"{shot_dir}/plates/{shot}_plates_v001"
+        for index in range(config['symlinks_per_shot']):
+            frame = 1001 + index
+            yield f"{shot_dir}/links/{shot}_plate_link.{frame:04d}.exr", f"{plates_dir}/{shot}_plates_v001.{frame:04d}.exr"
+        if config['sequences_per_shot'] and config['symlinks_per_shot']:
+            yield f"{shot_dir}/links/plates_dir", plates_dir
+
+def build_synthetic_tree(root, config):
+    """
+    Creates the synthetic tree under root, reusing it if the same config was built there before.
+
+    Args:
+        root (str): Directory to build the tree in.
+        config (dict): A tree config, see tree_config.
+
+    Returns:
+        dict: Counts of the files, frames, singles, excluded files, symlinks and directories created.
+    """
+    marker_path = os.path.join(root, '.synthetic_tree.json')
+    if os.path.exists(marker_path):
+        with open(marker_path, 'r') as f:
+            marker = json.load(f)
+        if marker.get('config') == config:
+            return marker['counts']
+        shutil.rmtree(root)
+
+    counts = {'files': 0, 'frame': 0, 'single': 0, 'excluded': 0, 'symlinks': 0, 'directories': 0}
+    created_dirs = set()
+    content = b'x' * config['file_bytes']
+
+    def make_parent(path):
+        parent = os.path.dirname(path)
+        if parent not in created_dirs:
+            os.makedirs(parent, exist_ok=True)
+            created_dirs.add(parent)
+
+    for relative_path, kind in iter_synthetic_files(config):
+        path = os.path.join(root, relative_path)
+        make_parent(path)
+        with open(path, 'wb') as f:
+            f.write(content)
+        counts['files'] += 1
+        counts[kind] += 1
+
+    for relative_link, relative_target in iter_synthetic_symlinks(config):
+        link_path = os.path.join(root, relative_link)
+        make_parent(link_path)
+        target_path = os.path.join(root, relative_target)
+        try:
+            os.symlink(target_path, link_path, target_is_directory=os.path.isdir(target_path))
+            counts['symlinks'] += 1
+        except OSError as e:
+            # Windows without the symlink privilege
+            print(f"Could not create symlink {link_path}: {e}")
+
+    counts['directories'] = len(created_dirs)
+    with open(marker_path, 'w') as f:
+        json.dump({'config': config, 'counts': counts}, f)
+    return counts
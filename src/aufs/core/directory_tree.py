@@ -0,0 +1,371 @@
+# core/directory_tree.py
+
+import os
+import io
+import json
+import tempfile
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# The 'directory_tree' schema metadata is either the legacy JSON dict of
+# parent UUID -> [{"id", "name"}], or DIRECTORY_TREE_MAGIC, a version byte and
+# an Arrow IPC stream of the node table below.
+DIRECTORY_TREE_MAGIC = b'AUFSTREE'
+DIRECTORY_TREE_VERSION = 2
+# Rows per record batch, the unit iter_directory_tree_batches reads
+NODE_BATCH_ROWS = 65536
+
+# One row per directory, parents before children (breadth first):
+# ID is the directory's UUID, PARENT the row of its parent (-1 for a root),
+# NAME its name, dictionary encoded so every distinct name is stored once,
+# and DEPTH its distance from its root.
+NODE_SCHEMA = pa.schema([
+    pa.field('ID', pa.string()),
+    pa.field('PARENT', pa.int32()),
+    pa.field('NAME', pa.dictionary(pa.int32(), pa.string())),
+    pa.field('DEPTH', pa.int32()),
+])
+
+def is_encoded_directory_tree(value):
+    """
+    Returns True if a 'directory_tree' metadata value is in the encoded (v2+) format.
+    """
+    return value is not None and bytes(value[:len(DIRECTORY_TREE_MAGIC)]) == DIRECTORY_TREE_MAGIC
+
+def _node_stream(value):
+    """
+    Returns the Arrow IPC stream of an encoded 'directory_tree' value.
+    """
+    version = value[len(DIRECTORY_TREE_MAGIC)]
+    if version != DIRECTORY_TREE_VERSION:
+        raise ValueError(f"Unsupported directory tree version {version}, this reads version {DIRECTORY_TREE_VERSION}")
+    return pa.ipc.open_stream(pa.py_buffer(value)[len(DIRECTORY_TREE_MAGIC) + 1:])
+
+def iter_directory_tree_batches(value):
+    """
+    Streams the node table of an encoded 'directory_tree' value one record batch at a time,
+    so a traversal never holds more than NODE_BATCH_ROWS decoded rows. Parents come before
+    their children, so a batch's PARENT rows have all been seen by the time it's read.
+
+    :param value: The 'directory_tree' metadata value.
+    :return: Iterator of pa.RecordBatch with the NODE_SCHEMA columns.
+    """
+    if not is_encoded_directory_tree(value):
+        # Legacy JSON can't be streamed, it's converted whole
+        yield from DirectoryTree.from_metadata({b'directory_tree': value}).to_table().to_batches(NODE_BATCH_ROWS)
+        return
+    yield from _node_stream(value)
+
+class DirectoryTree:
+    """
+    A directory tree as flat arrays: each directory's UUID, the row of its parent, the index of
+    its name in an interned name table, and its depth. A directory's path is found by following
+    PARENT rows, and is cached, so looking up a path is O(1) once its parent's has been looked up.
+
+    UUIDs needn't be unique, e.g. the legacy trees derived them from names only, so the same
+    UUID can sit in several places. node_index finds the first.
+    """
+    def __init__(self, ids, parents, name_indices, names, depths=None):
+        """
+        :param ids: Directory UUIDs.
+        :param parents: Row of each directory's parent, -1 for roots. Parents must come first.
+        :param name_indices: Index into names of each directory's name, -1 for none.
+        :param names: The interned name table.
+        :param depths: Depth of each directory, computed if None.
+        """
+        self.ids = list(ids)
+        self.parents = np.asarray(parents, dtype=np.int32)
+        self.name_indices = np.asarray(name_indices, dtype=np.int32)
+        self.names = list(names)
+        self.depths = self._compute_depths() if depths is None else np.asarray(depths, dtype=np.int32)
+        self._index = None
+        self._children = None
+        self._paths = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _compute_depths(self):
+        depths = np.zeros(len(self.parents), dtype=np.int32)
+        for row, parent in enumerate(self.parents):
+            if parent >= row:
+                raise ValueError(f"Directory {row} comes before its parent {parent}")
+            if parent >= 0:
+                depths[row] = depths[parent] + 1
+        return depths
+
+    @classmethod
+    def from_nodes(cls, ids, parents, names):
+        """
+        Builds a tree from parallel lists, in any order as long as parents are resolvable.
+
+        :param ids: Directory UUIDs.
+        :param parents: Position in ids of each directory's parent, -1 (or None) for roots.
+        :param names: Directory names, None for none.
+        :return: DirectoryTree, in breadth-first order.
+        """
+        parents = [-1 if parent is None else parent for parent in parents]
+        depths = [None] * len(ids)
+        for row in range(len(ids)):
+            # Walk up to the first directory with a known depth
+            chain, current = [], row
+            while current >= 0 and depths[current] is None:
+                if len(chain) > len(ids):
+                    raise ValueError(f"Directory {ids[row]} is its own ancestor")
+                chain.append(current)
+                current = parents[current]
+            depth = -1 if current < 0 else depths[current]
+            for node in reversed(chain):
+                depth += 1
+                depths[node] = depth
+
+        order = sorted(range(len(ids)), key=lambda row: depths[row])
+        new_row = {old: new for new, old in enumerate(order)}
+        interned = {}
+        name_indices = [interned.setdefault(names[row], len(interned)) if names[row] is not None else -1 for row in order]
+        return cls([ids[row] for row in order],
+                   [new_row[parents[row]] if parents[row] >= 0 else -1 for row in order],
+                   name_indices, list(interned), [depths[row] for row in order])
+
+    @classmethod
+    def from_legacy(cls, directory_tree, uuid_dirname_mapping=None):
+        """
+        Converts the legacy JSON dict of parent UUID -> [{"id", "name"}].
+
+        Every UUID that isn't anyone's child is a root. A directory listed under several parents
+        is placed under each of them, subtree and all. Names come from uuid_dirname_mapping,
+        falling back to the child's own "name"; parents nobody names have none.
+
+        :param directory_tree: The legacy tree dict.
+        :param uuid_dirname_mapping: The schema's legacy UUID -> name dict.
+        :return: DirectoryTree
+        """
+        uuid_dirname_mapping = uuid_dirname_mapping or {}
+        child_names = {}
+        for children in directory_tree.values():
+            for child in children:
+                child_names.setdefault(child['id'], child.get('name'))
+        roots = [node_id for node_id in directory_tree if node_id not in child_names]
+
+        ids, parents, names = [], [], []
+        # Breadth first, with each row's ancestors so cycles can be cut
+        queue = [(root, -1, frozenset()) for root in roots]
+        position = 0
+        while position < len(queue):
+            node_id, parent, ancestors = queue[position]
+            position += 1
+            row = len(ids)
+            ids.append(node_id)
+            parents.append(parent)
+            names.append(uuid_dirname_mapping.get(node_id, child_names.get(node_id)))
+            ancestors = ancestors | {node_id}
+            for child in directory_tree.get(node_id, []):
+                if child['id'] not in ancestors:
+                    queue.append((child['id'], row, ancestors))
+        return cls.from_nodes(ids, parents, names)
+
+    @classmethod
+    def from_table(cls, table):
+        """
+        Builds a tree from a node table with the NODE_SCHEMA columns.
+        """
+        name_chunks = table.column('NAME').unify_dictionaries().chunks
+        if name_chunks:
+            name_indices = pa.concat_arrays([chunk.indices for chunk in name_chunks])
+            names = name_chunks[0].dictionary.to_pylist()
+        else:
+            name_indices, names = pa.array([], pa.int32()), []
+        return cls(table.column('ID').to_pylist(),
+                   table.column('PARENT').to_numpy(),
+                   name_indices.fill_null(-1).to_numpy(zero_copy_only=False),
+                   names,
+                   table.column('DEPTH').to_numpy())
+
+    @classmethod
+    def from_bytes(cls, value):
+        """
+        Decodes an encoded 'directory_tree' metadata value.
+        """
+        return cls.from_table(_node_stream(value).read_all())
+
+    @classmethod
+    def from_metadata(cls, metadata):
+        """
+        Loads the tree from a schema's metadata, in either format.
+
+        :param metadata: Schema metadata (dict of bytes -> bytes).
+        :return: DirectoryTree, or None if there's no 'directory_tree' in it.
+        """
+        if not metadata or b'directory_tree' not in metadata:
+            return None
+        value = metadata[b'directory_tree']
+        if is_encoded_directory_tree(value):
+            return cls.from_bytes(value)
+        mapping = metadata.get(b'uuid_dirname_mapping')
+        return cls.from_legacy(json.loads(value.decode('utf-8')),
+                               json.loads(mapping.decode('utf-8')) if mapping else None)
+
+    def to_table(self):
+        indices = pa.array(self.name_indices, pa.int32(), mask=self.name_indices < 0)
+        return pa.Table.from_arrays([
+            pa.array(self.ids, pa.string()),
+            pa.array(self.parents, pa.int32()),
+            pa.DictionaryArray.from_arrays(indices, pa.array(self.names, pa.string())),
+            pa.array(self.depths, pa.int32()),
+        ], schema=NODE_SCHEMA)
+
+    def to_bytes(self):
+        """
+        Encodes the tree as a 'directory_tree' metadata value.
+        """
+        options = pa.ipc.IpcWriteOptions(compression='zstd' if pa.Codec.is_available('zstd') else None)
+        sink = io.BytesIO()
+        sink.write(DIRECTORY_TREE_MAGIC + bytes([DIRECTORY_TREE_VERSION]))
+        with pa.ipc.new_stream(sink, NODE_SCHEMA, options=options) as writer:
+            for batch in self.to_table().to_batches(NODE_BATCH_ROWS):
+                writer.write_batch(batch)
+        return sink.getvalue()
+
+    def to_legacy(self):
+        """
+        Returns the legacy JSON dict of parent UUID -> [{"id", "name"}], each pair listed once.
+        """
+        directory_tree = {}
+        seen = set()
+        for row in range(len(self.ids)):
+            parent = self.parents[row]
+            if parent < 0:
+                continue
+            edge = (self.ids[parent], self.ids[row])
+            if edge in seen:
+                continue
+            seen.add(edge)
+            directory_tree.setdefault(self.ids[parent], []).append({"id": self.ids[row], "name": self.name(row)})
+        return directory_tree
+
+    def name(self, row):
+        index = self.name_indices[row]
+        return self.names[index] if index >= 0 else None
+
+    def node_index(self, node_id):
+        """
+        Returns the first row holding node_id, or None.
+        """
+        if self._index is None:
+            self._index = {}
+            for row, node in enumerate(self.ids):
+                self._index.setdefault(node, row)
+        return self._index.get(node_id)
+
+    def path(self, row, sep=os.sep):
+        """
+        Returns the path of the directory in row, its ancestors' names joined by sep.
+        Directories with no name, e.g. a tree_root placeholder, add nothing to it.
+        """
+        key = (row, sep)
+        if key in self._paths:
+            return self._paths[key]
+        # Walk up to the nearest ancestor whose path is known, then fill in the ones below it
+        chain, current = [], row
+        while current >= 0 and (current, sep) not in self._paths:
+            chain.append(current)
+            current = self.parents[current]
+        path = self._paths[(current, sep)] if current >= 0 else ''
+        for node in reversed(chain):
+            name = self.name(node)
+            if name is not None:
+                path = f"{path}{sep}{name}" if path else name
+            self._paths[(node, sep)] = path
+        return path
+
+    def path_of(self, node_id, sep=os.sep):
+        row = self.node_index(node_id)
+        return None if row is None else self.path(row, sep)
+
+    def children(self, row):
+        if self._children is None:
+            self._children = [[] for _ in self.ids]
+            for child, parent in enumerate(self.parents):
+                if parent >= 0:
+                    self._children[parent].append(child)
+        return self._children[row]
+
+    def roots(self):
+        return [int(row) for row in np.flatnonzero(self.parents < 0)]
+
+    def leaves(self):
+        has_children = np.zeros(len(self.ids), dtype=bool)
+        has_children[self.parents[self.parents >= 0]] = True
+        return [int(row) for row in np.flatnonzero(~has_children)]
+
+    def id_path(self, row, sep=os.sep):
+        """
+        Returns the UUIDs from the root down to row, joined by sep.
+        """
+        ids = []
+        while row >= 0:
+            ids.append(self.ids[row])
+            row = self.parents[row]
+        return sep.join(reversed(ids))
+
+def directory_tree_metadata(metadata):
+    """
+    Returns the legacy dict form of a schema's 'directory_tree', in either format,
+    or None if it has none.
+    """
+    tree = DirectoryTree.from_metadata(metadata)
+    return None if tree is None else tree.to_legacy()
+
+def convert_directory_tree_metadata(metadata, legacy=False):
+    """
+    Converts the 'directory_tree' in schema metadata between formats. Other keys are kept.
+
+    :param metadata: Schema metadata (dict of bytes -> bytes).
+    :param legacy: Convert to the legacy JSON format instead of the encoded one.
+    :return: The converted metadata.
+    """
+    tree = DirectoryTree.from_metadata(metadata)
+    if tree is None:
+        return dict(metadata or {})
+    metadata = dict(metadata)
+    if legacy:
+        metadata[b'directory_tree'] = json.dumps(tree.to_legacy()).encode('utf-8')
+    else:
+        metadata[b'directory_tree'] = tree.to_bytes()
+    return metadata
+
+def convert_parquet_directory_tree(file_path, output_path=None, legacy=False):
+    """
+    Rewrites a Parquet file with its 'directory_tree' converted, see convert_directory_tree_metadata.
+
+    :param file_path: The Parquet file.
+    :param output_path: Where to write it, file_path itself if None.
+    :param legacy: Convert to the legacy JSON format instead of the encoded one.
+    :return: The path written.
+    """
+    output_path = output_path or file_path
+    table = pq.read_table(file_path)
+    table = table.replace_schema_metadata(convert_directory_tree_metadata(table.schema.metadata, legacy))
+
+    # Written next to the output and renamed over it, so a failed write leaves the original alone
+    fd, temp_path = tempfile.mkstemp(suffix='.parquet', dir=os.path.dirname(os.path.abspath(output_path)))
+    os.close(fd)
+    try:
+        pq.write_table(table, temp_path)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    print(f"Converted directory tree of {file_path} to the {'legacy' if legacy else 'encoded'} format: {output_path}")
+    return output_path
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert the directory_tree metadata of AUFS Parquet files.")
+    parser.add_argument("files", nargs="+", help="Parquet files to convert in place")
+    parser.add_argument("--legacy", action="store_true", help="Convert back to the legacy JSON format")
+    args = parser.parse_args()
+    for path in args.files:
+        convert_parquet_directory_tree(path, legacy=args.legacy)
@@ -0,0 +1,180 @@
+# core/schema_layout.py
+
+import os
+import tempfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# AUFS Parquet files come in two layouts, told apart by the 'schema_layout' metadata:
+#
+# wide  - one string column per directory ("{parent_id}-{dir_id}-dir") and per linked
+#         file ("{name}-file", with HASHEDFILE field metadata). The platform scripts
+#         are the rows of the first column. Files without 'schema_layout' are wide.
+# nodes - a fixed, narrow set of columns with one row per wide column, see NODE_LAYOUT_SCHEMA.
+#
+# Both keep the same 'directory_tree', 'uuid_dirname_mapping' and 'platform_scripts'
+# metadata, and both hold the platform scripts in the first column, so the provisioners
+# read either one.
+SCHEMA_LAYOUT_KEY = b'schema_layout'
+WIDE_LAYOUT = 'wide'
+NODE_LAYOUT = 'nodes'
+# Rows of the wide table, which the node table may pad with nulls
+WIDE_ROWS_KEY = b'wide_rows'
+
+# SCRIPT holds the first wide column's values (the platform scripts). Every other column
+# describes one wide column per row: its name (FIELD), whether it's a 'dir' or a 'file'
+# (KIND), its HASHEDFILE field metadata, and its values if it has any (VALUES).
+NODE_LAYOUT_SCHEMA = pa.schema([
+    pa.field('SCRIPT', pa.string()),
+    pa.field('FIELD', pa.string()),
+    pa.field('KIND', pa.dictionary(pa.int8(), pa.string())),
+    pa.field('HASHEDFILE', pa.string()),
+    pa.field('VALUES', pa.list_(pa.string())),
+])
+
+def schema_layout(metadata):
+    """
+    Returns the layout of a file from its schema metadata, WIDE_LAYOUT or NODE_LAYOUT.
+    """
+    if metadata and SCHEMA_LAYOUT_KEY in metadata:
+        return metadata[SCHEMA_LAYOUT_KEY].decode('utf-8')
+    return WIDE_LAYOUT
+
+def field_kind(field_name):
+    if field_name.endswith('-dir'):
+        return 'dir'
+    if field_name.endswith('-file'):
+        return 'file'
+    return None
+
+def to_node_layout(table):
+    """
+    Converts a wide table to the node layout. Node tables are returned as they are.
+
+    :param table: A wide pa.Table of string columns.
+    :return: pa.Table in the node layout, with the same table metadata.
+    """
+    metadata = dict(table.schema.metadata or {})
+    if schema_layout(metadata) == NODE_LAYOUT:
+        return table
+    if table.num_columns == 0:
+        raise ValueError("A wide table needs at least one column to hold the platform scripts")
+
+    names, kinds, hashed_files, values = [], [], [], []
+    for index, field in enumerate(table.schema):
+        if not pa.types.is_string(field.type):
+            raise ValueError(f"Column {field.name} is {field.type}, only string columns can be converted")
+        field_metadata = field.metadata or {}
+        names.append(field.name)
+        kinds.append(field_kind(field.name))
+        hashed_files.append(field_metadata[b'HASHEDFILE'].decode('utf-8') if b'HASHEDFILE' in field_metadata else None)
+        column = table.column(index)
+        # The first column's values are the SCRIPT column, all-null columns are left empty
+        values.append(None if index == 0 or column.null_count == len(column) else column.to_pylist())
+
+    rows = max(table.num_rows, len(names))
+    def padded(items):
+        return list(items) + [None] * (rows - len(items))
+
+    node_table = pa.Table.from_arrays([
+        pa.array(padded(table.column(0).to_pylist()), pa.string()),
+        pa.array(padded(names), pa.string()),
+        pa.array(padded(kinds), pa.string()).dictionary_encode().cast(NODE_LAYOUT_SCHEMA.field('KIND').type),
+        pa.array(padded(hashed_files), pa.string()),
+        pa.array(padded(values), pa.list_(pa.string())),
+    ], schema=NODE_LAYOUT_SCHEMA)
+
+    metadata[SCHEMA_LAYOUT_KEY] = NODE_LAYOUT.encode('utf-8')
+    metadata[WIDE_ROWS_KEY] = str(table.num_rows).encode('utf-8')
+    return node_table.replace_schema_metadata(metadata)
+
+def wide_fields(table):
+    """
+    Returns the wide layout's fields of a table in either layout, without building the wide table.
+
+    :param table: pa.Table, or just its FIELD and HASHEDFILE columns for the node layout.
+    :return: list of pa.Field
+    """
+    if schema_layout(table.schema.metadata) != NODE_LAYOUT:
+        return list(table.schema)
+    fields = []
+    for name, hashed_file in zip(table.column('FIELD').to_pylist(), table.column('HASHEDFILE').to_pylist()):
+        if name is None:
+            # Padding below the last field
+            break
+        metadata = {'HASHEDFILE': hashed_file.encode('utf-8')} if hashed_file is not None else None
+        fields.append(pa.field(name, pa.string(), metadata=metadata))
+    return fields
+
+def to_wide_layout(table):
+    """
+    Converts a node table back to the wide layout. Wide tables are returned as they are.
+
+    :param table: pa.Table in either layout.
+    :return: pa.Table in the wide layout, with the same table metadata less the node layout's keys.
+    """
+    metadata = dict(table.schema.metadata or {})
+    if schema_layout(metadata) != NODE_LAYOUT:
+        return table
+
+    rows = int(metadata.pop(WIDE_ROWS_KEY, b'0'))
+    metadata.pop(SCHEMA_LAYOUT_KEY, None)
+    fields = wide_fields(table)
+    values = table.column('VALUES').to_pylist()
+
+    arrays = []
+    for index, field in enumerate(fields):
+        if index == 0:
+            arrays.append(table.column('SCRIPT').slice(0, rows).combine_chunks())
+        elif values[index] is not None:
+            arrays.append(pa.array(values[index], pa.string()))
+        else:
+            arrays.append(pa.nulls(rows, pa.string()))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields, metadata=metadata))
+
+def read_wide_fields(file_path):
+    """
+    Returns the wide layout's fields of a Parquet file in either layout, reading only what's needed.
+    """
+    parquet_file = pq.ParquetFile(file_path)
+    if schema_layout(parquet_file.schema_arrow.metadata) != NODE_LAYOUT:
+        return list(parquet_file.schema_arrow)
+    table = parquet_file.read(columns=['FIELD', 'HASHEDFILE'])
+    return wide_fields(table.replace_schema_metadata(parquet_file.schema_arrow.metadata))
+
+def convert_parquet_layout(file_path, layout=NODE_LAYOUT, output_path=None):
+    """
+    Rewrites a Parquet file in the given layout.
+
+    :param file_path: The Parquet file.
+    :param layout: NODE_LAYOUT or WIDE_LAYOUT.
+    :param output_path: Where to write it, file_path itself if None.
+    :return: The path written.
+    """
+    if layout not in (NODE_LAYOUT, WIDE_LAYOUT):
+        raise ValueError(f"Unknown schema layout {layout}")
+    output_path = output_path or file_path
+    table = pq.read_table(file_path)
+    table = to_node_layout(table) if layout == NODE_LAYOUT else to_wide_layout(table)
+
+    # Written next to the output and renamed over it, so a failed write leaves the original alone
+    fd, temp_path = tempfile.mkstemp(suffix='.parquet', dir=os.path.dirname(os.path.abspath(output_path)))
+    os.close(fd)
+    try:
+        pq.write_table(table, temp_path)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    print(f"Converted {file_path} to the {layout} layout: {output_path}")
+    return output_path
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert AUFS Parquet files between the wide and node schema layouts.")
+    parser.add_argument("files", nargs="+", help="Parquet files to convert in place")
+    parser.add_argument("--layout", choices=[NODE_LAYOUT, WIDE_LAYOUT], default=NODE_LAYOUT, help="Layout to convert to")
+    args = parser.parse_args()
+    for path in args.files:
+        convert_parquet_layout(path, args.layout)
@@ -14,6 +14,116 @@ import textwrap
 import stat
 import tempfile
 
+# Methods every generated provisioner shares, interpolated into the script templates below.
+# Each line carries the indentation it has in the templates, which textwrap.dedent then removes.
+PROVISIONER_SHARED_METHODS = """
+            def directory_paths(self, metadata):
+                # Every directory's path as a tuple of names, parents before children
+                value = metadata[b'directory_tree']
+                paths = []
+                if value.startswith(b'AUFSTREE'):
+                    if value[8] != 2:
+                        raise ValueError(f"Unsupported directory tree version {value[8]}")
+                    nodes = pa.ipc.open_stream(pa.py_buffer(value)[9:]).read_all()
+                    names = nodes.column('NAME').to_pylist()
+                    for row, parent in enumerate(nodes.column('PARENT').to_pylist()):
+                        parent_path = paths[parent] if parent >= 0 else ()
+                        paths.append(parent_path + (names[row],) if names[row] else parent_path)
+                else:
+                    # The JSON parent UUID -> children dict of schemas written before the tree was encoded
+                    directory_tree = json.loads(value.decode('utf-8'))
+                    uuid_dirname_mapping = json.loads(metadata.get(b'uuid_dirname_mapping', b'{}').decode('utf-8'))
+                    child_ids = {child['id'] for children in directory_tree.values() for child in children}
+                    queue = [(node_id, (), frozenset()) for node_id in directory_tree if node_id not in child_ids]
+                    position = 0
+                    while position < len(queue):
+                        node_id, parent_path, ancestors = queue[position]
+                        position += 1
+                        name = uuid_dirname_mapping.get(node_id)
+                        path = parent_path + (name,) if name else parent_path
+                        paths.append(path)
+                        for child in directory_tree.get(node_id, []):
+                            if child['id'] not in ancestors:
+                                queue.append((child['id'], path, ancestors | {node_id}))
+                return list(dict.fromkeys(path for path in paths if path))
+
+            def provision_paths(self, paths, base, max_workers=16):
+                # Creates the tree one depth level at a time, each level's calls spread over a few threads.
+                # An existing directory is listed once to find which of its children exist, and a
+                # missing one is made with a single mkdir, as its parent is known to exist by then.
+                children = {}
+                for path in paths:
+                    for depth in range(len(path)):
+                        children.setdefault(path[:depth], set()).add(path[depth])
+                counts = {'leaves': sum(1 for path in paths if path not in children), 'created': 0, 'existing': 0, 'failed': 0}
+                os.makedirs(base, exist_ok=True)
+
+                def list_directory(path):
+                    try:
+                        return set(os.listdir(os.path.join(base, *path)))
+                    except OSError:
+                        # Its children are tried with mkdir instead
+                        return None
+
+                def make_directory(path):
+                    try:
+                        os.mkdir(os.path.join(base, *path))
+                        return 'created'
+                    except FileExistsError:
+                        return 'existing'
+                    except OSError as e:
+                        print(f"Could not create {os.path.join(base, *path)}: {e}")
+                        return 'failed'
+
+                def descendants(path):
+                    stack, found = [path], 0
+                    while stack:
+                        parent = stack.pop()
+                        for name in children.get(parent, ()):
+                            found += 1
+                            stack.append(parent + (name,))
+                    return found
+
+                level = [((), 'existing')]
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    while level:
+                        to_list = [path for path, state in level if state == 'existing' and path in children]
+                        listings = dict(zip(to_list, executor.map(list_directory, to_list)))
+                        to_make, next_level = [], []
+                        for path, state in level:
+                            if path not in children:
+                                continue
+                            if state == 'failed':
+                                # Nothing below a directory that couldn't be made is tried
+                                counts['failed'] += descendants(path)
+                                continue
+                            listing = listings.get(path)
+                            for name in sorted(children[path]):
+                                if listing is not None and name in listing:
+                                    counts['existing'] += 1
+                                    next_level.append((path + (name,), 'existing'))
+                                else:
+                                    to_make.append(path + (name,))
+                        for path, state in zip(to_make, executor.map(make_directory, to_make)):
+                            counts[state] += 1
+                            next_level.append((path, state))
+                        level = next_level
+                return counts
+
+            def read_cell(self, row_index, column_index):
+                # Reads one value, decoding only the column chunk of the row group it's in
+                parquet_file = pq.ParquetFile(self.parquet_path)
+                column_name = parquet_file.metadata.schema.column(column_index).name
+                row_group_start = 0
+                for row_group in range(parquet_file.num_row_groups):
+                    row_group_rows = parquet_file.metadata.row_group(row_group).num_rows
+                    if row_index < row_group_start + row_group_rows:
+                        column = parquet_file.read_row_group(row_group, columns=[column_name]).column(0)
+                        return column[row_index - row_group_start].as_py()
+                    row_group_start += row_group_rows
+                raise IndexError(f"Row {row_index} is past the end of {self.parquet_path}")
+"""
+
 class AUFS(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -160,7 +270,9 @@ class AUFS(QMainWindow):
         import json
         import subprocess
         import platform
+        import pyarrow as pa
         import pyarrow.parquet as pq
+        from concurrent.futures import ThreadPoolExecutor
         import tkinter as tk
         from tkinter import simpledialog, filedialog, messagebox
 
@@ -172,8 +284,8 @@ class AUFS(QMainWindow):
                 self.mount_point = None
 
             def run(self):
-                parquet_table = pq.read_table(self.parquet_path)
-                metadata = parquet_table.schema.metadata
+                # Only the footer is read, not the columns
+                metadata = pq.read_metadata(self.parquet_path).metadata
 
                 if metadata:
                     self.get_user_credentials()
@@ -221,8 +333,28 @@ class AUFS(QMainWindow):
 
                 print(f"Selected mount point: {{self.mount_point}}")
 
+            def load_directory_tree(self, metadata):
+                # An Arrow node table behind b'AUFSTREE' and a version byte, or the JSON
+                # parent UUID -> children dict of schemas written before the tree was encoded
+                value = metadata[b'directory_tree']
+                if not value.startswith(b'AUFSTREE'):
+                    return json.loads(value.decode('utf-8'))
+                if value[8] != 2:
+                    raise ValueError(f"Unsupported directory tree version {{value[8]}}")
+                nodes = pa.ipc.open_stream(pa.py_buffer(value)[9:]).read_all()
+                ids = nodes.column('ID').to_pylist()
+                names = nodes.column('NAME').to_pylist()
+                directory_tree = {{}}
+                seen = set()
+                for row, parent in enumerate(nodes.column('PARENT').to_pylist()):
+                    if parent < 0 or (ids[parent], ids[row]) in seen:
+                        continue
+                    seen.add((ids[parent], ids[row]))
+                    directory_tree.setdefault(ids[parent], []).append({{"id": ids[row], "name": names[row]}})
+                return directory_tree
+
             def get_directory_tree_preview(self, metadata):
-                directory_tree = json.loads(metadata[b'directory_tree'].decode('utf-8'))
+                directory_tree = self.load_directory_tree(metadata)
                 uuid_dirname_mapping = json.loads(metadata[b'uuid_dirname_mapping'].decode('utf-8'))
                 tree_preview = ""
                 for parent_uuid, children in directory_tree.items():
@@ -243,25 +375,16 @@ class AUFS(QMainWindow):
                 return messagebox.askokcancel("Directory Tree Preview", message)
 
             def provision_schema(self, metadata):
-                directory_tree = json.loads(metadata[b'directory_tree'].decode('utf-8'))
-                uuid_dirname_mapping = json.loads(metadata[b'uuid_dirname_mapping'].decode('utf-8'))
-                for parent_uuid, children in directory_tree.items():
-                    parent_dir = uuid_dirname_mapping.get(parent_uuid)
-                    if not parent_dir:
-                        continue
-                    parent_dir_path = os.path.join(self.mount_point, parent_dir)  # Use selected mount point
-                    os.makedirs(parent_dir_path, exist_ok=True)
-                    for child in children:
-                        child_name = uuid_dirname_mapping.get(child["id"])
-                        if child_name:
-                            child_dir_path = os.path.join(parent_dir_path, child_name)
-                            os.makedirs(child_dir_path, exist_ok=True)
-
+                counts = self.provision_paths(self.directory_paths(metadata), self.mount_point)
+                print(f"Provisioned {{counts['leaves']}} leaf directories: {{counts['created']}} created, "
+                      f"{{counts['existing']}} already there, {{counts['failed']}} failed")
+                return counts
+            {PROVISIONER_SHARED_METHODS}
             def execute_platform_script(self, metadata, platform_key):
                 platform_scripts = json.loads(metadata.get(b'platform_scripts', '{{}}').decode('utf-8'))
                 if platform_key in platform_scripts:
                     row_index = int(platform_scripts[platform_key])
-                    script = pq.read_table(self.parquet_path).to_pandas().iloc[row_index, 0]
+                    script = self.read_cell(row_index, 0)
 
                     # Inject username, password, and mount point into the script
                     script = script.replace("UNAME", self.username).replace("PSSWD", self.password).replace("MNTPOINT", self.mount_point)
@@ -347,15 +470,17 @@ class AUFS(QMainWindow):
         import json
         import subprocess
         import platform
+        import pyarrow as pa
         import pyarrow.parquet as pq
+        from concurrent.futures import ThreadPoolExecutor
 
         class ParquetProvisioner:
             def __init__(self, parquet_path):
                 self.parquet_path = parquet_path
 
             def run(self):
-                parquet_table = pq.read_table(self.parquet_path)
-                metadata = parquet_table.schema.metadata
+                # Only the footer is read, not the columns
+                metadata = pq.read_metadata(self.parquet_path).metadata
 
                 if metadata:
                     self.provision_schema(metadata)
@@ -363,23 +488,16 @@ class AUFS(QMainWindow):
                     self.execute_platform_script(metadata, platform_key)
 
             def provision_schema(self, metadata):
-                directory_tree = json.loads(metadata[b'directory_tree'].decode('utf-8'))
-                uuid_dirname_mapping = json.loads(metadata[b'uuid_dirname_mapping'].decode('utf-8'))
-                for parent_uuid, children in directory_tree.items():
-                    parent_dir = uuid_dirname_mapping.get(parent_uuid)
-                    if not parent_dir:
-                        continue
-                    os.makedirs(parent_dir, exist_ok=True)
-                    for child in children:
-                        child_name = uuid_dirname_mapping.get(child["id"])
-                        if child_name:
-                            os.makedirs(child_name, exist_ok=True)
-
+                counts = self.provision_paths(self.directory_paths(metadata), os.getcwd())
+                print(f"Provisioned {{counts['leaves']}} leaf directories: {{counts['created']}} created, "
+                      f"{{counts['existing']}} already there, {{counts['failed']}} failed")
+                return counts
+            {PROVISIONER_SHARED_METHODS}
             def execute_platform_script(self, metadata, platform_key):
                 platform_scripts = json.loads(metadata.get(b'platform_scripts', '{{}}').decode('utf-8'))
                 if platform_key in platform_scripts:
                     row_index = int(platform_scripts[platform_key])
-                    script = pq.read_table(self.parquet_path).to_pandas().iloc[row_index, 0]
+                    script = self.read_cell(row_index, 0)
 
                     if platform.system().lower() == 'windows':
                         shell = 'powershell.exe'
@@ -497,7 +615,9 @@ class AUFS(QMainWindow):
         import json
         import subprocess
         import platform
+        import pyarrow as pa
         import pyarrow.parquet as pq
+        from concurrent.futures import ThreadPoolExecutor
         import tkinter as tk
         from tkinter import simpledialog, filedialog, messagebox
 
@@ -507,8 +627,8 @@ class AUFS(QMainWindow):
                 self.mount_point = None
 
             def run(self):
-                parquet_table = pq.read_table(self.parquet_path)
-                metadata = parquet_table.schema.metadata
+                # Only the footer is read, not the columns
+                metadata = pq.read_metadata(self.parquet_path).metadata
 
                 if metadata:
                     self.get_mount_point()  # Prompt user for the mount point
@@ -519,43 +639,18 @@ class AUFS(QMainWindow):
             {get_mount_point_method}
         
             def provision_schema(self, metadata):
-                directory_tree = json.loads(metadata[b'directory_tree'].decode('utf-8'))
-                uuid_dirname_mapping = json.loads(metadata[b'uuid_dirname_mapping'].decode('utf-8'))
-        
-                # Create a dictionary to track full paths to avoid duplications
-                full_paths = {{}}
-        
-                for parent_uuid, children in directory_tree.items():
-                    parent_dir = uuid_dirname_mapping.get(parent_uuid)
-        
-                    if not parent_dir:
-                        continue
-                    
-                    # Get or create the full path for the parent directory
-                    if parent_uuid not in full_paths:
-                        parent_dir_path = os.path.join(self.mount_point, parent_dir)
-                        full_paths[parent_uuid] = parent_dir_path
-                        os.makedirs(parent_dir_path, exist_ok=True)
-        
-                    # Now process the children directories
-                    for child in children:
-                        child_name = uuid_dirname_mapping.get(child["id"])
-        
-                        if child_name:
-                            # Build the full path for the child directory
-                            child_dir_path = os.path.join(full_paths[parent_uuid], child_name)
-                            full_paths[child["id"]] = child_dir_path
-                            os.makedirs(child_dir_path, exist_ok=True)
-        
-                    print(f"Processed {{parent_dir}} -> {{children}}")
-        
+                counts = self.provision_paths(self.directory_paths(metadata), self.mount_point)
+                print(f"Provisioned {{counts['leaves']}} leaf directories: {{counts['created']}} created, "
+                      f"{{counts['existing']}} already there, {{counts['failed']}} failed")
+                return counts
+            {PROVISIONER_SHARED_METHODS}
             def execute_platform_script(self, metadata, platform_key):
                 # Execute the platform-specific script after provisioning the directory structure.
                 
                 platform_scripts = json.loads(metadata.get(b'platform_scripts', '{{}}').decode('utf-8'))
                 if platform_key in platform_scripts:
                     row_index = int(platform_scripts[platform_key])
-                    script = pq.read_table(self.parquet_path).to_pandas().iloc[row_index, 0]
+                    script = self.read_cell(row_index, 0)
                     # Replace placeholder with the actual mount point
                     script = script.replace("MNTPOINT", self.mount_point)
                     print('Executing script:')
@@ -637,7 +732,9 @@ class AUFS(QMainWindow):
         import json
         import subprocess
         import platform
+        import pyarrow as pa
         import pyarrow.parquet as pq
+        from concurrent.futures import ThreadPoolExecutor
         import tkinter as tk
         from tkinter import simpledialog, messagebox
 
@@ -648,8 +745,8 @@ class AUFS(QMainWindow):
                 self.password = None
 
             def run(self):
-                parquet_table = pq.read_table(self.parquet_path)
-                metadata = parquet_table.schema.metadata
+                # Only the footer is read, not the columns
+                metadata = pq.read_metadata(self.parquet_path).metadata
 
                 if metadata:
                     self.get_user_credentials()
@@ -665,23 +762,16 @@ class AUFS(QMainWindow):
                 self.password = simpledialog.askstring("Password", "Enter your password:", show='*')
 
             def provision_schema(self, metadata):
-                directory_tree = json.loads(metadata[b'directory_tree'].decode('utf-8'))
-                uuid_dirname_mapping = json.loads(metadata[b'uuid_dirname_mapping'].decode('utf-8'))
-                for parent_uuid, children in directory_tree.items():
-                    parent_dir = uuid_dirname_mapping.get(parent_uuid)
-                    if not parent_dir:
-                        continue
-                    os.makedirs(parent_dir, exist_ok=True)
-                    for child in children:
-                        child_name = uuid_dirname_mapping.get(child["id"])
-                        if child_name:
-                            os.makedirs(child_name, exist_ok=True)
-
+                counts = self.provision_paths(self.directory_paths(metadata), os.getcwd())
+                print(f"Provisioned {{counts['leaves']}} leaf directories: {{counts['created']}} created, "
+                      f"{{counts['existing']}} already there, {{counts['failed']}} failed")
+                return counts
+            {PROVISIONER_SHARED_METHODS}
             def execute_platform_script(self, metadata, platform_key):
                 platform_scripts = json.loads(metadata.get(b'platform_scripts', '{{}}').decode('utf-8'))
                 if platform_key in platform_scripts:
                     row_index = int(platform_scripts[platform_key])
-                    script = pq.read_table(self.parquet_path).to_pandas().iloc[row_index, 0]
+                    script = self.read_cell(row_index, 0)
                     script = script.replace("UNAME", self.username).replace("PSSWD", self.password)
 
                     if platform.system().lower() == 'windows':
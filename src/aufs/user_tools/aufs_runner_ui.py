@@ -20,6 +20,8 @@ sys.path.insert(0, src_path)
 from src.aufs.user_tools.editable_pandas_model import EditablePandasModel
 from src.aufs.user_tools.config_controller import MainWidgetWindow  # Import MainWidgetWindow
 from src.aufs.user_tools.popup_editor import PopupEditor
+from src.aufs.core.directory_tree import directory_tree_metadata
+from src.aufs.core.schema_layout import to_wide_layout, read_wide_fields
 
 class AUFSRunner(QMainWindow):
     def __init__(self):
@@ -250,9 +252,11 @@ class AUFSRunner(QMainWindow):
             try:
                 # --- Extract Parquet file data ---
                 self.parquet_file = pq.ParquetFile(parquet_path)
-                self.schema = self.parquet_file.schema  # Extract the schema directly
                 self.metadata = self.parquet_file.metadata.metadata  # Extract metadata
-                self.table_data = self.parquet_file.read().to_pandas()  
+                # Node layout files are read back with one column per directory
+                table = to_wide_layout(self.parquet_file.read())
+                self.schema = table.schema  # Extract the schema directly
+                self.table_data = table.to_pandas()
 
                 # --- Pass schema to build_aufs_dataframe ---
                 schema_df = self.build_aufs_dataframe(self.schema, self.metadata)
@@ -351,7 +355,7 @@ class AUFSRunner(QMainWindow):
     def build_aufs_dataframe(self, schema, metadata):
         try:
             # --- Load metadata ---
-            directory_tree = json.loads(metadata[b'directory_tree'].decode('utf-8'))
+            directory_tree = directory_tree_metadata(metadata)  # Either the encoded tree or the legacy JSON
             self.uuid_mapping = json.loads(metadata[b'uuid_dirname_mapping'].decode('utf-8'))
 
             # --- Stage 1: Build UUID leaf paths ---
@@ -444,8 +448,7 @@ class AUFSRunner(QMainWindow):
     def extract_schema_as_paths(self, parquet_path):
         """Extract schema and format it as a list of paths for edge nodes."""
         try:
-            parquet_file = pq.ParquetFile(parquet_path)
-            schema = parquet_file.schema_arrow
+            schema = read_wide_fields(parquet_path)  # One field per directory in either layout
             # print(schema)
 
             # Treat each field as an edge/leaf node
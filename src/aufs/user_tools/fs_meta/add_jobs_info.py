@@ -1,3 +1,4 @@
+import re
 import pandas as pd
 
 def get_client_project_combos(all_jobs_info_df):
@@ -18,32 +19,113 @@ def source_add_client_project(df, client, project):
     
     return df
 
+class ShotNameMatcher:
+    """
+    Finds shot names in paths with one compiled pattern, so each path is scanned once
+    however many shots there are.
+
+    The names are built into a character trie and compiled to a single regex, which finds
+    the longest name starting at every position of a path. When more than one name is found:
+      1. The longest name wins.
+      2. Between names of the same length, the one furthest right in the path wins, as
+         deeper path segments are more specific.
+    Names are matched literally, and empty names are ignored.
+    """
+    def __init__(self, names, case=True):
+        """
+        Args:
+            names (dict or list): Text to look for mapped to the value to assign, e.g. ALTSHOTNAME -> SHOTNAME.
+                                  A list assigns each name to itself. Later duplicates replace earlier ones.
+            case (bool): Case sensitive matching.
+        """
+        if not isinstance(names, dict):
+            names = {name: name for name in names}
+        self.case = case
+        self.values = {}
+        for name, value in names.items():
+            if pd.isna(name) or str(name) == '':
+                continue
+            self.values[self._fold(str(name))] = value
+
+        self.pattern = None
+        if self.values:
+            trie_pattern = self._trie_pattern(self.values)
+            # The lookahead lets findall report a match at every position, including overlapping ones
+            self.pattern = re.compile(f'(?=({trie_pattern}))', 0 if case else re.IGNORECASE)
+
+    def _fold(self, text):
+        return text if self.case else text.lower()
+
+    @staticmethod
+    def _trie_pattern(names):
+        trie = {}
+        for name in names:
+            node = trie
+            for char in name:
+                node = node.setdefault(char, {})
+            node[''] = {}
+
+        def build(node):
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char != '']
+            if not branches:
+                return ''
+            pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+            # A name ends here, so the longer names below are optional (and tried first)
+            if '' in node:
+                pattern = f'(?:{pattern})?'
+            return pattern
+
+        return build(trie)
+
+    def match(self, text):
+        """
+        Returns the value for the best name found in text, or None.
+        """
+        if self.pattern is None or not isinstance(text, str):
+            return None
+        found = self.pattern.findall(text)
+        if not found:
+            return None
+        # Longest first, then rightmost, see the class docstring
+        best = max(range(len(found)), key=lambda i: (len(found[i]), i))
+        return self.values[self._fold(found[best])]
+
+    def match_series(self, series):
+        """
+        Matches every value in a Series.
+
+        Returns:
+            pd.Series: Matched values aligned with series, None where nothing matched.
+        """
+        return pd.Series([self.match(text) for text in series], index=series.index, dtype=object)
+
 def add_shot_names_to_df(df, shots_df):
+    """
+    Sets SHOTNAME for every row with a PROJECT from the shot names found in FILE.
+    See ShotNameMatcher for how a path containing more than one shot name is resolved.
+    """
     # Check if 'PROJECT' column exists and has any non-null, non-empty values
     if 'PROJECT' not in df.columns or df['PROJECT'].dropna().eq('').all():
         # print("No valid PROJECT values found; skipping shot name assignment.")
         return df  # Return early if no valid PROJECT values are found
 
-    df_allshots = shots_df
-    df['SHOTNAME'] = ''    
-    unique_projects = df['PROJECT'].dropna().unique()
-    
-    for project in unique_projects:
-        # Isolate the working frame for the current project
-        project_frame = df[df['PROJECT'] == project]
-        # Iterate through each unique shot within the project
-        for _, shot_row in df_allshots.iterrows():
-            shotname = shot_row['SHOTNAME']
-            # Apply the mask for the current shotname within the project frame
-            mask = project_frame['FILE'].str.contains(fr"{shotname}", case=True, na=False, regex=True)
-            # Update SHOTNAME for matches
-            df.loc[project_frame[mask].index, 'SHOTNAME'] = shotname
+    df['SHOTNAME'] = ''
+    matcher = ShotNameMatcher(list(shots_df['SHOTNAME']))
+
+    # Only rows with a project get a shot
+    has_project = df['PROJECT'].notna()
+    shot_names = matcher.match_series(df.loc[has_project, 'FILE'])
+    shot_names = shot_names[shot_names.notna()]
+    df.loc[shot_names.index, 'SHOTNAME'] = shot_names
 
     return df
 
 def add_shot_names_to_df_using_altshotnames(df, shots_df, ifNoName=True):
-    df_allshots = shots_df
-    
+    """
+    Sets SHOTNAME, and ALTSHOTNAME to 'yes', for rows whose FILE contains one of the shots'
+    ALTSHOTNAMEs, matched case-insensitively. See ShotNameMatcher for how a path containing
+    more than one name is resolved.
+    """
     # If ifNoName is True, only process rows with an empty SHOTNAME
     if ifNoName:
         # Apply the filter to limit processing to rows where SHOTNAME is empty
@@ -55,31 +137,23 @@ def add_shot_names_to_df_using_altshotnames(df, shots_df, ifNoName=True):
     if 'ALTSHOTNAME' not in df.columns:
         df['ALTSHOTNAME'] = ''
     
-    # Get the unique projects from the DataFrame
-    unique_projects = df_filtered['PROJECT'].dropna().unique()
     if 'PROJECT' not in df_filtered.columns or df_filtered['PROJECT'].dropna().eq('').all():
         # print("No valid PROJECT values found; skipping shot name assignment.")
         return df_filtered  # Return early if no valid PROJECT values are found
 
-    for project in unique_projects:
-        # Isolate the working frame for the current project
-        project_frame = df_filtered[df_filtered['PROJECT'] == project]
-
-        # Iterate through each unique shot within the project
-        for _, shot_row in df_allshots.iterrows():
-            alt_shotname = shot_row.get('ALTSHOTNAME', None)
-            shotname = shot_row['SHOTNAME']
-            
-            # Skip rows with no ALTSHOTNAME defined
-            if pd.isna(alt_shotname):
-                continue
-            
-            # Apply the mask for the current alt_shotname within the project frame (case-insensitive)
-            mask = project_frame['FILE'].str.contains(fr"{alt_shotname}", case=False, na=False, regex=False)
-            
-            # Update SHOTNAME for matches
-            df.loc[project_frame[mask].index, 'SHOTNAME'] = shotname
-            # Mark rows in ALTSHOTNAME column with 'yes'
-            df.loc[project_frame[mask].index, 'ALTSHOTNAME'] = 'yes'
+    if 'ALTSHOTNAME' not in shots_df.columns:
+        return df
+
+    # Skip shots with no ALTSHOTNAME defined
+    alt_shots = shots_df[shots_df['ALTSHOTNAME'].notna()]
+    matcher = ShotNameMatcher(dict(zip(alt_shots['ALTSHOTNAME'], alt_shots['SHOTNAME'])), case=False)
+
+    has_project = df_filtered['PROJECT'].notna()
+    shot_names = matcher.match_series(df_filtered.loc[has_project, 'FILE'])
+    shot_names = shot_names[shot_names.notna()]
+
+    # Update SHOTNAME for matches and mark them in the ALTSHOTNAME column with 'yes'
+    df.loc[shot_names.index, 'SHOTNAME'] = shot_names
+    df.loc[shot_names.index, 'ALTSHOTNAME'] = 'yes'
     
     return df
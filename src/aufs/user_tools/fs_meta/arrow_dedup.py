@@ -0,0 +1,212 @@
+# src/aufs/user_tools/fs_meta/arrow_dedup.py
+
+import os
+import re
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .source_dedup import start_files
+
+# Rows read at a time when scanning keys and streaming rows out
+ARROW_BATCH_SIZE = 256_000
+# Columns pandas writes for a stored DataFrame index, pd.concat(ignore_index=True) drops them
+PANDAS_INDEX_COLUMN = re.compile(r'^__index_level_\d+__$')
+
+def unified_schema(files, dictionary_columns=None):
+    """
+    Unifies the schemas of files the way pd.concat unifies columns: every column in order
+    of first appearance, with compatible types promoted. Pandas metadata and stored
+    pandas index columns are left out.
+
+    Args:
+        files (list of str): Parquet files.
+        dictionary_columns (list, optional): String columns to dictionary encode.
+
+    Returns:
+        pa.Schema
+    """
+    # Index columns are dropped first, as indexes of different types won't unify
+    schemas = [pa.schema([field for field in pq.read_schema(path) if not PANDAS_INDEX_COLUMN.match(field.name)])
+               for path in files]
+    schema = pa.unify_schemas(schemas, promote_options='permissive')
+    fields = []
+    for field in schema:
+        if dictionary_columns and field.name in dictionary_columns and pa.types.is_string(field.type):
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+        fields.append(field)
+    return pa.schema(fields)
+
+def conform_to_schema(table, schema):
+    """
+    Returns table with exactly the columns of schema, in its order and types. Missing columns are all null.
+    """
+    columns = []
+    for field in schema:
+        if field.name in table.column_names:
+            column = table[field.name]
+            if column.type != field.type:
+                column = column.cast(field.type)
+        else:
+            column = pa.nulls(table.num_rows, field.type)
+        columns.append(column)
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def scan_keys(files, key_columns, batch_size=ARROW_BATCH_SIZE):
+    """
+    Reads only key_columns from files, batch by batch, adding each row's location as
+    _FILE (index into files) and _ROW (row number in that file).
+
+    Returns:
+        pa.Table: The keys of every row, in file then row order.
+    """
+    schema = unified_schema(files)
+    key_schema = pa.schema([schema.field(name) for name in key_columns if name in schema.names]
+                           + [pa.field('_FILE', pa.int32()), pa.field('_ROW', pa.int64())])
+    tables = []
+    for file_index, path in enumerate(files):
+        parquet_file = pq.ParquetFile(path)
+        present = [name for name in key_columns if name in parquet_file.schema_arrow.names]
+        offset = 0
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=present):
+            rows = batch.num_rows
+            table = pa.Table.from_batches([batch])
+            table = table.append_column('_FILE', pa.array(np.full(rows, file_index, dtype=np.int32)))
+            table = table.append_column('_ROW', pa.array(np.arange(offset, offset + rows, dtype=np.int64)))
+            tables.append(conform_to_schema(table, key_schema))
+            offset += rows
+    if not tables:
+        return key_schema.empty_table()
+    return pa.concat_tables(tables).combine_chunks()
+
+def _ends_of_runs(column):
+    """
+    Boolean mask of the last row of every run of equal values in a sorted column, nulls counting as equal.
+    """
+    rows = len(column)
+    if rows == 0:
+        return pa.array([], pa.bool_())
+    current, following = column.slice(0, rows - 1), column.slice(1)
+    same = pc.fill_null(pc.equal(current, following), False)
+    both_null = pc.and_(pc.is_null(current), pc.is_null(following))
+    return pa.concat_arrays([pc.invert(pc.or_(same, both_null)).combine_chunks(), pa.array([True])])
+
+def dedup_keys(keys):
+    """
+    Applies the start/ dedup rules to a key table from scan_keys: the row with the latest
+    ENTRYTIME for each HASHEDFILE (the last one read on a tie, a null ENTRYTIME counting as
+    latest, as in pandas), then the first row for each FILE in HASHEDFILE order.
+
+    Returns:
+        pa.Table: The surviving keys in HASHEDFILE order.
+    """
+    keys = keys.sort_by([('HASHEDFILE', 'ascending'), ('ENTRYTIME', 'ascending'),
+                         ('_FILE', 'ascending'), ('_ROW', 'ascending')])
+    survivors = keys.filter(_ends_of_runs(keys['HASHEDFILE']))
+    survivors = survivors.append_column('_POS', pa.array(np.arange(survivors.num_rows, dtype=np.int64)))
+    first_positions = survivors.group_by('FILE').aggregate([('_POS', 'min')])['_POS_min']
+    return survivors.take(first_positions.take(pc.sort_indices(first_positions)))
+
+def _rows_by_file(keys):
+    """
+    Yields (file index, rows in that file, positions in the output) for a key table, in file order.
+    """
+    file_indices = keys['_FILE'].to_numpy()
+    rows = keys['_ROW'].to_numpy()
+    positions = np.arange(len(file_indices))
+    order = np.lexsort((rows, file_indices))
+    file_indices, rows, positions = file_indices[order], rows[order], positions[order]
+    boundaries = np.flatnonzero(np.diff(file_indices)) + 1
+    for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(file_indices)]):
+        if start < end:
+            yield int(file_indices[start]), rows[start:end], positions[start:end]
+
+def _iter_selected_rows(path, rows, batch_size, read_dictionary=None):
+    """
+    Streams the given (sorted) row numbers of path, a batch at a time.
+    """
+    parquet_file = pq.ParquetFile(path, read_dictionary=read_dictionary)
+    offset = 0
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        start, end = np.searchsorted(rows, [offset, offset + batch.num_rows])
+        if start < end:
+            yield pa.Table.from_batches([batch]).take(pa.array(rows[start:end] - offset))
+        offset += batch.num_rows
+
+def take_rows(files, keys, schema, batch_size=ARROW_BATCH_SIZE, dictionary_columns=None):
+    """
+    Reads the rows keys point at, in the order of keys.
+
+    Returns:
+        pa.Table: The rows, conformed to schema.
+    """
+    read_dictionary = [name for name in dictionary_columns or [] if name in schema.names] or None
+    pieces, piece_positions = [], []
+    for file_index, rows, positions in _rows_by_file(keys):
+        taken = 0
+        for piece in _iter_selected_rows(files[file_index], rows, batch_size, read_dictionary):
+            pieces.append(conform_to_schema(piece, schema))
+            piece_positions.append(positions[taken:taken + piece.num_rows])
+            taken += piece.num_rows
+    if not pieces:
+        return schema.empty_table()
+    table = pa.concat_tables(pieces)
+    # Rows were read file by file, put them back in key order
+    order = np.empty(table.num_rows, dtype=np.int64)
+    order[np.concatenate(piece_positions)] = np.arange(table.num_rows)
+    return table.take(pa.array(order))
+
+def write_rows(files, keys, output_path, schema, batch_size=ARROW_BATCH_SIZE):
+    """
+    Streams the rows keys point at to a Parquet file, file by file, so only one batch is in memory
+    at a time. Rows are written in file then row order, not in the order of keys.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    written = 0
+    with pq.ParquetWriter(output_path, schema) as writer:
+        for file_index, rows, positions in _rows_by_file(keys):
+            for piece in _iter_selected_rows(files[file_index], rows, batch_size):
+                writer.write_table(conform_to_schema(piece, schema))
+                written += piece.num_rows
+    return written
+
+def arrow_source_dedup(files, output_path=None, sort_output=True, batch_size=ARROW_BATCH_SIZE, dictionary_columns=None):
+    """
+    Dedups scrape files with the same rules as dedup_source_frame without going through pandas.
+
+    Only HASHEDFILE, ENTRYTIME and FILE are held for every row, the other columns are read
+    back for the surviving rows only. With sort_output the surviving rows are gathered in
+    memory in HASHEDFILE order, like the pandas dedup. Without it they're streamed straight to
+    output_path in file order, so datasets with more rows than fit in memory can be deduped.
+
+    Args:
+        files (str or list of str): Directory of scrape files, or the files in the order they were written.
+        output_path (str, optional): Write the deduplicated rows to this Parquet file.
+        sort_output (bool): Gather the result in HASHEDFILE order. Needs output_path when False.
+        batch_size (int): Rows read at a time.
+        dictionary_columns (list, optional): Low-cardinality string columns (e.g. SCRAPEID, PROJECT)
+                                             to hold dictionary encoded when sort_output is True.
+
+    Returns:
+        pa.Table or int: The deduplicated rows with sort_output, otherwise the number of rows written.
+    """
+    if isinstance(files, (str, os.PathLike)):
+        files = start_files(files)
+    files = [os.fspath(path) for path in files]
+    if not files:
+        return pa.table({}) if sort_output else 0
+
+    keys = dedup_keys(scan_keys(files, ['HASHEDFILE', 'ENTRYTIME', 'FILE'], batch_size))
+
+    if not sort_output:
+        if output_path is None:
+            raise ValueError("output_path is needed when sort_output is False")
+        return write_rows(files, keys, output_path, unified_schema(files), batch_size)
+
+    table = take_rows(files, keys, unified_schema(files, dictionary_columns), batch_size, dictionary_columns)
+    if output_path is not None:
+        plain_schema = unified_schema(files)
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        pq.write_table(conform_to_schema(table, plain_schema), output_path)
+    return table
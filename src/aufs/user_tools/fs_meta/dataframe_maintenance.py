@@ -34,19 +34,23 @@ def no_nans_all_cols(df, whitelist=None):
 
     return df
 
-def to_strings_then_conform_slashes(df, slash_conform_whitelist=None):
+def to_strings_then_conform_slashes(df, slash_conform_whitelist=None, keep_types=None):
     """
     Converts all DataFrame elements to strings and conforms slashes according to a whitelist.
 
     Parameters:
     - df (pd.DataFrame): The DataFrame to process.
     - slash_conform_whitelist (list of str, optional): List of column headers to conform slashes. If None, applies to all columns.
+    - keep_types (list of str, optional): Columns left in their native type (e.g. datetimes and sizes), so they're only
+      turned into strings when the data is finally presented.
 
     Returns:
     - pd.DataFrame: The processed DataFrame with all elements as strings and slashes conformed in specified columns.
     """
+    keep_types = [col for col in (keep_types or []) if col in df.columns]
+
     # Convert entire DataFrame to strings
-    df = df.astype(str)
+    df = df.astype({col: str for col in df.columns if col not in keep_types})
 
     # If no whitelist is provided, conform slashes in all columns
     if slash_conform_whitelist is None:
@@ -54,7 +58,7 @@ def to_strings_then_conform_slashes(df, slash_conform_whitelist=None):
 
     # Conform slashes in whitelisted columns
     for col in slash_conform_whitelist:
-        if col in df.columns:
+        if col in df.columns and col not in keep_types:
             df[col] = df[col].str.replace("\\", "/", regex=False)
 
     return df
@@ -3,10 +3,11 @@ import os
 import platform
 import re
 import math
-import hashlib
 from datetime import datetime
 import pytz
 from .config import F_root_path, loadConfigs
+from .hashing import hash_series
+from .add_jobs_info import ShotNameMatcher
 
 def add_packagerecipient_type003(df, package_name_column='PACKAGENAME', recipient_column='PACKAGERECIPIENT'):
     """
@@ -152,7 +153,7 @@ def format_file_size(df):
 
     return df
 
-def add_hashedfile_entrytime_columns_noRoot(df, column_name_for_hashing, noHashNonStringFields=True):
+def add_hashedfile_entrytime_columns_noRoot(df, column_name_for_hashing, noHashNonStringFields=True, hash_cache=None, processes=None):
     # Generate the ENTRYTIME timestamp
     entry_time = datetime.now(pytz.utc).strftime('%Y-%m-%d %H:%M:%S %Z')
     
@@ -185,16 +186,7 @@ def add_hashedfile_entrytime_columns_noRoot(df, column_name_for_hashing, noHashN
                 temp_column = temp_column.apply(lambda x: x.replace(substring, ''))
 
             # Hash the processed temporary column's values
-            def hash_value(value):
-                try:
-                    value = str(value).strip()  # Ensure value is a string and trim spaces
-                    hash_obj = hashlib.sha256()  # Create a hash object
-                    hash_obj.update(value.encode('utf-8'))
-                    return hash_obj.hexdigest()
-                except Exception as e:
-                    return 'noHash'
-            
-            df['HASHEDFILE'] = temp_column.apply(hash_value)
+            df['HASHEDFILE'] = hash_series(temp_column, processes=processes, cache=hash_cache)
             # print(df)
     else:
         print(f"Column '{column_name_for_hashing}' not found in DataFrame. HASHEDFILE column will not be created.")
@@ -202,7 +194,7 @@ def add_hashedfile_entrytime_columns_noRoot(df, column_name_for_hashing, noHashN
     
     return df
 
-def add_hashedfile_entrytime_columns_noRoot_noSlashes(df, column_name_for_hashing, noHashNonStringFields=True):
+def add_hashedfile_entrytime_columns_noRoot_noSlashes(df, column_name_for_hashing, noHashNonStringFields=True, hash_cache=None, processes=None):
     # Generate the ENTRYTIME timestamp
     entry_time = datetime.now(pytz.utc).strftime('%Y-%m-%d %H:%M:%S %Z')
     
@@ -242,16 +234,7 @@ def add_hashedfile_entrytime_columns_noRoot_noSlashes(df, column_name_for_hashin
                 pass
 
             # Hash the processed temporary column's values
-            def hash_value(value):
-                try:
-                    value = str(value).strip()  # Ensure value is a string and trim spaces
-                    hash_obj = hashlib.sha256()  # Create a hash object
-                    hash_obj.update(value.encode('utf-8'))
-                    return hash_obj.hexdigest()
-                except Exception as e:
-                    return 'noHash'
-            
-            df['HASHEDFILE'] = temp_column.apply(hash_value)
+            df['HASHEDFILE'] = hash_series(temp_column, processes=processes, cache=hash_cache)
             # print(df)
     else:
         print(f"Column '{column_name_for_hashing}' not found in DataFrame. HASHEDFILE column will not be created.")
@@ -259,7 +242,7 @@ def add_hashedfile_entrytime_columns_noRoot_noSlashes(df, column_name_for_hashin
     
     return df
 
-def add_hashedfile_entrytime_columns(df, column_name_for_hashing, noHashNonStringFields=True):
+def add_hashedfile_entrytime_columns(df, column_name_for_hashing, noHashNonStringFields=True, hash_cache=None, processes=None):
     # Generate the ENTRYTIME timestamp
     entry_time = datetime.now(pytz.utc).strftime('%Y-%m-%d %H:%M:%S %Z')
     print(entry_time)
@@ -284,18 +267,7 @@ def add_hashedfile_entrytime_columns(df, column_name_for_hashing, noHashNonStrin
                 df[column_name_for_hashing] = df[column_name_for_hashing].astype(str)
             
             # Create HASHEDFILE column by hashing the specified column's values
-            def hash_value(value):
-                try:
-                    # Ensure value is a string and trim spaces
-                    value = str(value).strip()
-                    # Create a hash object
-                    hash_obj = hashlib.sha256()
-                    hash_obj.update(value.encode('utf-8'))
-                    return hash_obj.hexdigest()
-                except Exception as e:
-                    return 'noHash'
-            
-            df['HASHEDFILE'] = df[column_name_for_hashing].apply(hash_value)
+            df['HASHEDFILE'] = hash_series(df[column_name_for_hashing], processes=processes, cache=hash_cache)
     else:
         print(f"Column '{column_name_for_hashing}' not found in DataFrame. HASHEDFILE column will not be created.")
         df['HASHEDFILE'] = 'noColumn'
@@ -325,23 +297,18 @@ def add_shot_names_to_results(shot_data_df, results_df):
         results_df['SHOTNAME'] = ''
 
     # Prepare a dictionary to map modified shot names back to their full SHOTNAME
-    shot_name_mapping = {row['SHOTNAME'].replace("THRG_", ""): row['SHOTNAME'] for _, row in shot_data_df.iterrows()}
+    shot_name_mapping = {shot_name.replace("THRG_", ""): shot_name for shot_name in shot_data_df['SHOTNAME']}
+    matcher = ShotNameMatcher(shot_name_mapping)
 
-    # Define the columns to check for shot names
+    # Define the columns to check for shot names, a match in a later column replaces an earlier one
     check_columns = ['FILE', 'SEQUENCE', 'LINK']
 
-    # Iterate over each row in results_df to look for matches in any of the specified columns
-    for i, result_row in results_df.iterrows():
-        for column in check_columns:
-            if column in result_row:
-                # Extract the part of the file path or sequence that may contain the shot name
-                file_path_or_sequence = str(result_row[column])
-                # Check against each modified shot name in shot_name_mapping
-                for modified_shot_name, full_shot_name in shot_name_mapping.items():
-                    if modified_shot_name in file_path_or_sequence:
-                        # Assign the full SHOTNAME to the match
-                        results_df.at[i, 'SHOTNAME'] = full_shot_name
-                        break  # Stop checking once a match is found for this row
+    for column in check_columns:
+        if column in results_df.columns:
+            # Each file path or sequence is scanned once for every shot name
+            matches = matcher.match_series(results_df[column].astype(str))
+            matches = matches[matches.notna()]
+            results_df.loc[matches.index, 'SHOTNAME'] = matches
 
     return results_df
 
@@ -508,7 +475,7 @@ def add_file_extension_column(df):
 
     return df
 
-def add_hashedfile_column(df, column_name_for_hashing, noHashNonStringFields=True):
+def add_hashedfile_column(df, column_name_for_hashing, noHashNonStringFields=True, hash_cache=None, processes=None):
     if column_name_for_hashing in df.columns:
         # Handle non-string fields based on noHashNonStringFields flag
         if df[column_name_for_hashing].dtype != 'object' and noHashNonStringFields:
@@ -520,18 +487,7 @@ def add_hashedfile_column(df, column_name_for_hashing, noHashNonStringFields=Tru
                 df[column_name_for_hashing] = df[column_name_for_hashing].astype(str)
             
             # Create HASHEDFILE column by hashing the specified column's values
-            def hash_value(value):
-                try:
-                    # Ensure value is a string and trim spaces
-                    value = str(value).strip()
-                    # Create a hash object
-                    hash_obj = hashlib.sha256()
-                    hash_obj.update(value.encode('utf-8'))
-                    return hash_obj.hexdigest()
-                except Exception as e:
-                    return 'noHash'
-            
-            df['HASHEDFILE'] = df[column_name_for_hashing].apply(hash_value)
+            df['HASHEDFILE'] = hash_series(df[column_name_for_hashing], processes=processes, cache=hash_cache)
     else:
         print(f"Column '{column_name_for_hashing}' not found in DataFrame. HASHEDFILE column will not be created.")
         df['HASHEDFILE'] = 'noColumn'
@@ -0,0 +1,280 @@
+# src/aufs/user_tools/fs_meta/delta_history.py
+
+import os
+import json
+import uuid
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .parquet_lookup import footer_digest
+
+# Deltas written after a base before the next save writes a new base instead
+DEFAULT_COMPACT_EVERY = 20
+OP_COLUMN = '_OP'
+
+class DeltaHistory:
+    """
+    Historical versions of a Parquet file kept as base snapshots plus small deltas.
+
+    Every commit writes the new version to latest_path, as before, and records what changed
+    in history_dir: rows inserted, deleted (old row kept) and updated (new row kept), keyed by
+    key. A full base snapshot is written instead for the first version, every compact_every
+    versions, and whenever a delta can't describe the change exactly (duplicate or missing
+    keys, changed columns or dtypes, reordered rows, or an index other than the default).
+    Any version can be rebuilt by applying its deltas to the base before it.
+
+    Deltas are worked out against the last recorded version. If latest_path was written by
+    something else since, that's read back from the history rather than taken from latest_path.
+
+    The caller is expected to hold the file's lock while committing.
+    """
+    def __init__(self, latest_path, history_dir=None, key='FILE', compact_every=DEFAULT_COMPACT_EVERY):
+        """
+        Args:
+            latest_path (str): The file every commit writes the newest version to.
+            history_dir (str, optional): Where bases and deltas go, 'historical' next to latest_path by default.
+            key (str): Column identifying a row.
+            compact_every (int): Deltas allowed after a base before a new base is written.
+        """
+        self.latest_path = os.fspath(latest_path)
+        self.history_dir = history_dir or os.path.join(os.path.dirname(self.latest_path), 'historical')
+        self.key = key
+        self.compact_every = compact_every
+        # Several files can share a historical directory, so everything is prefixed with the file's name
+        self.prefix = os.path.splitext(os.path.basename(self.latest_path))[0]
+        self.log_path = os.path.join(self.history_dir, f"{self.prefix}.history.json")
+
+    def load_log(self):
+        """
+        Returns the list of version entries, oldest first. Each has 'version', 'time', 'rows' and
+        a 'base' and/or 'delta' file name.
+        """
+        if not os.path.exists(self.log_path):
+            return []
+        with open(self.log_path, 'r') as f:
+            return json.load(f)['versions']
+
+    def _save_log(self, versions):
+        os.makedirs(self.history_dir, exist_ok=True)
+        temp_path = f"{self.log_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'key': self.key, 'versions': versions}, f, indent=2)
+        os.replace(temp_path, self.log_path)
+
+    def _write(self, df, path):
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        pq.write_table(pa.Table.from_pandas(df), temp_path)
+        os.replace(temp_path, path)
+
+    def _read(self, file_name):
+        return pd.read_parquet(os.path.join(self.history_dir, file_name))
+
+    def _delta(self, previous, df):
+        """
+        Returns the delta from previous to df, or None if a delta can't describe it exactly.
+        """
+        key = self.key
+        if key not in df.columns or key not in previous.columns:
+            return None
+        if list(previous.columns) != list(df.columns) or not previous.dtypes.equals(df.dtypes):
+            return None
+        # Rebuilt versions always have a default index, so any other index needs a base
+        if not all(index.equals(pd.RangeIndex(len(index))) for index in (previous.index, df.index)):
+            return None
+        if previous[key].duplicated().any() or df[key].duplicated().any():
+            return None
+
+        new_keys = df[key]
+        existed = new_keys.isin(previous[key])
+        kept = previous[key].isin(new_keys)
+        # Rows are rebuilt as: previous rows minus deletes, in place, then inserts at the end
+        if not new_keys.reset_index(drop=True).equals(
+                pd.concat([previous[key][kept], new_keys[~existed]], ignore_index=True)):
+            return None
+
+        try:
+            previous_hashes = pd.util.hash_pandas_object(previous, index=False)
+            new_hashes = pd.util.hash_pandas_object(df, index=False)
+        except TypeError:
+            # Unhashable values such as lists
+            return None
+        # Position of each row's key in previous, -1 for inserts, which existed masks out
+        previous_positions = pd.Index(previous[key]).get_indexer(new_keys)
+        changed = existed.to_numpy() & (new_hashes.to_numpy() != previous_hashes.to_numpy()[previous_positions])
+
+        return pd.concat([
+            df[~existed].assign(**{OP_COLUMN: 'insert'}),
+            df[changed].assign(**{OP_COLUMN: 'update'}),
+            previous[~kept].assign(**{OP_COLUMN: 'delete'}),
+        ], ignore_index=True)
+
+    def commit(self, df, compact=False):
+        """
+        Writes df as the new latest version and records it in the history.
+
+        Args:
+            df (pd.DataFrame): The new contents.
+            compact (bool): Write a base snapshot whatever the delta would have been.
+
+        Returns:
+            dict: The new version's log entry.
+        """
+        versions = self.load_log()
+        if not versions and os.path.exists(self.latest_path):
+            # The file was there before its history, so it becomes the first version
+            versions = [self._seed_base()]
+        version = versions[-1]['version'] + 1 if versions else 1
+        entry = {'version': version, 'time': datetime.utcnow().isoformat(), 'rows': len(df)}
+
+        since_base = 0
+        for previous_entry in reversed(versions):
+            if 'base' in previous_entry:
+                break
+            since_base += 1
+
+        # Deltas are worked out against df as readers of latest_path will see it, after the
+        # Parquet round trip (which can change dtypes, e.g. datetime64[s] comes back as [ms])
+        temp_path = f"{self.latest_path}.{uuid.uuid4().hex}.tmp"
+        pq.write_table(pa.Table.from_pandas(df), temp_path)
+        stored = pd.read_parquet(temp_path)
+
+        delta = None
+        if versions and not compact and since_base < self.compact_every:
+            previous = self._previous_version(versions[-1])
+            if previous is not None:
+                delta = self._delta(previous, stored)
+
+        os.makedirs(self.history_dir, exist_ok=True)
+        if delta is None:
+            entry['base'] = f"{self.prefix}.base-{version:06d}.parquet"
+            self._write(stored, os.path.join(self.history_dir, entry['base']))
+        else:
+            entry['delta'] = f"{self.prefix}.delta-{version:06d}.parquet"
+            entry['changes'] = {op: int(count) for op, count in delta[OP_COLUMN].value_counts().items()}
+            self._write(delta, os.path.join(self.history_dir, entry['delta']))
+
+        # Replaces a latest.parquet symlink left by the old full-copy history with a real file
+        os.replace(temp_path, self.latest_path)
+        entry.update(self._latest_checksum())
+        versions.append(entry)
+        self._save_log(versions)
+        return entry
+
+    def _latest_checksum(self):
+        # Enough to tell whether latest_path is still the file a commit wrote
+        return {'size': os.path.getsize(self.latest_path), 'footer': footer_digest(self.latest_path)}
+
+    def _seed_base(self):
+        entry = {'version': 1, 'time': datetime.utcnow().isoformat(), 'base': f"{self.prefix}.base-{1:06d}.parquet"}
+        df = pd.read_parquet(self.latest_path)
+        entry['rows'] = len(df)
+        os.makedirs(self.history_dir, exist_ok=True)
+        self._write(df, os.path.join(self.history_dir, entry['base']))
+        entry.update(self._latest_checksum())
+        self._save_log([entry])
+        return entry
+
+    def _previous_version(self, last_entry):
+        """
+        The last recorded version's contents. Read from latest_path while it's still the file
+        that version wrote, otherwise rebuilt from the history. None if neither can be read.
+        """
+        try:
+            if os.path.exists(self.latest_path) and all(
+                    last_entry.get(key) == value for key, value in self._latest_checksum().items()):
+                return pd.read_parquet(self.latest_path)
+        except Exception as e:
+            print(f"Could not check {self.latest_path}: {e}")
+        try:
+            return self.read_version()
+        except Exception as e:
+            print(f"Could not rebuild the last version of {self.latest_path}, writing a base: {e}")
+            return None
+
+    def _apply(self, df, delta):
+        key = self.key
+        operations = delta.pop(OP_COLUMN)
+        removed = delta.loc[operations.isin(['delete']), key]
+        df = df[~df[key].isin(removed)].reset_index(drop=True)
+
+        updates = delta[operations == 'update']
+        if len(updates):
+            positions = pd.Index(df[key]).get_indexer(updates[key])
+            for column in df.columns:
+                values = df[column].copy()
+                values.iloc[positions] = updates[column].to_numpy()
+                df[column] = values
+
+        inserts = delta[operations == 'insert']
+        if len(inserts):
+            df = pd.concat([df, inserts], ignore_index=True)
+        return df
+
+    def read_version(self, version=None):
+        """
+        Rebuilds a version from its base and the deltas after it.
+
+        Args:
+            version (int, optional): Version number, the latest if None.
+
+        Returns:
+            pd.DataFrame: The file's contents at that version.
+        """
+        versions = self.load_log()
+        if version is not None:
+            versions = [entry for entry in versions if entry['version'] <= version]
+        if not versions:
+            raise ValueError(f"No version {version} in the history of {self.latest_path}")
+
+        base_position = max(i for i, entry in enumerate(versions) if 'base' in entry)
+        df = self._read(versions[base_position]['base'])
+        for entry in versions[base_position + 1:]:
+            df = self._apply(df, self._read(entry['delta']))
+        return df
+
+    def read_as_of(self, timestamp):
+        """
+        Rebuilds the version that was latest at timestamp (a datetime or ISO string). Timestamps
+        with an offset are converted to UTC, naive ones are taken to be UTC already.
+        """
+        timestamp = pd.Timestamp(timestamp)
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+        # Log times are naive UTC
+        earlier = [entry['version'] for entry in self.load_log() if pd.Timestamp(entry['time']) <= timestamp]
+        if not earlier:
+            raise ValueError(f"{self.latest_path} has no version from before {timestamp}")
+        return self.read_version(earlier[-1])
+
+    def compact(self):
+        """
+        Writes a base snapshot of the latest version, so reading it needs no deltas.
+        """
+        versions = self.load_log()
+        if not versions or 'base' in versions[-1]:
+            return
+        latest = versions[-1]
+        latest['base'] = f"{self.prefix}.base-{latest['version']:06d}.parquet"
+        self._write(self.read_version(), os.path.join(self.history_dir, latest['base']))
+        self._save_log(versions)
+
+    def prune(self, keep_from_version):
+        """
+        Deletes the history files only needed for versions older than keep_from_version.
+        """
+        versions = self.load_log()
+        bases = [i for i, entry in enumerate(versions) if 'base' in entry and entry['version'] <= keep_from_version]
+        if not bases:
+            return
+        dropped, versions = versions[:bases[-1]], versions[bases[-1]:]
+        # The first kept version's delta is no longer needed, it has a base
+        stale = [versions[0].pop('delta')] if 'delta' in versions[0] else []
+        for entry in dropped:
+            stale.extend(entry[kind] for kind in ('base', 'delta') if kind in entry)
+        self._save_log(versions)
+        for file_name in stale:
+            path = os.path.join(self.history_dir, file_name)
+            if os.path.exists(path):
+                os.remove(path)
@@ -1,66 +1,177 @@
 # files_paths.py
 
 import os
+import sys
 import platform
 from pathlib import Path
 import re
 import tempfile
+import numpy as np
 import pandas as pd
-import time
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from .locking import FileLock, LockTimeout, lock_path_for
+from .parquet_lookup import lookup_rows
 
 class Singleton:
-    def __init__(self, identifier, lock_age_limit=60, force=False):
-        self.lock_file = os.path.join(tempfile.gettempdir(), f"{identifier}.lock")
-        self.lock_age_limit = timedelta(seconds=lock_age_limit)
+    """
+    A writer lock on one target, kept for the callers that used the old timestamp lock files.
+    Built on locking.FileLock, so a lock dies with its owner instead of going stale, and only
+    writers of the same identifier wait for each other.
+    """
+    def __init__(self, identifier, lock_age_limit=60, force=False, timeout=0, lock_path=None):
+        """
+        Args:
+            identifier (str): Name of the lock, kept in the temp dir.
+            lock_age_limit (float): Seconds before a fallback lock file from another host counts as stale.
+            force (bool): Break the lock if it's held and take it, see FileLock.break_lock.
+            timeout (float): Seconds to wait for the lock, by default it fails at once.
+            lock_path (str, optional): Lock file to use instead, e.g. lock_path_for a file.
+        """
+        self.lock_file = lock_path or os.path.join(tempfile.gettempdir(), f"{identifier}.lock")
         self.force = force
+        self.lock = FileLock(self.lock_file, timeout=timeout, stale_after=lock_age_limit)
 
     def check_lock(self):
-        if os.path.exists(self.lock_file):
-            if self.force:
-                print("Force flag is set. Ignoring existing lock and acquiring new one.")
-                os.remove(self.lock_file)
-                return False
-            with open(self.lock_file, 'r') as file:
-                timestamp = datetime.fromtimestamp(float(file.read()))
-            if datetime.now() - timestamp > self.lock_age_limit:
-                print("Lock file is stale. Removing and acquiring new lock.")
-                os.remove(self.lock_file)
-                return False
+        """
+        Returns True if someone else holds the lock.
+        """
+        probe = FileLock(self.lock_file, timeout=0, stale_after=self.lock.stale_after)
+        try:
+            probe.acquire()
+        except LockTimeout:
             return True
+        probe.release()
         return False
 
     def acquire_lock(self):
-        if not self.check_lock():
-            with open(self.lock_file, 'w') as file:
-                file.write(str(time.time()))
-            # print("Lock acquired.")
+        try:
+            self.lock.acquire()
             return True
-        else:
-            print("Lock is currently held by another process.")
+        except LockTimeout as e:
+            if self.force:
+                print(f"Force flag is set. Breaking the existing lock. {e}")
+                self.lock.break_lock()
+                try:
+                    self.lock.acquire()
+                    return True
+                except LockTimeout as e:
+                    print(f"Lock is still held. {e}")
+                    return False
+            print(f"Lock is currently held by another process. {e}")
             return False
 
     def release_lock(self):
-        if os.path.exists(self.lock_file):
-            os.remove(self.lock_file)
-            # print("Lock released.")
+        self.lock.release()
+
+# Where the usual filesystems (APFS, NTFS) ignore case, though a volume may not
+CASE_INSENSITIVE_PLATFORMS = ('darwin', 'win32')
+
+def _existing_names(dir_path, names):
+    """
+    Returns the names in a directory that os.path.exists would say exist, listing it once.
+    On macOS and Windows, a name that's only in the listing with different case is checked
+    with os.path.exists, as the filesystem may or may not ignore case.
+    """
+    try:
+        with os.scandir(dir_path or '.') as entries:
+            listed = {os.path.normcase(entry.name): entry for entry in entries}
+    except FileNotFoundError:
+        return set()
+    except OSError:
+        # Can't list it, e.g. no read permission, but the files may still be reachable
+        return {name for name in names if os.path.exists(os.path.join(dir_path, name))}
+
+    casefolded = None
+    found = set()
+    for name in names:
+        entry = listed.get(os.path.normcase(name))
+        if entry is None:
+            if sys.platform in CASE_INSENSITIVE_PLATFORMS:
+                if casefolded is None:
+                    casefolded = {listed_name.casefold() for listed_name in listed}
+                if name.casefold() in casefolded and os.path.exists(os.path.join(dir_path, name)):
+                    found.add(name)
+            continue
+        # os.path.exists follows links, so a broken link doesn't count
+        if entry.is_symlink() and not os.path.exists(entry.path):
+            continue
+        found.add(name)
+    return found
+
+def paths_exist(paths, max_workers=16):
+    """
+    Works out os.path.exists for many paths, listing each parent directory once with
+    os.scandir instead of asking about every path. Directories are listed concurrently,
+    so slow network shares are checked in parallel.
+
+    Args:
+        paths (iterable): File paths, as strings or path-like objects such as pathlib.Path.
+                          Anything else counts as missing.
+        max_workers (int): Directories listed at a time.
+
+    Returns:
+        np.ndarray: Boolean array, True where the path exists.
+    """
+    paths = pd.Series(paths, dtype=object).map(lambda value: os.fspath(value) if isinstance(value, os.PathLike) else value)
+    unique_paths = pd.unique(paths[paths.map(lambda value: isinstance(value, str))])
+
+    by_directory = {}
+    exists = {}
+    for path in unique_paths:
+        dir_path, name = os.path.split(path)
+        if name in ('', '.', '..'):
+            # Roots, trailing separators and the like, which a listing can't answer
+            exists[path] = os.path.exists(path)
+        else:
+            by_directory.setdefault(dir_path, []).append((name, path))
+
+    def check_directory(item):
+        dir_path, entries = item
+        found = _existing_names(dir_path, [name for name, _ in entries])
+        return [(path, name in found) for name, path in entries]
+
+    if by_directory:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(by_directory))) as executor:
+            for results in executor.map(check_directory, by_directory.items()):
+                exists.update(results)
+
+    return paths.map(exists).eq(True).to_numpy()
 
 class FileStatusChecker:
-    def __init__(self, df, check_column='FILE', status_column='STATUS'):
+    def __init__(self, df, check_column='FILE', status_column='STATUS', max_workers=16):
         """
         Initialize the FileStatusChecker with a DataFrame and optional column names.
         
         :param df: pandas DataFrame
         :param check_column: Name of the column containing file paths (defaults to 'FILE')
         :param status_column: Name of the column where the status will be recorded (defaults to 'STATUS')
+        :param max_workers: Directories listed at a time (defaults to 16)
         """
         self.df = df
         self.check_column = check_column
         self.status_column = status_column
+        self.max_workers = max_workers
+
+    @classmethod
+    def from_parquet(cls, file_path, files, columns=None, check_column='FILE', status_column='STATUS', max_workers=16):
+        """
+        A checker for just the rows of a Parquet file whose check column is one of files. Only the
+        row groups that might hold them are read, see parquet_lookup.lookup_rows.
+
+        :param file_path: Parquet file, e.g. the deduplicated source
+        :param files: Path(s) to look up in the check column
+        :param columns: Columns to read, all of them if None
+        :return: FileStatusChecker of the matching rows
+        """
+        if columns is not None and check_column not in columns:
+            columns = list(columns) + [check_column]
+        df = lookup_rows(file_path, check_column, files, columns=columns)
+        return cls(df, check_column=check_column, status_column=status_column, max_workers=max_workers)
 
     def process(self):
         """
         Processes the DataFrame to check the existence of files and update their status accordingly.
+        Each parent directory is listed once, see paths_exist.
         
         :return: Modified DataFrame or original DataFrame if check column is missing
         """
@@ -68,22 +179,9 @@ class FileStatusChecker:
             print("Nothing to check here.")
             return self.df
 
-        # Ensure the status column exists
-        if self.status_column not in self.df.columns:
-            self.df[self.status_column] = None
-
-        # Check file existence and update status
-        for index, row in self.df.iterrows():
-            file_path = row[self.check_column]
-            try:
-                # Minimal disk access, just checking existence
-                if os.path.exists(file_path):
-                    self.df.at[index, self.status_column] = 'online'
-                else:
-                    self.df.at[index, self.status_column] = 'offline'
-            except Exception as e:
-                # Handle any exception by marking as 'offline'
-                self.df.at[index, self.status_column] = 'offline'
+        # Anything that can't be checked is marked as 'offline'
+        online = paths_exist(self.df[self.check_column], self.max_workers)
+        self.df[self.status_column] = np.where(online, 'online', 'offline').astype(object)
 
         return self.df
 
@@ -3,6 +3,8 @@
 import os
 import sys
 import time
+import queue
+import threading
 import pandas as pd
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -15,83 +17,157 @@ from src.aufs.user_tools.fs_meta.parquet_tools import sequenceWork
 from src.aufs.user_tools.fs_meta.dataframe_meta_work import (add_file_extension_column, format_file_size, add_ITEM_columns, 
                                                              add_strippeditemnames_itemversions, add_hashedfile_entrytime_columns_noRoot)
 from src.aufs.user_tools.fs_meta.sequences import seqs_tidyup_v2
+from src.aufs.user_tools.fs_meta.hashing import HashCache, SOURCE_MAX_ENTRIES
 from src.aufs.user_tools.fs_meta.dataframe_maintenance import no_nans_floats, remove_rows_with_values, to_strings_then_conform_slashes
 
 
-def file_details_df_from_path(paths, client, project, shots_df, output_csv, use_direct_process=False):
-    print("Received paths for processing:", paths)
-    scraper = FileSystemScraper()
-    sequencer = sequenceWork.add_sequence_info_v4
+# Rows per batch. Batches are cut on directory boundaries, so sequences are never split.
+PIPELINE_BATCH_SIZE = 100_000
 
-    # client/project from UI
-    # shotlist csv set automatically via client/project
+# Columns seqs_tidyup_v2 adds when a batch has sequences, added empty when it doesn't
+SEQUENCE_SUMMARY_COLUMNS = ['FIRSTFRAME', 'LASTFRAME', 'FRAMERANGE', 'MISSINGFRAMES']
 
+def iter_scraped_batches(paths, use_direct_process=False, batch_size=PIPELINE_BATCH_SIZE):
+    """
+    The scrape stage: yields DataFrames of scraped rows, each holding whole directories.
+    """
+    scraper = FileSystemScraper()
     # Use the direct process_files method if the flag is true
     if use_direct_process:
         # Handle list of file paths directly
-        new_data_df = scraper.process_files(paths)
-        print("Directly processed files.")
-    else:
-        # Handle single directory processing
-        new_data_df = scraper.scrape_directories(paths)
-        print("Scraped directories.")
-    
-        # Check if the DataFrame is empty
-    if new_data_df.empty:
-        print("No update required: No files found in the supplied paths.")
-        return
+        return scraper.iter_process_files_batches(paths, batch_size=batch_size)
+    return scraper.iter_scrape_batches(paths, batch_size=batch_size)
+
+def prefetch_batches(batches, max_ahead=2):
+    """
+    Runs a batch generator in a background thread, so the next batch is being produced while
+    the current one is worked on. At most max_ahead batches wait in the queue.
+    """
+    batch_queue = queue.Queue(maxsize=max_ahead)
+    stop = threading.Event()
+    finished = object()
 
-    # with pd.option_context(
-    #                     # 'display.max_columns', None, 
-    #                     # 'display.max_rows', None, 
-    #                     'display.max_colwidth', None):
-    #     print(new_data_df)
-    # print("scraped! first up is hashedfile and entrytime columns")
-    # new_data_df = add_hashedfile_entrytime_columns_noRoot(new_data_df, 'FILE')
-    # print("now adding any client-project info we can find")
-    new_data_df = source_add_client_project(new_data_df, client, project)
-    # print("client-project info in: ")
-    # print(new_data_df)
-    # print("Now for adding shot names...")
-    new_data_df = add_shot_names_to_df(new_data_df, shots_df)
-    # print("...and using altshotnames in case they're needed to get shot names.")
+    def put(item):
+        # Give up if the consumer has gone away, rather than blocking forever
+        while not stop.is_set():
+            try:
+                batch_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for batch in batches:
+                if not put(batch):
+                    return
+        except Exception as e:
+            put(e)
+        finally:
+            put(finished)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            batch = batch_queue.get()
+            if batch is finished:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+            yield batch
+    finally:
+        stop.set()
+        producer.join()
+
+def enrich_batch(df, client, project, shots_df, hash_cache=None):
+    """
+    The per-row stages: client/project, shot names, sequence info, extensions, hashing and slashes.
+    HASHEDFILE digests come from hash_cache when given, see hashing.HashCache.
+    """
+    df = source_add_client_project(df, client, project)
+    df = add_shot_names_to_df(df, shots_df)
     # new_data_df = add_shot_names_to_df_using_altshotnames(new_data_df, shots_df) # This is only returning rows that didn't have SHOTNAME....
-    # print("using sequencer is next up")
-    # print(new_data_df)
-    new_data_df = sequencer(new_data_df)
-    with pd.option_context(
-                        'display.max_columns', None, 
-                        # 'display.max_rows', None, 
-                        'display.max_colwidth', None):
-        print(new_data_df)
-
-    # print("sequenced, time to get dotextension filled")
-    new_data_df = add_file_extension_column(new_data_df)
-    # print("extensions added")
-    new_data_df = add_hashedfile_entrytime_columns_noRoot(new_data_df, 'FILE')
-    # print("hashedFILE added, conform slashes next")
-    new_data_df = to_strings_then_conform_slashes(new_data_df)
-    # print(new_data_df)
-    # new_data_df = new_data_df['MEMBERPACKAGES'] = [''] * len(df)
-    
-    # print("Before seqs tidy up v2: ",new_data_df)
+    df = sequenceWork.add_sequence_info_v4(df)
+    df = add_file_extension_column(df)
+    df = add_hashedfile_entrytime_columns_noRoot(df, 'FILE', hash_cache=hash_cache, processes=os.cpu_count())
+    # Scraped sizes and times stay native until the csv is written
+    df = to_strings_then_conform_slashes(df, keep_types=['FILESIZE', 'CREATION_TIME', 'MODIFICATION_TIME'])
+    return df
+
+def tidy_batch(df):
+    """
+    The stages after sequence info: collapsing sequences, removing unwanted files and
+    formatting for the csv. Sequences have to be whole within the batch.
+    """
     # This is where work to be done so we can update individual sequence information
-    seqs_df = seqs_tidyup_v2(new_data_df)
-    # print("did we sequence?")
-    # print("After seqs been tidied",seqs_df)
+    seqs_df = seqs_tidyup_v2(df)
+    for column in SEQUENCE_SUMMARY_COLUMNS:
+        if column not in seqs_df.columns:
+            seqs_df[column] = ''
     seqs_df = remove_rows_with_values(seqs_df, 'FILE', ['~', '.db', '.tmp', 'Thumbs', '.autosave', 'DS_Store','Thumbnail'])
     seqs_df = no_nans_floats(seqs_df)
-    # print("no NaNs no FLOAT.sss")
     seqs_df = format_file_size(seqs_df)
-    # print("Made mega bytes")
     seqs_df = add_ITEM_columns(seqs_df, 'FILE')
-    # print("added ITEM cols")
-    # print(seqs_df['ITEMNAME'])
     seqs_df = add_strippeditemnames_itemversions(seqs_df)
-    # print("done stripping and stuff")
-    # print(seqs_df)
-    
-    seqs_df.to_csv(output_csv, index=False)  # Write to csv
+    return seqs_df
+
+def file_details_df_from_path(paths, client, project, shots_df, output_csv, use_direct_process=False,
+                              batch_size=PIPELINE_BATCH_SIZE, return_df=True, hash_cache_path=None):
+    """
+    Scrapes paths and writes the file details csv. Directories are scraped in a background
+    thread while earlier batches go through the remaining stages, and each batch is appended to
+    the csv as soon as it's done, so memory is bounded by the batch size rather than the tree.
+
+    Args:
+        paths (list of str): Directories to scrape, or files if use_direct_process is set.
+        client (str): Client to tag rows with.
+        project (str): Project to tag rows with.
+        shots_df (pd.DataFrame): Shots for SHOTNAME assignment.
+        output_csv (str): Csv file to write.
+        use_direct_process (bool): Treat paths as a list of files rather than directories.
+        batch_size (int): Rows per batch.
+        return_df (bool): Also collect and return every row. Set to False to keep memory bounded.
+        hash_cache_path (str, optional): Parquet file keeping HASHEDFILE digests between runs. Defaults
+            to one per client and project next to output_csv.
+
+    Returns:
+        pd.DataFrame or None: The rows written when return_df is set, otherwise None. None if nothing was found.
+    """
+    print("Received paths for processing:", paths)
+
+    if hash_cache_path is None:
+        hash_cache_path = os.path.join(os.path.dirname(os.path.abspath(output_csv)), f".hash_cache-{client}-{project}.parquet")
+    hash_cache = HashCache(hash_cache_path, max_entries=SOURCE_MAX_ENTRIES)
+
+    scraped_rows = 0
+    written_columns = None
+    collected = []
+    for batch_number, new_data_df in enumerate(prefetch_batches(iter_scraped_batches(paths, use_direct_process, batch_size))):
+        scraped_rows += len(new_data_df)
+        seqs_df = tidy_batch(enrich_batch(new_data_df, client, project, shots_df, hash_cache))
+        del new_data_df
+
+        if written_columns is None:
+            written_columns = list(seqs_df.columns)
+            seqs_df.to_csv(output_csv, index=False)  # Write to csv
+        else:
+            seqs_df = seqs_df.reindex(columns=written_columns, fill_value='')
+            seqs_df.to_csv(output_csv, mode='a', header=False, index=False)
+        print(f"Batch {batch_number + 1}: {len(seqs_df)} rows written, {scraped_rows} files scraped so far.")
+
+        if return_df:
+            collected.append(seqs_df)
+
+    # Check if anything was found
+    if scraped_rows == 0:
+        print("No update required: No files found in the supplied paths.")
+        return
+
+    hash_cache.save()
+
     print("Written to the csv")
     
-    return seqs_df
\ No newline at end of file
+    if return_df:
+        return pd.concat(collected, ignore_index=True)
@@ -0,0 +1,221 @@
+# src/aufs/user_tools/fs_meta/fs_walker.py
+
+import os
+import re
+import fnmatch
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+def compile_exclude_patterns(patterns):
+    """
+    Compiles a list of fnmatch patterns into a single regex, matching the way
+    fnmatch.fnmatch normalises case and separators for the current platform.
+
+    Args:
+        patterns (list of str): fnmatch style patterns, e.g. '*/jobs/PROD/*'.
+
+    Returns:
+        re.Pattern or None: The combined pattern, or None if no patterns were given.
+    """
+    if not patterns:
+        return None
+    return re.compile('|'.join(fnmatch.translate(os.path.normcase(pattern)) for pattern in patterns))
+
+def _path_only(path, entry):
+    return path
+
+class ScandirWalker:
+    """
+    Walks directory trees with os.scandir, returning entries in the same order os.walk
+    (top-down, followlinks=False) would have produced them.
+
+    Excluded directories are dropped before they are listed, and every directory
+    below a root path is walked in its own worker so slow network shares are
+    listed concurrently.
+    """
+    def __init__(self, exclude_patterns=None, max_workers=8):
+        self.exclude_patterns = list(exclude_patterns or [])
+        self.max_workers = max_workers
+        self._exclude = compile_exclude_patterns(self.exclude_patterns)
+        # Patterns ending in '*' match every descendant of a directory once they match
+        # "<dir>/", so those directories can be skipped without being listed at all.
+        self._prune = compile_exclude_patterns([p for p in self.exclude_patterns if p.endswith('*')])
+
+    def is_excluded(self, path):
+        return self._exclude is not None and self._exclude.match(os.path.normcase(path)) is not None
+
+    def is_pruned(self, dir_path):
+        return self._prune is not None and self._prune.match(os.path.normcase(os.path.join(dir_path, ''))) is not None
+
+    def walk(self, root_paths, handler=None):
+        """
+        Walks every root path and returns handler(path, entry) for each file, and for
+        each symlinked directory, that survives the exclude patterns.
+
+        Args:
+            root_paths (list of str): Directories to walk.
+            handler (callable, optional): Called as handler(path, os.DirEntry) inside the
+                worker that listed the entry. Defaults to returning the path.
+
+        Returns:
+            list: Handler results, in os.walk order.
+        """
+        handler = handler or _path_only
+        results = []
+        for found in self.walk_blocks(root_paths, lambda dir_path: self.scan_dir(dir_path, handler)):
+            results.extend(found)
+        return results
+
+    def walk_incremental(self, root_paths, previous, handler=None):
+        """
+        Walks every root path, only listing directories whose mtime differs from the
+        previous scrape. Unchanged directories are not listed; their subdirectories
+        are taken from the previous scrape and checked in turn.
+
+        Args:
+            root_paths (list of str): Directories to walk.
+            previous (dict): dir path -> (mtime_ns, child_count, subdirs) from the last scrape.
+            handler (callable, optional): As for walk().
+
+        Returns:
+            list of tuple: One (dir_path, results, mtime_ns, child_count, subdirs) block per
+                directory in os.walk order. results is None for unchanged directories.
+        """
+        handler = handler or _path_only
+        return self.walk_blocks(root_paths, lambda dir_path: self.scan_dir_incremental(dir_path, handler, previous))
+
+    def walk_blocks(self, root_paths, visit):
+        """
+        Calls visit(dir_path) -> (block, subdirs) for every directory, walking each subtree
+        below a root path in the worker pool, and returns the blocks in os.walk order.
+        """
+        return list(self.iter_blocks(root_paths, visit))
+
+    def iter_walk(self, root_paths, handler=None):
+        """
+        As walk(), but yields (dir_path, handler results) one directory at a time, so the
+        caller can work on what's been found while the rest of the tree is still being listed.
+        """
+        handler = handler or _path_only
+
+        def visit(dir_path):
+            found, subdirs = self.scan_dir(dir_path, handler)
+            return (dir_path, found), subdirs
+
+        return self.iter_blocks(root_paths, visit)
+
+    def iter_blocks(self, root_paths, visit):
+        """
+        Yields the blocks walk_blocks would return, in the same order, as soon as they're ready.
+        Only a couple of subtrees per worker are walked ahead of the consumer, so a slow consumer
+        holds back the walk rather than the whole tree piling up in memory.
+        """
+        walk_ahead = self.max_workers * 2
+        # Root blocks and subtree futures, in os.walk order
+        pending = deque()
+
+        def ready(keep):
+            while len(pending) > keep:
+                item = pending.popleft()
+                if isinstance(item, Future):
+                    yield from item.result()
+                else:
+                    yield item
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for root_path in root_paths:
+                block, subdirs = visit(os.fspath(root_path))
+                pending.append(block)
+                for subdir in subdirs:
+                    pending.append(executor.submit(self.walk_subtree, subdir, visit))
+                    yield from ready(walk_ahead)
+            yield from ready(0)
+
+    def walk_subtree(self, top, visit):
+        """
+        Serially walks a single subtree, depth first, in os.walk order.
+        """
+        blocks = []
+        stack = [top]
+        while stack:
+            dir_path = stack.pop()
+            block, subdirs = visit(dir_path)
+            blocks.append(block)
+            stack.extend(reversed(subdirs))
+        return blocks
+
+    def scan_dir(self, dir_path, handler):
+        """
+        Lists one directory.
+
+        Returns:
+            tuple: (handler results for files and symlinked directories, subdirectory paths to descend into)
+        """
+        found, subdirs, _ = self._scan(dir_path, handler)
+        return found, subdirs
+
+    def scan_dir_incremental(self, dir_path, handler, previous):
+        """
+        Lists one directory unless its mtime matches the previous scrape.
+
+        Returns:
+            tuple: ((dir_path, results or None, mtime_ns, child_count, subdirs), subdirectory paths to descend into)
+        """
+        try:
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            return (dir_path, [], -1, 0, []), []
+
+        known = previous.get(dir_path)
+        if known is not None and known[0] == mtime_ns:
+            subdirs = list(known[2])
+            return (dir_path, None, mtime_ns, known[1], subdirs), subdirs
+
+        found, subdirs, child_count = self._scan(dir_path, handler)
+        if child_count is None:
+            # Listing failed, make sure the next scrape tries again
+            mtime_ns, child_count = -1, 0
+        return (dir_path, found, mtime_ns, child_count, subdirs), subdirs
+
+    def _scan(self, dir_path, handler):
+        files = []
+        dirs = []
+        child_count = 0
+        try:
+            scandir_it = os.scandir(dir_path)
+        except OSError:
+            return [], [], None
+
+        with scandir_it:
+            while True:
+                try:
+                    entry = next(scandir_it)
+                except StopIteration:
+                    break
+                except OSError:
+                    # os.walk drops a directory entirely if listing fails part way through
+                    return [], [], None
+
+                child_count += 1
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                path = os.path.join(dir_path, entry.name)
+                if self.is_excluded(path):
+                    continue
+                if is_dir:
+                    dirs.append((path, entry))
+                else:
+                    files.append((path, entry))
+
+        found = [handler(path, entry) for path, entry in files]
+        subdirs = []
+        for path, entry in dirs:
+            if entry.is_symlink():
+                found.append(handler(path, entry))
+            elif not self.is_pruned(path):
+                subdirs.append(path)
+
+        return found, subdirs, child_count
@@ -0,0 +1,151 @@
+# src/aufs/user_tools/fs_meta/hashing.py
+
+import os
+import hashlib
+from itertools import islice
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from .parquet_tools import df_write_to_pq
+
+# Below this many new values it isn't worth starting worker processes
+MIN_VALUES_FOR_PROCESSES = 200_000
+# Digests memoised by the shared in-process cache, about 40MB of paths and digests
+DEFAULT_MAX_ENTRIES = 250_000
+# Digests kept by a source's saved cache, which is only held for the length of a scrape
+SOURCE_MAX_ENTRIES = 2_000_000
+
+def hash_value(value):
+    """
+    The HASHEDFILE digest of a single value: sha256 of the stripped string, as hex.
+    Returns 'noHash' if the value can't be hashed.
+    """
+    try:
+        return hashlib.sha256(str(value).strip().encode('utf-8')).hexdigest()
+    except Exception:
+        return 'noHash'
+
+def hash_batch(values):
+    """
+    Hashes a list of values. Module level so it can be sent to worker processes.
+    """
+    sha256 = hashlib.sha256
+    try:
+        return [sha256(str(value).strip().encode('utf-8')).hexdigest() for value in values]
+    except Exception:
+        # Something in the batch can't be hashed, redo it one at a time so only that value gets 'noHash'
+        return [hash_value(value) for value in values]
+
+class HashCache:
+    """
+    Memoises HASHEDFILE digests by path string.
+
+    The memo lives for as long as the cache object does, and can be saved to and
+    loaded from a Parquet file so digests carry over between runs. Past max_entries
+    the oldest digests are dropped to make room for new ones.
+    """
+    def __init__(self, cache_path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.digests = {}
+        if cache_path is not None:
+            self.load()
+
+    def load(self):
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return
+        try:
+            cached = pd.read_parquet(self.cache_path, columns=['VALUE', 'HASHEDFILE']).tail(self.max_entries)
+            self.digests.update(zip(cached['VALUE'], cached['HASHEDFILE']))
+        except Exception as e:
+            print(f"Could not load hash cache {self.cache_path}: {e}")
+
+    def save(self):
+        if self.cache_path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        cached = pd.DataFrame({'VALUE': list(self.digests.keys()), 'HASHEDFILE': list(self.digests.values())})
+        df_write_to_pq(cached, self.cache_path)
+
+    def hash_series(self, series, processes=None, batch_size=50_000):
+        """
+        Hashes every value in a Series, giving the same digests as hash_value.
+
+        Each distinct string is hashed once, and only if it isn't already memoised. New values
+        are hashed in batches, across worker processes when processes is set and there are
+        enough of them to be worth it.
+
+        Args:
+            series (pd.Series): Values to hash.
+            processes (int, optional): Number of worker processes for new values.
+            batch_size (int): Values per batch sent to a worker.
+
+        Returns:
+            pd.Series: Hex digests, aligned with series.
+        """
+        values = series.to_numpy(dtype=object)
+        result = np.empty(len(values), dtype=object)
+
+        # Only strings are deduplicated and memoised. Other types can compare equal across
+        # types (1 == 1.0 == True) while hashing differently, so they're hashed one by one.
+        if pd.api.types.infer_dtype(values, skipna=False) == 'string':
+            is_str = slice(None)
+        else:
+            is_str = np.fromiter((type(value) is str for value in values), dtype=bool, count=len(values))
+            others = ~is_str
+            result[others] = hash_batch(values[others])
+            values = values[is_str]
+
+        codes, uniques = pd.factorize(values)
+        if self.digests:
+            unique_digests = list(map(self.digests.get, uniques))
+            missing = [i for i, digest in enumerate(unique_digests) if digest is None]
+            new_values = [uniques[i] for i in missing]
+        else:
+            unique_digests, missing, new_values = None, None, list(uniques)
+
+        if new_values:
+            new_digests = self._hash_new(new_values, processes, batch_size)
+            if missing is None:
+                unique_digests = new_digests
+            else:
+                for i, digest in zip(missing, new_digests):
+                    unique_digests[i] = digest
+            self._remember(new_values, new_digests)
+
+        result[is_str] = np.array(unique_digests or [], dtype=object)[codes]
+        return pd.Series(result, index=series.index, dtype=object)
+
+    def _remember(self, values, digests):
+        # Keep the newest max_entries digests, dropping the oldest first
+        if len(values) > self.max_entries:
+            values, digests = values[-self.max_entries:], digests[-self.max_entries:]
+        excess = len(self.digests) + len(values) - self.max_entries
+        if excess > 0:
+            for value in list(islice(self.digests, excess)):
+                del self.digests[value]
+        self.digests.update(zip(values, digests))
+
+    def _hash_new(self, values, processes, batch_size):
+        # Batched so a value that can't be encoded only sends its own batch down the slow path
+        batches = [values[i:i + batch_size] for i in range(0, len(values), batch_size)]
+        digests = []
+        if not processes or len(values) < MIN_VALUES_FOR_PROCESSES:
+            for batch in batches:
+                digests.extend(hash_batch(batch))
+            return digests
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for batch_digests in executor.map(hash_batch, batches):
+                digests.extend(batch_digests)
+        return digests
+
+# Shared in-process memo used by the add_hashedfile_* helpers
+default_hash_cache = HashCache()
+
+def hash_series(series, processes=None, cache=None):
+    """
+    Hashes a Series with the shared in-process cache unless another cache is given.
+    """
+    return (cache or default_hash_cache).hash_series(series, processes=processes)
@@ -0,0 +1,167 @@
+# src/aufs/user_tools/fs_meta/last_scraped_index.py
+
+import os
+import re
+import json
+from datetime import datetime, timezone
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .locking import FileLock, atomic_write, lock_path_for
+from .multi_file_loader import MultiFileLoader
+
+LAST_SCRAPED_INDEX_NAME = 'last_scraped.parquet'
+PATH_LIST_SUFFIX = '-path_list.csv'
+# fs_data-{client}_{project}-{YYYYmmddTHHMMSSZ}-path_list.csv
+PATH_LIST_TIME = re.compile(r'-(\d{8}T\d{6}Z)-path_list\.csv$')
+INDEX_COLUMNS = ['DIRECTORY', 'SCRAPE_TIME', 'SCRAPE_ID', 'ROWS']
+
+def last_scraped_index_path(path_list_dir):
+    return os.path.join(os.fspath(path_list_dir), LAST_SCRAPED_INDEX_NAME)
+
+def path_list_files(path_list_dir):
+    return sorted(f for f in os.listdir(path_list_dir) if f.endswith(PATH_LIST_SUFFIX))
+
+def path_list_time(file_name):
+    """
+    Returns the UTC scrape time in a path list's name, or None.
+    """
+    match = PATH_LIST_TIME.search(os.path.basename(file_name))
+    if match is None:
+        return None
+    return datetime.strptime(match.group(1), "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+
+def path_list_scrape_id(file_name):
+    # The run's output name, shared by its fs_data CSV and its path list
+    return os.path.basename(file_name)[:-len(PATH_LIST_SUFFIX)]
+
+def _empty_index():
+    return pd.DataFrame({
+        'DIRECTORY': pd.Series(dtype=object),
+        'SCRAPE_TIME': pd.Series(dtype='datetime64[ns, UTC]'),
+        'SCRAPE_ID': pd.Series(dtype=object),
+        'ROWS': pd.Series(dtype='Int64'),
+    })
+
+def _read_index(index_path):
+    """
+    Returns (index DataFrame, list of path lists folded into it), or (None, []) if there's no usable index.
+    """
+    if not os.path.exists(index_path):
+        return None, []
+    try:
+        table = pq.read_table(index_path)
+    except Exception as e:
+        print(f"Could not read last scraped index {index_path}, rebuilding it: {e}")
+        return None, []
+    metadata = table.schema.metadata or {}
+    path_lists = json.loads(metadata.get(b'PATH_LISTS', b'[]'))
+    df = table.to_pandas()
+    df['ROWS'] = df['ROWS'].astype('Int64')
+    return df, path_lists
+
+def _write_index(index_path, df, path_lists):
+    table = pa.Table.from_pandas(df[INDEX_COLUMNS], preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           b'PATH_LISTS': json.dumps(path_lists).encode('utf-8')})
+    with atomic_write(index_path) as temp_path:
+        pq.write_table(table, temp_path)
+
+def _merge_latest(index_df, new_df):
+    # The latest scrape of each directory wins, the earlier entry on a tie
+    combined = pd.concat([index_df, new_df], ignore_index=True) if len(index_df) else new_df
+    combined = combined.sort_values('SCRAPE_TIME', kind='mergesort', ascending=False)
+    combined = combined.drop_duplicates(subset=['DIRECTORY'], keep='first')
+    return combined.sort_values('DIRECTORY', kind='mergesort').reset_index(drop=True)
+
+def _entries_from_path_lists(path_list_dir, file_names):
+    loader = MultiFileLoader(skip_errors=True)
+    frames = loader.read_csv_frames([os.path.join(path_list_dir, name) for name in file_names])
+    entries = []
+    for csv_path, df in frames:
+        if "Directory Paths" not in df.columns:
+            print(f"No 'Directory Paths' column in {csv_path}, skipping it.")
+            continue
+        entries.append(pd.DataFrame({
+            'DIRECTORY': df["Directory Paths"].astype(str),
+            'SCRAPE_TIME': pd.Timestamp(path_list_time(csv_path)) if path_list_time(csv_path) else pd.NaT,
+            'SCRAPE_ID': path_list_scrape_id(csv_path),
+            # Path lists don't record how many rows each directory gave
+            'ROWS': pd.array([pd.NA] * len(df), dtype='Int64'),
+        }))
+    entries = [df for df in entries if len(df)]
+    if not entries:
+        return _empty_index()
+    df = pd.concat(entries, ignore_index=True)
+    df['SCRAPE_TIME'] = pd.to_datetime(df['SCRAPE_TIME'], utc=True)
+    return df[df['SCRAPE_TIME'].notna()]
+
+def load_last_scraped_index(path_list_dir, rebuild=False):
+    """
+    Reads the last scrape of every directory in a project's path_lists directory.
+
+    Only path lists that aren't in the index yet are read, e.g. those written by older
+    scrapers, so this is a single small read once the index is up to date. The index is
+    rebuilt from every path list if it's missing, unreadable or rebuild is True.
+
+    Args:
+        path_list_dir (str): The project's fs_updates/path_lists directory.
+        rebuild (bool): Rebuild the index from the path lists.
+
+    Returns:
+        pd.DataFrame: DIRECTORY, SCRAPE_TIME (UTC), SCRAPE_ID and ROWS (<NA> where unknown), one row per directory.
+    """
+    index_path = last_scraped_index_path(path_list_dir)
+    if not os.path.isdir(path_list_dir):
+        return _empty_index()
+
+    index_df, folded = (None, []) if rebuild else _read_index(index_path)
+    missing = [name for name in path_list_files(path_list_dir) if name not in set(folded)]
+    if index_df is not None and not missing:
+        return index_df
+
+    with FileLock(lock_path_for(index_path), timeout=30):
+        # Someone else may have brought it up to date while we waited
+        if not rebuild:
+            index_df, folded = _read_index(index_path)
+            missing = [name for name in path_list_files(path_list_dir) if name not in set(folded)]
+            if index_df is not None and not missing:
+                return index_df
+        if index_df is None:
+            index_df, folded = _empty_index(), []
+            missing = path_list_files(path_list_dir)
+        index_df = _merge_latest(index_df, _entries_from_path_lists(path_list_dir, missing))
+        _write_index(index_path, index_df, folded + missing)
+    return index_df
+
+def record_scrape(path_list_dir, path_list_file, directory_rows, scrape_time=None):
+    """
+    Records a finished scrape in the index, after its path list has been written.
+
+    Args:
+        path_list_dir (str): The project's fs_updates/path_lists directory.
+        path_list_file (str): The scrape's path list.
+        directory_rows (dict): Directory -> rows its scrape gave.
+        scrape_time (datetime, optional): UTC time of the scrape, taken from the path list's name by default.
+    """
+    index_path = last_scraped_index_path(path_list_dir)
+    scrape_time = scrape_time or path_list_time(path_list_file)
+    new_df = pd.DataFrame({
+        'DIRECTORY': pd.Series(list(directory_rows.keys()), dtype=object),
+        'SCRAPE_TIME': pd.to_datetime(pd.Series([scrape_time] * len(directory_rows), dtype=object), utc=True),
+        'SCRAPE_ID': path_list_scrape_id(path_list_file),
+        'ROWS': pd.array(list(directory_rows.values()), dtype='Int64'),
+    })
+
+    with FileLock(lock_path_for(index_path), timeout=30):
+        index_df, folded = _read_index(index_path)
+        if index_df is None:
+            # Brings in every earlier path list too
+            index_df, folded = _empty_index(), []
+            earlier = [name for name in path_list_files(path_list_dir) if name != os.path.basename(path_list_file)]
+            index_df = _merge_latest(index_df, _entries_from_path_lists(path_list_dir, earlier))
+            folded = earlier
+        index_df = _merge_latest(index_df, new_df)
+        name = os.path.basename(path_list_file)
+        _write_index(index_path, index_df, folded + ([name] if name not in folded else []))
@@ -0,0 +1,344 @@
+# src/aufs/user_tools/fs_meta/locking.py
+
+import os
+import json
+import time
+import uuid
+import errno
+import socket
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, locks fall back to exclusive lock files, see FileLock
+    fcntl = None
+
+# Exclusive lock files (the fallback) older than this are taken to be stale when their
+# owner is on another host, as its PID can't be checked from here
+STALE_LOCK_SECONDS = 600
+POLL_SECONDS = 0.05
+
+class LockTimeout(TimeoutError):
+    pass
+
+def lock_path_for(target):
+    """
+    The lock file used for a target file, kept next to it so every machine sharing the
+    target uses the same one.
+    """
+    return f"{os.fspath(target)}.lock"
+
+def owner_path_for(lock_path):
+    """
+    Where a writer records who holds lock_path. It's a separate file because opening and
+    closing the lock file itself would drop this process's fcntl locks on it.
+    """
+    return f"{os.fspath(lock_path)}.owner"
+
+def _owner_info():
+    return {'pid': os.getpid(), 'host': socket.gethostname(), 'time': time.time()}
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to someone else
+        return True
+    except OSError:
+        return True
+    return True
+
+def read_lock_owner(lock_path):
+    """
+    Returns the {'pid', 'host', 'time'} of the writer holding a lock, or None.
+    """
+    for path in (owner_path_for(lock_path), f"{lock_path}.excl"):
+        try:
+            with open(path, 'r') as f:
+                owner = json.loads(f.read() or 'null')
+        except (OSError, ValueError):
+            continue
+        if owner:
+            return owner
+    return None
+
+def owner_is_stale(owner, stale_after=STALE_LOCK_SECONDS):
+    """
+    True if a lock owner has gone: a dead process on this host, or an old lock from another host.
+    """
+    if not owner:
+        return True
+    if owner.get('host') == socket.gethostname():
+        return not _pid_alive(owner.get('pid', -1))
+    return time.time() - owner.get('time', 0) > stale_after
+
+class _LocalState:
+    """
+    What this process holds on one lock file. fcntl locks belong to the whole process, and
+    closing any descriptor of the file drops them, so threads share one descriptor here.
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.os_mutex = threading.Lock()
+        self.readers = 0
+        self.writer = False
+        self.fd = None
+        self.exclusive_file = None
+
+_local_states = {}
+_local_states_guard = threading.Lock()
+
+def _local_state(lock_path):
+    key = os.path.abspath(lock_path)
+    with _local_states_guard:
+        return _local_states.setdefault(key, _LocalState())
+
+class FileLock:
+    """
+    A reader/writer lock on one target, shared between threads, processes and machines.
+
+    Uses fcntl advisory locks on lock_path, which the OS drops when the owner dies, so
+    there are no stale locks to detect. Where fcntl isn't available, or the filesystem
+    doesn't support it, an exclusive lock file holding the owner's PID and host is used
+    instead, and a lock whose owner has gone (see owner_is_stale) is taken over.
+
+    Writers should commit with atomic_write, which renames a finished file into place, so
+    plain readers of the target never need the lock. Take a shared lock only to keep
+    writers out for a while, e.g. to read several related files consistently.
+
+        with FileLock(lock_path_for(path)):
+            with atomic_write(path) as temp_path:
+                df.to_parquet(temp_path)
+    """
+    def __init__(self, lock_path, timeout=10, shared=False, stale_after=STALE_LOCK_SECONDS):
+        """
+        Args:
+            lock_path (str): Lock file, see lock_path_for.
+            timeout (float): Seconds to wait for the lock, None waits for ever and 0 doesn't wait.
+            shared (bool): Take a shared (reader) lock rather than an exclusive (writer) one.
+            stale_after (float): See STALE_LOCK_SECONDS.
+        """
+        self.lock_path = os.fspath(lock_path)
+        self.timeout = timeout
+        self.shared = shared
+        self.stale_after = stale_after
+        self.state = _local_state(self.lock_path)
+        self.held = False
+
+    def _deadline(self):
+        return None if self.timeout is None else time.monotonic() + self.timeout
+
+    @staticmethod
+    def _remaining(deadline):
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def _timed_out(self):
+        owner = read_lock_owner(self.lock_path)
+        held_by = f" (held by pid {owner.get('pid')} on {owner.get('host')})" if owner else ""
+        return LockTimeout(f"Timed out waiting for {self.lock_path}{held_by}")
+
+    def acquire(self):
+        deadline = self._deadline()
+        state = self.state
+
+        # Threads of this process first
+        with state.condition:
+            while state.writer or (not self.shared and state.readers):
+                remaining = self._remaining(deadline)
+                if remaining == 0:
+                    raise self._timed_out()
+                state.condition.wait(remaining)
+            if self.shared:
+                state.readers += 1
+            else:
+                state.writer = True
+
+        # Then other processes, once per process
+        try:
+            with state.os_mutex:
+                if state.fd is None and state.exclusive_file is None:
+                    self._acquire_os(deadline)
+                elif not self.shared and state.fd is not None:
+                    self._write_owner()
+        except BaseException:
+            self._release_local()
+            raise
+        self.held = True
+        return True
+
+    def _acquire_os(self, deadline):
+        state = self.state
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+            mode = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+            while True:
+                fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+                try:
+                    fcntl.lockf(fd, mode | fcntl.LOCK_NB)
+                except OSError as e:
+                    os.close(fd)
+                    if e.errno in (errno.ENOLCK, errno.EOPNOTSUPP, errno.ENOSYS):
+                        # No fcntl locks on this filesystem
+                        break
+                    if e.errno not in (errno.EACCES, errno.EAGAIN):
+                        raise
+                else:
+                    if self._is_current(fd):
+                        state.fd = fd
+                        if not self.shared:
+                            self._write_owner()
+                        return
+                    # The lock was broken while we waited (see break_lock), lock the new file
+                    os.close(fd)
+                    continue
+                if self._remaining(deadline) == 0:
+                    raise self._timed_out()
+                time.sleep(POLL_SECONDS)
+        self._acquire_exclusive_file(deadline)
+
+    def _acquire_exclusive_file(self, deadline):
+        # Readers get an exclusive lock too here, which is safe if slower
+        exclusive_path = f"{self.lock_path}.excl"
+        os.makedirs(os.path.dirname(os.path.abspath(exclusive_path)), exist_ok=True)
+        while True:
+            try:
+                fd = os.open(exclusive_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(_owner_info(), f)
+                self.state.exclusive_file = exclusive_path
+                return
+            except FileExistsError:
+                try:
+                    with open(exclusive_path, 'r') as f:
+                        owner = json.loads(f.read() or 'null')
+                except (OSError, ValueError):
+                    owner = None
+                if owner is not None and owner_is_stale(owner, self.stale_after):
+                    print(f"Removing stale lock {exclusive_path} held by pid {owner.get('pid')} on {owner.get('host')}")
+                    self._remove_if_unchanged(exclusive_path, owner)
+                    continue
+            if self._remaining(deadline) == 0:
+                raise self._timed_out()
+            time.sleep(POLL_SECONDS)
+
+    def _is_current(self, fd):
+        # True if fd is still the file at lock_path, rather than one break_lock replaced
+        try:
+            current = os.stat(self.lock_path)
+        except FileNotFoundError:
+            return False
+        opened = os.fstat(fd)
+        return (opened.st_dev, opened.st_ino) == (current.st_dev, current.st_ino)
+
+    def break_lock(self):
+        """
+        Takes the lock from another process that holds it, as the old force flag did by
+        removing its lock file. The lock file is removed, so the next acquire locks a new
+        one and the old holder keeps a lock nobody else waits on. Only for owners known to
+        be gone or stuck, as the old holder isn't told. Threads of this process still
+        wait for each other, and nothing is removed while this process holds the lock.
+        """
+        state = self.state
+        with state.os_mutex:
+            if state.fd is not None or state.exclusive_file is not None:
+                return
+            for path in (owner_path_for(self.lock_path), f"{self.lock_path}.excl", self.lock_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Couldn't remove {path}: {e}")
+
+    @staticmethod
+    def _remove_if_unchanged(path, owner):
+        # Rename first so two processes removing the same stale lock can't remove a fresh one
+        grave = f"{path}.{uuid.uuid4().hex}.stale"
+        try:
+            os.rename(path, grave)
+        except OSError:
+            return
+        try:
+            with open(grave, 'r') as f:
+                current = json.loads(f.read() or 'null')
+        except (OSError, ValueError):
+            current = None
+        if current != owner and not os.path.exists(path):
+            # Someone else's fresh lock, put it back
+            os.rename(grave, path)
+        else:
+            os.remove(grave)
+
+    def _write_owner(self):
+        # For error messages only, with fcntl the OS knows the real owner
+        owner_path = owner_path_for(self.lock_path)
+        temp_path = f"{owner_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(_owner_info(), f)
+            os.replace(temp_path, owner_path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def _release_local(self):
+        state = self.state
+        with state.condition:
+            if self.shared:
+                state.readers -= 1
+            else:
+                state.writer = False
+            if not state.readers and not state.writer:
+                with state.os_mutex:
+                    if state.fd is not None:
+                        # Before unlocking, so the next owner's record isn't the one removed
+                        try:
+                            os.remove(owner_path_for(self.lock_path))
+                        except OSError:
+                            pass
+                        fcntl.lockf(state.fd, fcntl.LOCK_UN)
+                        os.close(state.fd)
+                        state.fd = None
+                    if state.exclusive_file is not None:
+                        try:
+                            os.remove(state.exclusive_file)
+                        except OSError:
+                            pass
+                        state.exclusive_file = None
+            state.condition.notify_all()
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self._release_local()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+@contextmanager
+def atomic_write(target):
+    """
+    Yields a temporary path next to target. If the block finishes, the temporary file is
+    renamed over target in one step, so readers see either the old file or the new one,
+    never a partial write. If it raises, target is left as it was.
+    """
+    target = os.fspath(target)
+    directory = os.path.dirname(os.path.abspath(target))
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".{os.path.basename(target)}.{uuid.uuid4().hex}.tmp")
+    try:
+        yield temp_path
+        os.replace(temp_path, target)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -0,0 +1,177 @@
+# src/aufs/user_tools/fs_meta/multi_file_loader.py
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .arrow_dedup import PANDAS_INDEX_COLUMN, conform_to_schema
+
+class MultiFileLoader:
+    """
+    Reads many Parquet or CSV files at once, each in its own worker, so files on slow network
+    shares are read concurrently rather than one after another.
+
+    Parquet files are combined as Arrow tables: their schemas are unified once, the way
+    pd.concat unifies columns, and the tables are concatenated without copying the data.
+    CSV files are read with pd.read_csv and concatenated once at the end.
+
+    The time each file took is kept in timings, and files that took much longer than
+    the others are printed after every load so slow shares stand out.
+    """
+    def __init__(self, max_workers=8, slow_factor=3.0, skip_errors=False):
+        """
+        Args:
+            max_workers (int): Files read at a time.
+            slow_factor (float): Files taking this many times the median time are reported as slow.
+            skip_errors (bool): Leave out files that can't be read, recording them in errors, instead of raising.
+        """
+        self.max_workers = max_workers
+        self.slow_factor = slow_factor
+        self.skip_errors = skip_errors
+        self.timings = []
+        self.errors = {}
+
+    def _read_all(self, files, read_file):
+        """
+        Returns read_file(path) for every file, in the order of files, recording how long each took.
+        """
+        files = [os.fspath(path) for path in files]
+        self.timings = []
+        self.errors = {}
+
+        def timed_read(path):
+            started = time.perf_counter()
+            try:
+                result, error = read_file(path), None
+            except Exception as e:
+                result, error = None, e
+            seconds = time.perf_counter() - started
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = None
+            return result, error, {'FILE': path, 'SECONDS': seconds, 'BYTES': size,
+                                   'ROWS': None if result is None else len(result)}
+
+        if not files:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(files))) as executor:
+            outcomes = list(executor.map(timed_read, files))
+
+        results = []
+        for path, (result, error, timing) in zip(files, outcomes):
+            self.timings.append(timing)
+            if error is not None:
+                if not self.skip_errors:
+                    raise error
+                print(f"Could not read {path}: {error}")
+                self.errors[path] = error
+                continue
+            results.append((path, result))
+        self.report_slow_files()
+        return results
+
+    def timing_report(self):
+        """
+        Returns the timings of the last load as a DataFrame, slowest first, with MB_PER_SECOND.
+        """
+        report = pd.DataFrame(self.timings, columns=['FILE', 'SECONDS', 'BYTES', 'ROWS'])
+        report['MB_PER_SECOND'] = report['BYTES'] / 1e6 / report['SECONDS'].where(report['SECONDS'] > 0)
+        return report.sort_values('SECONDS', ascending=False).reset_index(drop=True)
+
+    def slow_files(self):
+        """
+        Returns the timings of files that took more than slow_factor times the median.
+        """
+        if len(self.timings) < 2:
+            return []
+        median = pd.Series([timing['SECONDS'] for timing in self.timings]).median()
+        return [timing for timing in self.timings if timing['SECONDS'] > self.slow_factor * median and timing['SECONDS'] > 0.1]
+
+    def report_slow_files(self):
+        for timing in self.slow_files():
+            print(f"Slow read: {timing['FILE']} took {timing['SECONDS']:.2f}s ({timing['BYTES']} bytes)")
+
+    def read_parquet_tables(self, files, columns=None):
+        """
+        Reads Parquet files concurrently.
+
+        Returns:
+            list of tuple: (path, pa.Table) for each file read, in the order of files.
+        """
+        return self._read_all(files, lambda path: pq.read_table(path, columns=columns))
+
+    def load_parquet(self, files, columns=None):
+        """
+        Reads Parquet files concurrently and concatenates them in order, as Arrow.
+
+        Returns:
+            pa.Table: Every row, with the columns unified like pd.concat, or None if the schemas
+                      can't be unified (e.g. a column that's a string in one file and an int in another).
+        """
+        tables = [table for _, table in self.read_parquet_tables(files, columns)]
+        return concat_tables(tables)
+
+    def load_parquet_df(self, files, columns=None):
+        """
+        The same rows as pd.concat([pd.read_parquet(f) for f in files], ignore_index=True).
+        """
+        tables = [table for _, table in self.read_parquet_tables(files, columns)]
+        if not tables:
+            return pd.DataFrame()
+        table = concat_tables(tables)
+        if table is None:
+            # Types Arrow won't promote, let pandas make object columns of them
+            return pd.concat([piece.to_pandas() for piece in tables], ignore_index=True)
+        return table.to_pandas()
+
+    def read_csv_frames(self, files, **read_csv_kwargs):
+        """
+        Reads CSV files concurrently with pd.read_csv(path, **read_csv_kwargs).
+
+        Returns:
+            list of tuple: (path, pd.DataFrame) for each file read, in the order of files.
+        """
+        return self._read_all(files, lambda path: pd.read_csv(path, **read_csv_kwargs))
+
+    def load_csv_df(self, files, **read_csv_kwargs):
+        """
+        The same rows as concatenating pd.read_csv of every file in order, with a fresh index.
+        """
+        frames = [df for _, df in self.read_csv_frames(files, **read_csv_kwargs)]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+def unify_table_schemas(schemas):
+    """
+    Unifies schemas the way pd.concat unifies columns: every column in order of first
+    appearance, with compatible types promoted. Pandas metadata and stored pandas index
+    columns are left out.
+
+    Returns:
+        pa.Schema or None: None if some column's types can't be promoted to one type.
+    """
+    try:
+        schema = pa.unify_schemas(schemas, promote_options='permissive').remove_metadata()
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return None
+    return pa.schema([field for field in schema if not PANDAS_INDEX_COLUMN.match(field.name)])
+
+def concat_tables(tables):
+    """
+    Concatenates tables in order after unifying their schemas once. Column data isn't copied,
+    except to cast columns to a promoted type, and each table's chunks are kept as they are.
+
+    Returns:
+        pa.Table or None: None if the schemas can't be unified.
+    """
+    if not tables:
+        return pa.table({})
+    schema = unify_table_schemas([table.schema for table in tables])
+    if schema is None:
+        return None
+    return pa.concat_tables([conform_to_schema(table, schema) for table in tables])
@@ -1,13 +1,34 @@
 import os
+import stat
+import time
 from datetime import datetime
+import numpy as np
 import pandas as pd
-import fnmatch
+from dateutil.tz import tzlocal
 import hashlib
 import json
 from pathlib import Path
 
 from .config import F_root_path
 from .parquet_tools import df_write_to_pq
+from .files_paths import FileStatusChecker
+from .hashing import hash_series, HashCache, SOURCE_MAX_ENTRIES
+from .fs_walker import ScandirWalker
+from .scrape_manifest import scrape_manifest_path, load_scrape_manifest, write_scrape_manifest
+from .source_dedup import incremental_source_dedup
+from .start_manifest import read_start_rows
+from .start_compaction import compact_start_files, TARGET_FILE_BYTES
+
+SCRAPE_EXCLUDE_PATTERNS = [
+    '*/jobs/IO/work/*',
+    '*/jobs/PROD/*',
+    '*/moviemaking/*',
+    '*/IO/from*',
+    '*/IO/to*',
+    '*/data/setup*',
+    '*/data/thumbs*'
+    # Add more patterns as needed
+]
 
 class defaultScrapeToParquet:
     def __init__(self, job=None):
@@ -18,15 +39,33 @@ class defaultScrapeToParquet:
         else:
             self.job = job
         self.client, self.project = self.job.split('-')
+        self.source_main_all = Path(self.root / "fs_main/parquet/source_files/source_main/sparking/source_main_all")
         # print("Have we set up to scrape?")
         # print(self.root)
 
-    def scrape_and_prepare_data(self, root_paths):
+    def scrape_and_prepare_data(self, root_paths, incremental=True):
+        """
+        Scrapes root_paths and writes the result to a new Parquet file in source_main_all/start.
+
+        A manifest of every directory's mtime is kept in source_main_all/scrape_manifests for each
+        set of root paths. When incremental is True, directories whose mtime hasn't changed since the
+        last scrape aren't listed again and their rows are carried over from the previous snapshot.
+        Note that a directory's mtime only changes when entries are added, removed or renamed, so
+        files rewritten in place keep their previous size and times until their directory changes.
+        """
         # print("We did the setup, now, did we ask for scraping to happen?")
 
         self.root_paths = root_paths
         # print(self.root_paths)
-        self.data_df = self.scraper.scrape_directories(self.root_paths)
+        manifest_path = scrape_manifest_path(self.source_main_all / "scrape_manifests", self.root_paths, SCRAPE_EXCLUDE_PATTERNS)
+        previous_dirs, previous_metadata = load_scrape_manifest(manifest_path) if incremental else ({}, {})
+        # HASHEDFILE digests of these root paths' files, kept from the last scrape so only new paths are hashed
+        hash_cache = HashCache(self.source_main_all / "hash_caches" / os.path.basename(manifest_path).replace("scrape_manifest", "hash_cache"),
+                               max_entries=SOURCE_MAX_ENTRIES)
+
+        scrape_start_ns = time.time_ns()
+        self.data_df, blocks = self.scraper.scrape_directories_incremental(
+            self.root_paths, previous_dirs, previous_metadata.get('SNAPSHOT'))
         self.scrape_time = datetime.utcnow()
         self.scrape_id = self.generate_scrape_id(self.root_paths, self.scrape_time)
         # print("Ok, did we do the scrape???")
@@ -39,12 +78,59 @@ class defaultScrapeToParquet:
             'PATHS': self.root_paths
         }
         # print(self.scrape_id)
-        self.data_df = self.add_hashedfile_column(self.data_df, 'FILE')
+        self.data_df = self.add_hashedfile_column(self.data_df, 'FILE', hash_cache=hash_cache, processes=os.cpu_count())
+        hash_cache.save()
+        # Every row was seen by this scrape, including those carried over, which is what the start/ dedup keys on
+        self.data_df['ENTRYTIME'] = pd.Timestamp(self.scrape_time)
 
         self.save_to_parquet()
+        write_scrape_manifest(manifest_path, blocks, scrape_start_ns, metadata={
+            'SNAPSHOT': str(self.parquet_name),
+            'SCRAPEID': self.scrape_id,
+            'SCRAPE_TIME': self.metadata['SCRAPE_TIME'],
+        })
         return self.parquet_name
 
-    def add_hashedfile_column(self, df, column_name_for_hashing, noHashNonStringFields=True):
+    def update_deduplicated_source(self, output_path=None, verify=False):
+        """
+        Folds the scrapes written to source_main_all/start since the last call into the deduplicated
+        source, using the HASHEDFILE index kept in source_main_all/dedup_index.
+
+        Args:
+            output_path (str, optional): Also write the deduplicated rows to this Parquet file.
+            verify (bool): Also run a full rebuild and print whether the results match.
+
+        Returns:
+            pd.DataFrame: The deduplicated rows.
+        """
+        return incremental_source_dedup(self.source_main_all / "start", self.source_main_all / "dedup_index",
+                                        output_path=output_path, verify=verify)
+
+    def source_file_status(self, source_path, files, columns=None):
+        """
+        Looks up files in a deduplicated source written by update_deduplicated_source and marks
+        each one 'online' or 'offline'. The source is written with a FILE side index, so only the
+        row groups holding these files are read.
+
+        Args:
+            source_path (str): The deduplicated source Parquet file.
+            files (str or list): FILE value(s) to look up.
+            columns (list, optional): Columns to return besides FILE and STATUS, all of them if None.
+
+        Returns:
+            pd.DataFrame: The source rows of files found in it, with a STATUS column.
+        """
+        return FileStatusChecker.from_parquet(source_path, files, columns=columns).process()
+
+    def compact_start(self, target_bytes=TARGET_FILE_BYTES):
+        """
+        Merges the small scrape files in source_main_all/start into files of about target_bytes,
+        see start_compaction.compact_start_files. Readers going through the start manifest keep
+        working as before.
+        """
+        return compact_start_files(self.source_main_all / "start", target_bytes=target_bytes)
+
+    def add_hashedfile_column(self, df, column_name_for_hashing, noHashNonStringFields=True, hash_cache=None, processes=None):
         if column_name_for_hashing in df.columns:
             # Handle non-string fields based on noHashNonStringFields flag
             if df[column_name_for_hashing].dtype != 'object' and noHashNonStringFields:
@@ -56,18 +142,7 @@ class defaultScrapeToParquet:
                     df[column_name_for_hashing] = df[column_name_for_hashing].astype(str)
                 
                 # Create HASHEDFILE column by hashing the specified column's values
-                def hash_value(value):
-                    try:
-                        # Ensure value is a string and trim spaces
-                        value = str(value).strip()
-                        # Create a hash object
-                        hash_obj = hashlib.sha256()
-                        hash_obj.update(value.encode('utf-8'))
-                        return hash_obj.hexdigest()
-                    except Exception as e:
-                        return 'noHash'
-                
-                df['HASHEDFILE'] = df[column_name_for_hashing].apply(hash_value)
+                df['HASHEDFILE'] = hash_series(df[column_name_for_hashing], processes=processes, cache=hash_cache)
         else:
             print(f"Column '{column_name_for_hashing}' not found in DataFrame. HASHEDFILE column will not be created.")
             df['HASHEDFILE'] = 'noColumn'
@@ -81,7 +156,7 @@ class defaultScrapeToParquet:
     def save_to_parquet(self):
         # pass
         timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        file_path = Path(self.root / "fs_main/parquet/source_files/source_main/sparking/source_main_all/start")
+        file_path = Path(self.source_main_all / "start")
         # job_path = Path(self.root / "jobs/IO/work/tracking" / self.job / "filesystem/source_main") # will use this later
         self.parquet_name = file_path / f"{timestamp}-{self.scrape_id}.parquet"
         # print(self.metadata)
@@ -93,8 +168,9 @@ class defaultScrapeToParquet:
         df_write_to_pq(self.data_df, self.parquet_name)
 
 class FileSystemScraper:
-    def __init__(self):
-        pass  # No initial path needed anymore
+    def __init__(self, max_workers=8):
+        # No initial path needed anymore, max_workers bounds the directory walking pool
+        self.max_workers = max_workers
 
     def process_files(self, paths):
         """
@@ -104,22 +180,56 @@ class FileSystemScraper:
         # print("BOOO311")
         # print(paths)
         data = [self.process_entry(path) for path in paths]
-        return self.format_as_dataframe(data)
+        return self.records_to_dataframe(data)
 
     def process_entry(self, path):
         """
         Process a single file or directory entry to extract relevant data.
         """
         # print('BooWho')
-        if os.path.islink(path):
+        try:
+            stat_result = os.lstat(path)
+        except OSError:
+            stat_result = None
+
+        is_link = stat_result is not None and stat.S_ISLNK(stat_result.st_mode)
+        return self.process_stat(path, stat_result, is_link)
+
+    def process_dir_entry(self, path, entry):
+        """
+        Process an os.DirEntry from a directory walk, reusing the stat the listing already has.
+        """
+        try:
+            is_link = entry.is_symlink()
+            stat_result = entry.stat(follow_symlinks=False)
+        except OSError:
+            is_link, stat_result = False, None
+
+        return self.process_stat(path, stat_result, is_link)
+
+    def process_stat(self, path, stat_result, is_link):
+        """
+        Builds the record for one entry from a single lstat result.
+        Sizes are ints and times are st_*_ns ints, None where they're not available.
+        """
+        if is_link:
             target, target_type, size = self.resolve_target(path)
+            size = int(size)
+            # Times come from whatever the link points at
+            try:
+                stat_result = os.stat(path)
+            except OSError:
+                stat_result = None
         else:
             target_type = 'no'
             target = ''
-            size = os.path.getsize(path) if os.path.exists(path) else 'N/A'
+            size = stat_result.st_size if stat_result is not None else None
 
-        creation_time = datetime.fromtimestamp(os.path.getctime(path)).strftime('%Y-%m-%d %H:%M:%S') if os.path.exists(path) else 'N/A'
-        modification_time = datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y-%m-%d %H:%M:%S') if os.path.exists(path) else 'N/A'
+        if stat_result is not None:
+            creation_time = stat_result.st_ctime_ns
+            modification_time = stat_result.st_mtime_ns
+        else:
+            creation_time = modification_time = None
         status = 'online'
 
         return path, size, creation_time, modification_time, target_type, target, status
@@ -155,29 +265,49 @@ class FileSystemScraper:
         # Return the original target path as resolved (preserving its relative or absolute nature), the target type, and size
         return target_path, target_type, size
 
+    def records_to_dataframe(self, records):
+        """
+        Transposes process_entry records into columns and formats them as a DataFrame.
+        """
+        columns = list(zip(*records)) if records else [()] * 7
+        n = len(records)
+        na = np.iinfo(np.int64).min
+
+        return self.format_as_dataframe({
+            'FILE': np.array(columns[0], dtype=object),
+            'FILESIZE': np.fromiter((0 if v is None else v for v in columns[1]), dtype=np.int64, count=n),
+            'CREATION_TIME': np.fromiter((na if v is None else v for v in columns[2]), dtype=np.int64, count=n),
+            'MODIFICATION_TIME': np.fromiter((na if v is None else v for v in columns[3]), dtype=np.int64, count=n),
+            'ISLINK': np.array(columns[4], dtype=object),
+            'TARGET': np.array(columns[5], dtype=object),
+            'STATUS': np.array(columns[6], dtype=object),
+        })
+
     def format_as_dataframe(self, data):
         """
         Format the scraped or processed data as a pandas DataFrame,
         then clean up the DataFrame according to specified rules,
         including standardizing path separators after ensuring all
         columns are of the correct type.
+
+        Args:
+            data (dict): Column name -> NumPy/Arrow array. CREATION_TIME and MODIFICATION_TIME are
+                int64 nanoseconds since the epoch, with the int64 minimum marking missing values.
         """
-        df = pd.DataFrame(data, columns=["FILE", "FILESIZE", "CREATION_TIME", "MODIFICATION_TIME", "ISLINK", "TARGET", "STATUS"])
-        
-        # Convert 'N/A' and other placeholders to appropriate values or data types
-        df['FILESIZE'] = pd.to_numeric(df['FILESIZE'], errors='coerce').fillna(0).astype(int)
-        df['ISLINK'] = df['ISLINK'].fillna('no').astype(str)
-        df['TARGET'] = df['TARGET'].fillna('').astype(str)  # Ensuring string type for TARGET
-        
-        # Specifying the datetime format
-        datetime_format = '%Y-%m-%d %H:%M:%S'
+        df = pd.DataFrame({col: np.asarray(data[col]) for col in ["FILE", "FILESIZE", "CREATION_TIME", "MODIFICATION_TIME", "ISLINK", "TARGET", "STATUS"]})
 
-        # Assuming '1999-12-31 23:59:59' is used as a placeholder for invalid or missing datetimes
-        default_datetime = pd.to_datetime('1999-12-31 23:59:59', format=datetime_format)
+        # '1999-12-31 23:59:59' is used as a placeholder for invalid or missing datetimes
+        default_datetime = np.datetime64('1999-12-31T23:59:59', 'ns')
 
-        # Convert 'CREATION_TIME' and 'MODIFICATION_TIME' to datetime, specifying the format
-        df['CREATION_TIME'] = pd.to_datetime(df['CREATION_TIME'], errors='coerce', format=datetime_format).fillna(default_datetime)
-        df['MODIFICATION_TIME'] = pd.to_datetime(df['MODIFICATION_TIME'], errors='coerce', format=datetime_format).fillna(default_datetime)
+        # Local wall-clock times truncated to the second, as datetime.fromtimestamp would give
+        for col in ['CREATION_TIME', 'MODIFICATION_TIME']:
+            time_ns = df[col].to_numpy(dtype=np.int64)
+            valid = time_ns != np.iinfo(np.int64).min
+            seconds = ((time_ns[valid] + 500) // 1000) // 1_000_000
+            local_times = pd.to_datetime(seconds, unit='s', utc=True).tz_convert(tzlocal()).tz_localize(None)
+            times = np.full(len(time_ns), default_datetime, dtype='datetime64[ns]')
+            times[valid] = local_times.to_numpy(dtype='datetime64[ns]')
+            df[col] = times
 
         # Standardize path separators in FILE and TARGET columns to "/"
         df['FILE'] = df['FILE'].str.replace('\\', '/').str.replace('//', '/')
@@ -197,63 +327,135 @@ class FileSystemScraper:
             '*/data/thumbs*'
             # Add more patterns as needed
         ]
-        paths = []
-
-        for root, dirs, files in os.walk(root_path, followlinks=False):
-            # Exclude specific directories from being walked into by checking against all patterns
-            dirs[:] = [d for d in dirs if not any(fnmatch.fnmatch(os.path.join(root, d), pattern) for pattern in exclude_patterns)]
-
-            # Process files directly under each directory
-            for file in files:
-                path = os.path.join(root, file)
-                # Check if the file matches any of the exclusion patterns
-                if not any(fnmatch.fnmatch(path, pattern) for pattern in exclude_patterns):
-                    paths.append(path)
-            
-            # Check each directory to see if it's a link, and if so, add it
-            # Ensuring it does not match any of the exclusion patterns
-            for dir in dirs:
-                dir_path = os.path.join(root, dir)
-                if os.path.islink(dir_path) and not any(fnmatch.fnmatch(dir_path, pattern) for pattern in exclude_patterns):
-                    paths.append(dir_path)
-        
-        return self.process_files(paths)
+        walker = ScandirWalker(exclude_patterns, max_workers=self.max_workers)
+        records = walker.walk([root_path], handler=self.process_dir_entry)
+
+        return self.records_to_dataframe(records)
 
     def scrape_directories(self, root_paths, return_paths=False):
         # print("BOO24")
-        exclude_patterns = [
-            '*/jobs/IO/work/*',
-            '*/jobs/PROD/*',
-            '*/moviemaking/*',
-            '*/IO/from*',
-            '*/IO/to*',
-            '*/data/setup*',
-            '*/data/thumbs*'
-            # Add more patterns as needed
-        ]
-        all_scraped_paths = []
-        for root_path in root_paths:
-            for root, dirs, files in os.walk(root_path, followlinks=False):
-                # Exclude specific directories from being walked into by checking against all patterns
-                dirs[:] = [d for d in dirs if not any(fnmatch.fnmatch(os.path.join(root, d), pattern) for pattern in exclude_patterns)]
-
-                # Process files directly under each directory
-                for file in files:
-                    path = os.path.join(root, file)
-                    # Check if the file matches any of the exclusion patterns
-                    if not any(fnmatch.fnmatch(path, pattern) for pattern in exclude_patterns):
-                        all_scraped_paths.append(path)
-
-                # Check each directory to see if it's a link, and if so, add it
-                # Ensuring it does not match any of the exclusion patterns
-                for dir in dirs:
-                    dir_path = os.path.join(root, dir)
-                    if os.path.islink(dir_path) and not any(fnmatch.fnmatch(dir_path, pattern) for pattern in exclude_patterns):
-                        all_scraped_paths.append(dir_path)  # Correctly append the directory path
-
-        data_df = self.process_files(all_scraped_paths)
+        # Excluded subtrees are dropped before they're listed, and each top-level
+        # subtree is walked in its own worker. Each entry is processed from the stat its
+        # listing already has.
+        walker = ScandirWalker(SCRAPE_EXCLUDE_PATTERNS, max_workers=self.max_workers)
+        records = walker.walk(root_paths, handler=self.process_dir_entry)
+
+        data_df = self.records_to_dataframe(records)
         # print(data_df)
 
         if return_paths:
-            return data_df, all_scraped_paths
+            return data_df, [record[0] for record in records]
         return data_df
+
+    def iter_scrape_batches(self, root_paths, batch_size=100_000):
+        """
+        Scrapes directories like scrape_directories, yielding DataFrames of roughly batch_size rows
+        while the walk carries on. A directory is never split across batches, so every frame of a
+        sequence arrives in the same batch.
+
+        Args:
+            root_paths (list of str): Directories to scrape.
+            batch_size (int): Rows to collect before yielding a batch.
+
+        Yields:
+            pd.DataFrame: A batch of scraped rows, as scrape_directories would format them.
+        """
+        walker = ScandirWalker(SCRAPE_EXCLUDE_PATTERNS, max_workers=self.max_workers)
+        records = []
+        for _, found in walker.iter_walk(root_paths, handler=self.process_dir_entry):
+            records.extend(found)
+            if len(records) >= batch_size:
+                yield self.records_to_dataframe(records)
+                records = []
+        if records:
+            yield self.records_to_dataframe(records)
+
+    def iter_process_files_batches(self, paths, batch_size=100_000):
+        """
+        As process_files, but yields DataFrames of roughly batch_size rows. Paths are grouped
+        by parent directory, so files from one directory always share a batch.
+        """
+        by_directory = {}
+        for path in paths:
+            by_directory.setdefault(os.path.dirname(os.fspath(path)), []).append(path)
+
+        records = []
+        for directory_paths in by_directory.values():
+            records.extend(self.process_entry(path) for path in directory_paths)
+            if len(records) >= batch_size:
+                yield self.records_to_dataframe(records)
+                records = []
+        if records:
+            yield self.records_to_dataframe(records)
+
+    def scrape_directories_incremental(self, root_paths, previous_dirs=None, previous_snapshot=None):
+        """
+        Scrapes root_paths like scrape_directories, but only lists directories whose mtime differs
+        from previous_dirs. Rows for unchanged directories are carried over from previous_snapshot.
+
+        Args:
+            root_paths (list of str): Directories to scrape.
+            previous_dirs (dict, optional): dir path -> (mtime_ns, child_count, subdirs) from the last manifest.
+            previous_snapshot (str, optional): Parquet file the last scrape of root_paths was written to.
+
+        Returns:
+            tuple: (DataFrame in the same row order as scrape_directories, list of directory blocks for the manifest)
+        """
+        previous_df = None
+        if previous_dirs and previous_snapshot:
+            try:
+                # Found in the compacted file holding it if start/ has been compacted since
+                previous_df = read_start_rows(previous_snapshot)
+            except Exception as e:
+                print(f"Could not read previous snapshot {previous_snapshot}, scraping everything: {e}")
+        if previous_df is None:
+            previous_dirs = {}
+
+        walker = ScandirWalker(SCRAPE_EXCLUDE_PATTERNS, max_workers=self.max_workers)
+        blocks = walker.walk_incremental(root_paths, previous_dirs, handler=self.process_dir_entry)
+
+        fresh_records = []
+        fresh_block_ids = []
+        carried_block_ids = {}
+        for block_id, (dir_path, found, _, _, _) in enumerate(blocks):
+            if found is None:
+                carried_block_ids[self.dir_key(dir_path)] = block_id
+            else:
+                fresh_records.extend(found)
+                fresh_block_ids.extend([block_id] * len(found))
+
+        data_df = self.records_to_dataframe(fresh_records)
+        if not carried_block_ids:
+            return data_df, blocks
+
+        # Carry over the previous rows of every unchanged directory
+        carried_df = previous_df[[col for col in data_df.columns if col in previous_df.columns]]
+        carried_ids = self.parent_dir_keys(carried_df['FILE']).map(carried_block_ids)
+        carried_df = carried_df[carried_ids.notna()].copy()
+        carried_df['_BLOCK'] = carried_ids[carried_ids.notna()].astype(int)
+        data_df['_BLOCK'] = fresh_block_ids
+
+        data_df = pd.concat([data_df, carried_df], ignore_index=True)
+        data_df = data_df.sort_values('_BLOCK', kind='mergesort').drop(columns=['_BLOCK']).reset_index(drop=True)
+        print(f"Re-listed {len(blocks) - len(carried_block_ids)} of {len(blocks)} directories.")
+
+        return data_df, blocks
+
+    @staticmethod
+    def dir_key(dir_path):
+        """
+        Normalises a directory path the same way format_as_dataframe normalises FILE.
+        """
+        key = dir_path.replace('\\', '/').replace('//', '/')
+        if len(key) > 1 and key.endswith('/') and not key.endswith(':/'):
+            key = key[:-1]
+        return key
+
+    @staticmethod
+    def parent_dir_keys(files):
+        """
+        Returns the dir_key of each FILE's parent directory.
+        """
+        parents = files.str.rsplit('/', n=1).str[0]
+        parents = parents.where(~parents.str.endswith(':'), parents + '/')
+        return parents.where(parents != '', '/')
@@ -0,0 +1,185 @@
+# src/aufs/user_tools/fs_meta/parquet_lookup.py
+
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .locking import atomic_write
+
+# Sized for about a 1% false positive rate
+BLOOM_BITS_PER_KEY = 10
+BLOOM_HASHES = 7
+# Smaller row groups than pyarrow's default make point lookups read less
+LOOKUP_ROW_GROUP_SIZE = 64_000
+
+def lookup_index_path(file_path):
+    """
+    The side index written next to a Parquet file by write_lookup_index.
+    """
+    return f"{os.fspath(file_path)}.lookup"
+
+def _key_hashes(values):
+    # 64-bit hashes that are the same on every machine and run, unlike hash()
+    values = np.asarray(values, dtype=object)
+    return pd.util.hash_array(values, categorize=False).astype(np.uint64)
+
+def _bloom_positions(hashes, bits):
+    # Double hashing: h1 + i * h2 for each of the BLOOM_HASHES probes
+    h1 = hashes & np.uint64(0xFFFFFFFF)
+    h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+    probes = np.arange(BLOOM_HASHES, dtype=np.uint64)
+    return (h1[:, None] + probes[None, :] * h2[:, None]) & np.uint64(bits - 1)
+
+def build_bloom(values):
+    """
+    Builds a bloom filter of values.
+
+    Returns:
+        bytes: The filter's bits. Its length in bits is a power of two.
+    """
+    bits = 64
+    while bits < len(values) * BLOOM_BITS_PER_KEY:
+        bits *= 2
+    bitset = np.zeros(bits, dtype=bool)
+    if len(values):
+        bitset[_bloom_positions(_key_hashes(values), bits).ravel()] = True
+    return np.packbits(bitset).tobytes()
+
+def bloom_might_contain(bloom, values):
+    """
+    Returns a boolean array, False where a value is certainly not in the filter.
+    """
+    bitset = np.unpackbits(np.frombuffer(bloom, dtype=np.uint8)).astype(bool)
+    positions = _bloom_positions(_key_hashes(values), len(bitset))
+    return bitset[positions].all(axis=1)
+
+def footer_digest(file_path):
+    """
+    sha256 of a Parquet file's footer, as hex. The footer holds every row group's statistics,
+    so a rewrite with other values changes it, without reading the rows.
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(-8, os.SEEK_END)
+        footer_length = int.from_bytes(f.read(4), 'little')
+        f.seek(-8 - footer_length, os.SEEK_END)
+        return hashlib.sha256(f.read(footer_length)).hexdigest()
+
+def _source_fingerprint(file_path, parquet_file):
+    # Recorded in the index so one left over from an older version of the file is ignored.
+    # A rewrite that keeps the same shape still changes the file's mtime and footer.
+    return {
+        b'NUM_ROWS': str(parquet_file.metadata.num_rows).encode('utf-8'),
+        b'NUM_ROW_GROUPS': str(parquet_file.num_row_groups).encode('utf-8'),
+        b'SOURCE_SIZE': str(os.path.getsize(file_path)).encode('utf-8'),
+        b'SOURCE_MTIME_NS': str(os.stat(file_path).st_mtime_ns).encode('utf-8'),
+        b'FOOTER_SHA256': footer_digest(file_path).encode('utf-8'),
+    }
+
+def write_lookup_index(file_path, columns, index_path=None):
+    """
+    Writes a side index for a Parquet file: a bloom filter of each column's values per row group,
+    so lookups on columns the file isn't sorted by only read the row groups that might match.
+
+    Args:
+        file_path (str): The Parquet file, already written.
+        columns (list): Columns to index.
+        index_path (str, optional): Where to write the index, lookup_index_path(file_path) by default.
+    """
+    parquet_file = pq.ParquetFile(file_path)
+    rows = []
+    for row_group in range(parquet_file.num_row_groups):
+        table = parquet_file.read_row_group(row_group, columns=columns)
+        for column in columns:
+            values = table[column].drop_null().to_numpy(zero_copy_only=False)
+            rows.append({'COLUMN': column, 'ROW_GROUP': row_group, 'BLOOM': build_bloom(values)})
+
+    index_table = pa.Table.from_pylist(rows, schema=pa.schema([
+        ('COLUMN', pa.string()), ('ROW_GROUP', pa.int32()), ('BLOOM', pa.binary())]))
+    index_table = index_table.replace_schema_metadata(_source_fingerprint(file_path, parquet_file))
+    with atomic_write(index_path or lookup_index_path(file_path)) as temp_path:
+        pq.write_table(index_table, temp_path)
+
+def _load_blooms(file_path, parquet_file, column):
+    index_path = lookup_index_path(file_path)
+    if not os.path.exists(index_path):
+        return None
+    try:
+        index_table = pq.read_table(index_path)
+    except Exception as e:
+        print(f"Could not read lookup index {index_path}: {e}")
+        return None
+    metadata = index_table.schema.metadata or {}
+    if any(metadata.get(key) != value for key, value in _source_fingerprint(file_path, parquet_file).items()):
+        return None
+    entries = index_table.to_pydict()
+    return {row_group: bloom for entry_column, row_group, bloom in zip(entries['COLUMN'], entries['ROW_GROUP'], entries['BLOOM'])
+            if entry_column == column}
+
+def _statistics_might_contain(parquet_file, row_group, column_index, values):
+    statistics = parquet_file.metadata.row_group(row_group).column(column_index).statistics
+    if statistics is None or not statistics.has_min_max:
+        return True
+    minimum, maximum = statistics.min, statistics.max
+    try:
+        return any(minimum <= value <= maximum for value in values)
+    except TypeError:
+        return True
+
+def candidate_row_groups(file_path, column, values):
+    """
+    Row groups of file_path that might hold any of values in column, going by row group
+    min/max statistics and, if there is one, the side index.
+    """
+    parquet_file = pq.ParquetFile(file_path)
+    column_index = parquet_file.schema_arrow.get_field_index(column)
+    if column_index < 0:
+        raise KeyError(f"Column '{column}' not found in {file_path}")
+    # Statistics are per leaf column, which is the same as the field index for flat schemas
+    leaf_index = parquet_file.metadata.schema.names.index(column)
+
+    blooms = _load_blooms(file_path, parquet_file, column)
+    candidates = []
+    for row_group in range(parquet_file.num_row_groups):
+        if not _statistics_might_contain(parquet_file, row_group, leaf_index, values):
+            continue
+        if blooms is not None and row_group in blooms and not bloom_might_contain(blooms[row_group], values).any():
+            continue
+        candidates.append(row_group)
+    return parquet_file, candidates
+
+def lookup_rows(file_path, column, values, columns=None):
+    """
+    Finds the rows of a Parquet file whose column is one of values, reading only the row
+    groups that might hold them. Fastest on files written sorted by column, or with a side
+    index of it (see df_write_to_pq's sort_by and index_columns).
+
+    Args:
+        file_path (str): Parquet file.
+        column (str): Column to match, e.g. FILE or HASHEDFILE.
+        values (str or list): Value(s) to look for.
+        columns (list, optional): Columns to return, all of them if None.
+
+    Returns:
+        pd.DataFrame: The matching rows, in file order.
+    """
+    if isinstance(values, str) or not hasattr(values, '__iter__'):
+        values = [values]
+    values = list(dict.fromkeys(values))
+    parquet_file, row_groups = candidate_row_groups(file_path, column, values)
+
+    read_columns = None if columns is None else list(dict.fromkeys(list(columns) + [column]))
+    if not row_groups:
+        table = parquet_file.schema_arrow.empty_table()
+        if read_columns is not None:
+            table = table.select(read_columns)
+    else:
+        table = parquet_file.read_row_groups(row_groups, columns=read_columns)
+        table = table.filter(pc.is_in(table[column], value_set=pa.array(values, type=table.schema.field(column).type)))
+    df = table.to_pandas()
+    if columns is not None:
+        df = df[list(columns)]
+    return df.reset_index(drop=True)
@@ -1,45 +1,42 @@
 import pandas as pd
+import numpy as np
 from datetime import datetime
 import os
 import re
 import pyarrow.parquet as pq
 import pyarrow as pa
 from .files_paths import Singleton
+from .locking import FileLock, atomic_write, lock_path_for
+from .parquet_lookup import write_lookup_index, lookup_index_path
+from .delta_history import DeltaHistory
+from .source_dataset import read_source_dataset, source_filter
 
 class ParquetFileWithSingleton:
     def __init__(self, file_path, lock_identifier=None):
         self.file_path = file_path
-        self.lock_identifier = lock_identifier if lock_identifier else os.path.basename(file_path)
-        self.lock = Singleton(self.lock_identifier)
+        self.lock_identifier = lock_identifier
+        # The same lock file as ParquetFileWithLock and df_write_to_pq, next to the file
+        self.lock = Singleton(lock_identifier) if lock_identifier else Singleton(file_path, lock_path=lock_path_for(file_path))
+
+    # Reads don't take the lock, writes replace the file in one rename so there's never a partial file to see
 
     def read_parquet_file_or_create_standard_scraper_dataframe2(self):
-        if self.lock.acquire_lock():
-            try:
-                if os.path.exists(self.file_path):
-                    return pd.read_parquet(self.file_path)
-                else:
-                    return pd.DataFrame(columns=["FILE", "FILESIZE", "CREATION_TIME", "MODIFICATION_TIME", "ISLINK", "TARGET"])
-            finally:
-                self.lock.release_lock()
+        if os.path.exists(self.file_path):
+            return pd.read_parquet(self.file_path)
         else:
-            print(f"Could not acquire lock for {self.file_path}")
+            return pd.DataFrame(columns=["FILE", "FILESIZE", "CREATION_TIME", "MODIFICATION_TIME", "ISLINK", "TARGET"])
 
     def read_parquet_file2(self):
-        if self.lock.acquire_lock():
-            try:
-                if os.path.exists(self.file_path):
-                    return pd.read_parquet(self.file_path)
-                else:
-                    print(f"No file @ {self.file_path}")
-            finally:
-                self.lock.release_lock()
+        if os.path.exists(self.file_path):
+            return pd.read_parquet(self.file_path)
         else:
-            print(f"Could not acquire lock for {self.file_path}")
+            print(f"No file @ {self.file_path}")
 
     def write_parquet_file2(self, df):
         if self.lock.acquire_lock():
             try:
-                df.to_parquet(self.file_path, index=False)
+                with atomic_write(self.file_path) as temp_path:
+                    df.to_parquet(temp_path, index=False)
             finally:
                 self.lock.release_lock()
         else:
@@ -50,21 +47,8 @@ class ParquetFileWithSingleton:
         print(self.file_path)
         if self.lock.acquire_lock():
             try:
-                if os.path.exists(self.file_path):
-                    # Create the historical directory if it doesn't exist
-                    # historical_dir = os.path.join(os.path.dirname(self.file_path), 'historical')
-                    # if not os.path.exists(historical_dir):
-                    #     os.makedirs(historical_dir)
-                    
-                    # # Format the timestamp
-                    # timestamp = datetime.utcnow().strftime("_%Y%m%d-%H%M%S")
-                    # historical_file_path = os.path.join(historical_dir, os.path.basename(self.file_path) + timestamp)
-                    
-                    # # Copy the existing file to the historical directory
-                    # shutil.copy(self.file_path, historical_file_path)
-                
-                # Write the DataFrame to the original file location, replacing it
-                    df_write_to_pq(df, self.file_path)
+                # Replaces the file, recording what changed in 'historical' rather than copying the whole file there
+                DeltaHistory(self.file_path).commit(df)
             finally:
                 self.lock.release_lock()
         else:
@@ -73,22 +57,9 @@ class ParquetFileWithSingleton:
     def make_simple_historical_then_write_over_parquet_file2(self, df):
         if self.lock.acquire_lock():
             try:
-                # Determine the directory for historical data and create it if it doesn't exist
-                historical_dir = os.path.join(os.path.dirname(self.file_path), "historical")
-                os.makedirs(historical_dir, exist_ok=True)
-
-                # Create a UTC timestamped filename
-                timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-                versioned_file_path = os.path.join(historical_dir, f"{timestamp}.parquet")
-
-                # Write the dataframe to a parquet file with a UTC timestamp
-                df.to_parquet(versioned_file_path, index=False)
-
-                # Create or update the symbolic link to point to the latest version
-                symlink_path = os.path.join(os.path.dirname(self.file_path), "latest.parquet")
-                if os.path.islink(symlink_path):
-                    os.unlink(symlink_path)
-                os.symlink(versioned_file_path, symlink_path)
+                # latest.parquet holds the newest version, older ones are kept as deltas in 'historical'
+                latest_path = os.path.join(os.path.dirname(self.file_path), "latest.parquet")
+                DeltaHistory(latest_path).commit(df)
             finally:
                 self.lock.release_lock()
         else:
@@ -97,75 +68,77 @@ class ParquetFileWithSingleton:
 class ParquetFileWithLock:
     def __init__(self, file_path, lock_path=None):
         self.file_path = file_path
-        self.lock_path = lock_path if lock_path else f"{file_path}.lock"
+        self.lock_path = lock_path if lock_path else lock_path_for(file_path)
+
+    # Only writers take the lock, see ParquetFileWithSingleton
 
     def read_parquet_file_or_create_standard_scraper_dataframe(self):
-        with FileLock(self.lock_path, timeout=10):
-            if os.path.exists(self.file_path):
-                return pd.read_parquet(self.file_path)
-            else:
-                return pd.DataFrame(columns=["FILE", "FILESIZE", "CREATION_TIME", "MODIFICATION_TIME", "ISLINK", "TARGET"])
+        if os.path.exists(self.file_path):
+            return pd.read_parquet(self.file_path)
+        else:
+            return pd.DataFrame(columns=["FILE", "FILESIZE", "CREATION_TIME", "MODIFICATION_TIME", "ISLINK", "TARGET"])
 
     def read_parquet_file(self):
-        with FileLock(self.lock_path, timeout=10):
-            if os.path.exists(self.file_path):
-                return pd.read_parquet(self.file_path)
-            else:
-                print(f"No file @ {self.file_path}")
+        if os.path.exists(self.file_path):
+            return pd.read_parquet(self.file_path)
+        else:
+            print(f"No file @ {self.file_path}")
 
     def write_parquet_file(self, df):
         with FileLock(self.lock_path, timeout=10):
-            df.to_parquet(self.file_path, index=False)
+            with atomic_write(self.file_path) as temp_path:
+                df.to_parquet(temp_path, index=False)
 
     def copy_to_historical_then_replace_parquet_file(self, df):
         with FileLock(self.lock_path, timeout=10):
-            if os.path.exists(self.file_path):
-                # Create the historical directory if not exists
-                historical_dir = os.path.join(os.path.dirname(self.file_path), 'historical')
-                if not os.path.exists(historical_dir):
-                    os.makedirs(historical_dir)
-                
-                # Format the timestamp
-                timestamp = datetime.utcnow().strftime("_%Y%m%d-%H%M%S")
-                historical_file_path = os.path.join(historical_dir, os.path.basename(self.file_path) + timestamp)
-                
-                # Copy the existing file to the historical directory
-                shutil.copy(self.file_path, historical_file_path)
-            
-            # Write the DataFrame to the original file location, replacing it
-            df.to_parquet(self.file_path, index=False)
+            # Replaces the file, recording what changed in 'historical' rather than copying the whole file there
+            DeltaHistory(self.file_path).commit(df)
 
     def make_simple_historical_then_write_over_parquet_file(self, df):
         with FileLock(self.lock_path, timeout=10):
-            # Determine the directory for historical data and create if it doesn't exist
-            historical_dir = os.path.join(os.path.dirname(self.file_path), "historical")
-            os.makedirs(historical_dir, exist_ok=True)
-
-            # Create a UTC timestamped filename
-            timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-            versioned_file_path = os.path.join(historical_dir, f"{timestamp}.parquet")
+            # latest.parquet holds the newest version, older ones are kept as deltas in 'historical'
+            latest_path = os.path.join(os.path.dirname(self.file_path), "latest.parquet")
+            DeltaHistory(latest_path).commit(df)
 
-            # Write the dataframe to a parquet file with a UTC timestamp
-            df.to_parquet(versioned_file_path, index=False)
-
-            # Create or update the symbolic link to point to the latest version
-            symlink_path = os.path.join(os.path.dirname(self.file_path), "latest.parquet")
-            if os.path.islink(symlink_path):
-                os.unlink(symlink_path)
-            os.symlink(versioned_file_path, symlink_path)
+def write_table_for_lookups(table, file_path, sort_by=None, row_group_size=None, index_columns=None, write_page_index=False):
+    """
+    Writes an Arrow table with the layout options df_write_to_pq and df_write_to_pq_with_history take.
 
-def df_write_to_pq(df, file_path, metadata=None):
+    Args:
+        table (pa.Table): Table to write.
+        file_path (str): Target Parquet file path.
+        sort_by (str, optional): Sort rows by this column first, so each row group covers a narrow
+                                 range of it and lookups on it can skip most row groups.
+        row_group_size (int, optional): Maximum rows per row group, pyarrow's default if None.
+        index_columns (list, optional): Columns to write a bloom filter side index for, see parquet_lookup.
+        write_page_index (bool): Also write page-level column indexes to the footer.
+    """
+    if sort_by is not None:
+        table = table.sort_by(sort_by)
+    with atomic_write(file_path) as temp_path:
+        pq.write_table(table, temp_path, row_group_size=row_group_size, write_page_index=write_page_index)
+        if index_columns:
+            # The side index goes in first, lookups ignore it until the file it describes is in place
+            write_lookup_index(temp_path, index_columns, index_path=lookup_index_path(file_path))
+    if not index_columns and os.path.exists(lookup_index_path(file_path)):
+        # The old side index describes the old row groups
+        os.remove(lookup_index_path(file_path))
+
+def df_write_to_pq(df, file_path, metadata=None, sort_by=None, row_group_size=None, index_columns=None, write_page_index=False):
     """
-    Writes a DataFrame to a Parquet file using a Singleton lock.
+    Writes a DataFrame to a Parquet file, holding the file's writer lock and replacing it in one
+    rename so readers never wait or see a partial file.
 
     Args:
         df : pd.DataFrame - The DataFrame to write.
         file_path (str): Target Parquet file path.
         metadata (dict, optional): Custom metadata to include in the Parquet file.
+        sort_by, row_group_size, index_columns, write_page_index: Layout for fast lookups by
+            FILE or HASHEDFILE, see write_table_for_lookups and parquet_lookup.lookup_rows.
     """
     
-    # Create a Singleton lock with the identifier based on the file path
-    lock = Singleton(file_path)
+    # A writer lock for this file only, next to it
+    lock = Singleton(file_path, lock_path=lock_path_for(file_path))
     
     # Try to acquire the lock
     if lock.acquire_lock():
@@ -180,7 +153,7 @@ def df_write_to_pq(df, file_path, metadata=None):
                 table = table.replace_schema_metadata(updated_metadata)
             
             # Write table to Parquet file
-            pq.write_table(table, file_path)
+            write_table_for_lookups(table, file_path, sort_by, row_group_size, index_columns, write_page_index)
             # print(f"DataFrame written to {file_path}.")
         
         except Exception as e:
@@ -192,6 +165,43 @@ def df_write_to_pq(df, file_path, metadata=None):
     else:
         print(f"Could not acquire lock for {file_path}. Skipping write.")
 
+DEFAULT_SEQUENCE_WHITELIST = ['.png', '.jpg', '.jpeg', '.tif', '.tiff', '.exr', '.dpx', '.cin', '.tx', '.ass', '.vdb', '.sgi', '.tga']
+
+# Path before the filename, name (non-greedy), separator, sequence number, file extension
+SEQUENCE_PATTERN_DOT = r'(?P<before>.*[/\\])(?P<name>.*?)(?P<sep>[.])(?P<position>\d+)(?P<after>\.[^.]+)$'
+SEQUENCE_PATTERN_SEPARATORS = r'(?P<before>.*[/\\])(?P<name>.*?)(?P<sep>[._-])(?P<position>\d{1,20})(?P<after>\.[^.]+)$'
+
+def _lower_whitelist(whitelist):
+    if whitelist is None:
+        whitelist = DEFAULT_SEQUENCE_WHITELIST
+    return [ext.lower() for ext in whitelist]
+
+def _assign_sequence_columns(df, matched, parts):
+    """
+    Sets SEQUENCENAME, SEQUENCEPOSITION and PADDING from the regex parts of the matched rows.
+    Every other row gets empty strings. PADDING holds ints for sequence members.
+
+    Args:
+        df (pd.DataFrame): DataFrame to update.
+        matched (np.ndarray of bool): Which rows of df are sequence members.
+        parts (pd.DataFrame): before/name/sep/position/after strings, one row per matched row.
+    """
+    sequence_names = np.full(len(df), '', dtype=object)
+    positions = np.full(len(df), '', dtype=object)
+    padding = np.full(len(df), '', dtype=object)
+
+    if len(parts):
+        position_length = parts['position'].str.len()
+        # Determine the sequence name with %0d notation for the position
+        sequence_names[matched] = (parts['before'] + parts['name'] + parts['sep'] + '%0'
+                                   + position_length.astype(str) + 'd' + parts['after']).to_numpy()
+        positions[matched] = parts['position'].to_numpy()  # Keep position as string
+        padding[matched] = position_length.tolist()
+
+    df['SEQUENCENAME'] = sequence_names
+    df['SEQUENCEPOSITION'] = positions
+    df['PADDING'] = padding
+
 class sequenceWork:
     def get_sequence(df, sequence_name):
         return df[df['Sequence'] == sequence_name]
@@ -249,36 +259,9 @@ class sequenceWork:
         Returns:
             pd.DataFrame: The updated DataFrame with sequence information added.
         """
-        # Initialize new columns with empty strings
-        df['SEQUENCENAME'] = ''
-        df['SEQUENCEPOSITION'] = ''
-        df['PADDING'] = ''
-
-        # Compile a regex pattern to match the sequence logic
-        pattern = re.compile(r'(?P<before>.*[/\\])(?P<name>.*?)(?P<sep>[.])(?P<position>\d+)(?P<after>\.[^.]+)$')
-
-        # Iterate through each file path in the DataFrame
-        for index, row in df.iterrows():
-            match = pattern.search(row['FILE'])
-            if match:
-                # Extract matched groups
-                groups = match.groupdict()
-                name = groups['name']
-                sep = groups['sep']
-                position = groups['position']
-                before = groups['before']
-                after = groups['after']
-
-                # Determine the sequence name with %0d notation for the position
-                position_length = len(position)
-                sequence_name = f"{before}{name}{sep}%0{position_length}d{after}"
-                sequence_position = position  # Keep position as string
-
-                # Update the DataFrame
-                df.at[index, 'SEQUENCENAME'] = sequence_name
-                df.at[index, 'SEQUENCEPOSITION'] = sequence_position
-                df.at[index, 'PADDING'] = position_length
-
+        parts = df['FILE'].str.extract(SEQUENCE_PATTERN_DOT)
+        matched = parts['position'].notna().to_numpy()
+        _assign_sequence_columns(df, matched, parts[matched])
         return df
 
     def add_sequence_info_v2(df, whitelist=None):
@@ -294,47 +277,16 @@ class sequenceWork:
         Returns:
             pd.DataFrame: The updated DataFrame with sequence information added.
         """
-        # Initialize new columns with empty strings
-        df['SEQUENCENAME'] = ''
-        df['SEQUENCEPOSITION'] = ''
-        df['PADDING'] = ''
-
-        # Set default whitelist if none provided
-        if whitelist is None:
-            whitelist = ['.png', '.jpg', '.jpeg', '.tif', '.tiff', '.exr', '.dpx', '.cin', '.tx', '.ass', '.vdb', '.sgi', '.tga']  # Default file extensions
-
-        # Convert whitelist to lowercase for case-insensitive comparison
-        whitelist = [ext.lower() for ext in whitelist]
-
-        # Compile a regex pattern to match the sequence logic
-        pattern = re.compile(r'(?P<before>.*[/\\])(?P<name>.*?)(?P<sep>[.])(?P<position>\d+)(?P<after>\.[^.]+)$')
-        print("Boo")
-        # Iterate through each file path in the DataFrame
-        for index, row in df.iterrows():
-            # Extract the file extension and convert to lowercase
-            file_extension = re.search(r'\.[^.]*$', row['FILE'])
-            # print("File extension to check against whitelist:", file_extension)
-            if file_extension and file_extension.group(0).lower() in whitelist:
-                match = pattern.search(row['FILE'])
-                if match:
-                    # Extract matched groups
-                    groups = match.groupdict()
-                    name = groups['name']
-                    sep = groups['sep']
-                    position = groups['position']
-                    before = groups['before']
-                    after = groups['after']
-
-                    # Determine the sequence name with %0d notation for the position
-                    position_length = len(position)
-                    sequence_name = f"{before}{name}{sep}%0{position_length}d{after}"
-                    sequence_position = position  # Keep position as string
-
-                    # Update the DataFrame
-                    df.at[index, 'SEQUENCENAME'] = sequence_name
-                    df.at[index, 'SEQUENCEPOSITION'] = sequence_position
-                    df.at[index, 'PADDING'] = position_length
+        whitelist = _lower_whitelist(whitelist)
 
+        files = df['FILE']
+        file_extension = files.str.extract(r'(\.[^.]*)$', expand=False)
+        in_whitelist = file_extension.str.lower().isin(whitelist).to_numpy()
+
+        parts = files[in_whitelist].str.extract(SEQUENCE_PATTERN_DOT)
+        matched = in_whitelist.copy()
+        matched[in_whitelist] = parts['position'].notna().to_numpy()
+        _assign_sequence_columns(df, matched, parts[parts['position'].notna()])
         return df
 
     def add_sequence_info_v3(df, whitelist=None):
@@ -350,111 +302,36 @@ class sequenceWork:
         Returns:
             pd.DataFrame: The updated DataFrame with sequence information added.
         """
-        # Initialize new columns with empty strings
-        df['SEQUENCENAME'] = ''
-        df['SEQUENCEPOSITION'] = ''
-        df['PADDING'] = ''
-
-        print('BOOo1')
-
-        # Set default whitelist if none provided
-        if whitelist is None:
-            whitelist = ['.png', '.jpg', '.jpeg', '.tif', '.tiff', '.exr', '.dpx', '.cin', '.tx', '.ass', '.vdb', '.sgi', '.tga']  # Default file extensions
-
-        # Convert whitelist to lowercase for case-insensitive comparison
-        whitelist = [ext.lower() for ext in whitelist]
-        print('BOOo2')
-        print(whitelist)
-        print(df)
-
-        # Compile a regex pattern to match the sequence logic
-        pattern = re.compile(
-            r'(?P<before>.*[/\\])'    # Path before the filename
-            r'(?P<name>.*?)'          # Name of the file (non-greedy)
-            r'(?P<sep>[._-])'         # Separator between name and number (allowing . _ or -)
-            r'(?P<position>\d{1,20})' # Sequence number (up to 20 digits)
-            r'(?P<after>\.[^.]+)$'    # File extension
-        )
-        print('BOOo3')
-
-        # Iterate through each file path in the DataFrame
-        for index, row in df.iterrows():
-            print('BOOo4')
-            # Extract just the filename from the path
-            file_name = row['FILE'].split('/')[-1] if '/' in row['FILE'] else row['FILE'].split('\\')[-1]
-            print(file_name)
-
-            # Extract the file extension and convert to lowercase
-            file_extension = re.search(r'\.[^.]*$', file_name)
-            
-            # Check if the filename has more than two periods
-            if file_name.count('.') > 2:
-                continue  # Skip this file if it has more than two periods in its name
-            
-            if file_extension and file_extension.group(0).lower() in whitelist:
-                match = pattern.search(row['FILE'])
-                if match:
-                    # Extract matched groups
-                    groups = match.groupdict()
-                    name = groups['name']
-                    sep = groups['sep']
-                    position = groups['position']
-                    before = groups['before']
-                    after = groups['after']
-
-                    # Determine the sequence name with %0d notation for the position
-                    position_length = len(position)
-                    sequence_name = f"{before}{name}{sep}%0{position_length}d{after}"
-                    sequence_position = position  # Keep position as string
-
-                    # Update the DataFrame
-                    df.at[index, 'SEQUENCENAME'] = sequence_name
-                    df.at[index, 'SEQUENCEPOSITION'] = sequence_position
-                    df.at[index, 'PADDING'] = position_length
-
+        whitelist = _lower_whitelist(whitelist)
+
+        # Extract just the filename from the path
+        files = df['FILE']
+        file_name = files.str.rpartition('/')[2].where(
+            files.str.contains('/', regex=False), files.str.rpartition('\\')[2])
+
+        file_extension = file_name.str.extract(r'(\.[^.]*)$', expand=False)
+        candidates = file_extension.str.lower().isin(whitelist).to_numpy()
+        # Skip files with more than two periods in their name
+        candidates &= (file_name.str.count(r'\.') <= 2).to_numpy()
+
+        parts = files[candidates].str.extract(SEQUENCE_PATTERN_SEPARATORS)
+        matched = candidates.copy()
+        matched[candidates] = parts['position'].notna().to_numpy()
+        _assign_sequence_columns(df, matched, parts[parts['position'].notna()])
         return df
 
     def add_sequence_info_v4(df, whitelist=None):
-        df['SEQUENCENAME'] = ''
-        df['SEQUENCEPOSITION'] = ''
-        df['PADDING'] = ''
-
-        if whitelist is None:
-            whitelist = ['.png', '.jpg', '.jpeg', '.tif', '.tiff', '.exr', '.dpx', '.cin', '.tx', '.ass', '.vdb', '.sgi', '.tga']
-
-        whitelist = [ext.lower() for ext in whitelist]
-
-        placeholder = 'Xa8YYT'
-
-        for index, row in df.iterrows():
-            file_path = row['FILE']
-            file_extension = file_path[file_path.rfind('.'):].lower()
-
-            if file_extension not in whitelist:
-                continue
-
-            file_path = file_path.replace(' ', placeholder)
-            file_base = file_path[:file_path.rfind('.')]
-            sep_index = max(file_base.rfind('_'), file_base.rfind('.'))
-            if sep_index == -1:
-                continue
-
-            frame_number = file_base[sep_index + 1:]
-            base_name = file_base[:sep_index]
-            separator = file_base[sep_index]
-
-            if frame_number.isdigit() and len(frame_number) > 1:
-                base_name = base_name.replace(placeholder, ' ')
-                sequence_name = f"{base_name}{separator}%0{len(frame_number)}d{file_extension}"
-                df.at[index, 'SEQUENCENAME'] = sequence_name
-                df.at[index, 'SEQUENCEPOSITION'] = frame_number
-                df.at[index, 'PADDING'] = len(frame_number)
-            else:
-                base_name = base_name.replace(placeholder, ' ')
-                df.at[index, 'SEQUENCENAME'] = ''
-                df.at[index, 'SEQUENCEPOSITION'] = ''
-                df.at[index, 'PADDING'] = ''
+        whitelist = _lower_whitelist(whitelist)
+
+        # base, then the last '_' or '.' before the extension, then the frame, then the extension
+        parts = df['FILE'].str.extract(r'(?s)^(?P<before>.*)(?P<sep>[._])(?P<position>[^._]*)(?P<after>\.[^.]*)\Z')
+        parts['after'] = parts['after'].str.lower()
 
+        matched = (parts['after'].isin(whitelist)
+                   & parts['position'].fillna('').str.isdigit()
+                   & (parts['position'].str.len() > 1)).to_numpy()
+        parts['name'] = ''
+        _assign_sequence_columns(df, matched, parts[matched])
         return df
 
 def decompose_file_paths(df):
@@ -531,7 +408,27 @@ def create_source_parquet(file_path):
     df.to_parquet(file_path)
     print(f"Source Parquet file initialized at {file_path} with default headers.")
 
-def source_create_and_or_read(file_path):
+def source_create_and_or_read(file_path, filters=None, columns=None, client=None, project=None, shotname=None):
+    """
+    Reads source_main, creating an empty one if there's none.
+
+    file_path is either a single Parquet file or the root of a partitioned source_main, see
+    source_dataset.py. Filters and client/project/shotname are pushed down to the read, so a
+    partitioned source only reads the matching partitions, and either only reads row groups
+    that might match.
+    """
+    if os.path.isdir(file_path):
+        # Partitioned dataset
+        df = read_source_dataset(file_path, filters=filters, columns=columns, client=client, project=project, shotname=shotname)
+        print(f"Loaded {len(df)} rows from the source dataset {file_path}.")
+        return df
+
+    expression = source_filter(filters, client, project, shotname)
+    if (expression is not None or columns is not None) and os.path.exists(file_path):
+        df = pd.read_parquet(file_path, columns=columns, filters=expression)
+        print(f"Loaded Parquet file from {file_path}.")
+        return df
+
     parquet_manager = ParquetFileWithLock(file_path)
     df = parquet_manager.read_parquet_file_or_create_standard_scraper_dataframe()
 
@@ -650,21 +547,27 @@ def source_concat_dedupe_clean_and_write(dfs, file_path, metadata=None):
     pq.write_table(table, file_path)
     print(f"DataFrame written to {file_path}.")
 
-def read_parquet_or_initialize(path, schema=None):
+def read_parquet_or_initialize(path, schema=None, filters=None, columns=None):
     """
     Reads a Parquet file into a DataFrame. If the file does not exist, returns an empty DataFrame with an optional schema.
 
     Args:
-        path (str): The file path to the Parquet file.
+        path (str): The file path to the Parquet file, or the root of a partitioned source_main.
         schema (dict, optional): A dictionary defining the schema of the DataFrame to be created if the file does not exist.
                                 The keys should be column names and the values should be Pandas dtype objects.
+        filters (list or ds.Expression, optional): Only read matching rows, see source_dataset.source_filter.
+                                                   Partitions and row groups that can't match aren't read.
+        columns (list, optional): Only read these columns.
 
     Returns:
         pd.DataFrame: The DataFrame read from the Parquet file or an empty DataFrame with the specified schema.
     """
-    if os.path.exists(path):
+    if os.path.isdir(path):
+        # Partitioned dataset, see source_dataset.py
+        df = read_source_dataset(path, filters=filters, columns=columns)
+    elif os.path.exists(path):
         # File exists, read the Parquet file
-        df = pd.read_parquet(path)
+        df = pd.read_parquet(path, columns=columns, filters=source_filter(filters))
     else:
         # File does not exist, prepare an empty DataFrame with the specified schema if provided
         if schema is not None:
@@ -705,7 +608,8 @@ def source_concat_clean_and_write(dfs, file_path, metadata=None):
     pq.write_table(table, file_path)
     print(f"DataFrame written to {file_path}.")
 
-def df_write_to_pq_with_history(df, file_path, metadata=None):
+def df_write_to_pq_with_history(df, file_path, metadata=None, sort_by=None, row_group_size=None, index_columns=None,
+                                write_page_index=False):
     """
     Writes DataFrame to a Parquet file with optional metadata. Saves a historical copy
     in a 'historical' subdirectory without affecting the original file's write process.
@@ -714,6 +618,7 @@ def df_write_to_pq_with_history(df, file_path, metadata=None):
         df: DataFrame to write.
         file_path (str): Target Parquet file path.
         metadata (dict, optional): Custom metadata to include in the Parquet file.
+        sort_by, row_group_size, index_columns, write_page_index: Layout of the main file, see write_table_for_lookups.
     """
     table = pa.Table.from_pandas(df)
 
@@ -724,7 +629,7 @@ def df_write_to_pq_with_history(df, file_path, metadata=None):
         table = table.replace_schema_metadata(updated_metadata)
     
     # Write the table to Parquet file as before
-    pq.write_table(table, file_path)
+    write_table_for_lookups(table, file_path, sort_by, row_group_size, index_columns, write_page_index)
     print(f"DataFrame written to {file_path}.")
 
     # For historical copy: Prepare metadata including timestamp
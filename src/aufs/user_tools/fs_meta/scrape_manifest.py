@@ -0,0 +1,73 @@
+# src/aufs/user_tools/fs_meta/scrape_manifest.py
+
+import os
+import json
+import hashlib
+import pandas as pd
+import pyarrow.parquet as pq
+
+from .parquet_tools import df_write_to_pq
+
+# Directories modified this close to the start of a scrape may change again within the
+# filesystem's mtime resolution, so they're always re-listed on the next scrape.
+MTIME_GRACE_NS = 2 * 10**9
+
+def scrape_manifest_path(manifest_dir, root_paths, exclude_patterns):
+    """
+    Returns the manifest file used for a given set of root paths and exclude patterns.
+    Different scrape scopes keep separate manifests.
+    """
+    key_input = json.dumps({"paths": sorted(os.fspath(p) for p in root_paths), "exclude": list(exclude_patterns)})
+    key = hashlib.sha256(key_input.encode()).hexdigest()[:16]
+    return os.path.join(manifest_dir, f"scrape_manifest-{key}.parquet")
+
+def load_scrape_manifest(manifest_path):
+    """
+    Reads a scrape manifest.
+
+    Args:
+        manifest_path (str): Path to the manifest Parquet file.
+
+    Returns:
+        tuple: (dict of dir path -> (mtime_ns, child_count, subdirs), dict of manifest metadata).
+               Both are empty if there is no usable manifest.
+    """
+    if not os.path.exists(manifest_path):
+        return {}, {}
+
+    try:
+        table = pq.read_table(manifest_path)
+    except Exception as e:
+        print(f"Could not read scrape manifest {manifest_path}: {e}")
+        return {}, {}
+
+    metadata = {k.decode('utf-8'): v.decode('utf-8') for k, v in (table.schema.metadata or {}).items()
+                if not k.startswith(b'pandas')}
+    columns = table.to_pydict()
+    directories = {
+        directory: (mtime_ns, child_count, subdirs or [])
+        for directory, mtime_ns, child_count, subdirs in zip(
+            columns['DIRECTORY'], columns['MTIME_NS'], columns['CHILDCOUNT'], columns['SUBDIRS'])
+    }
+    return directories, metadata
+
+def write_scrape_manifest(manifest_path, blocks, scrape_start_ns, metadata=None):
+    """
+    Writes the directory blocks returned by ScandirWalker.walk_incremental as a manifest.
+
+    Args:
+        manifest_path (str): Path to the manifest Parquet file.
+        blocks (list of tuple): (dir_path, results, mtime_ns, child_count, subdirs) per directory.
+        scrape_start_ns (int): time.time_ns() taken before the walk started.
+        metadata (dict, optional): String metadata, e.g. the SNAPSHOT the rows were written to.
+    """
+    racy_after = scrape_start_ns - MTIME_GRACE_NS
+    manifest_df = pd.DataFrame({
+        'DIRECTORY': [block[0] for block in blocks],
+        'MTIME_NS': [block[2] if block[2] < racy_after else -1 for block in blocks],
+        'CHILDCOUNT': [block[3] for block in blocks],
+        'SUBDIRS': [block[4] for block in blocks],
+    })
+
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    df_write_to_pq(manifest_df, manifest_path, metadata=metadata)
@@ -1,5 +1,6 @@
 # sequences.py
 import pandas as pd
+import numpy as np
 import itertools
 import re
 
@@ -41,14 +42,13 @@ def seqs_tidyup_v2(df):
     # Ensure CREATION_TIME is parsed as datetime
     df['CREATION_TIME'] = pd.to_datetime(df['CREATION_TIME'], errors='coerce')
     
-    # Convert SEQUENCEPOSITION to a list of integers if they are digit strings, otherwise keep as None
-    df['SEQUENCEPOSITION'] = df['SEQUENCEPOSITION'].apply(lambda x: [int(i) for i in x.split(',') if i.isdigit()] if pd.notnull(x) else x)
 
     # Check for sequences that require work (more than one row with the same 'SEQUENCENAME')
     sequence_counts = df.groupby('SEQUENCENAME').size()
     
     # If there are no sequences requiring processing, return the original dataframe
     if sequence_counts.max() <= 1:
+        df['SEQUENCEPOSITION'] = position_lists(df['SEQUENCEPOSITION'])
         return df
 
     sequences_to_process = sequence_counts[sequence_counts > 1].reset_index()[['SEQUENCENAME']]
@@ -56,6 +56,7 @@ def seqs_tidyup_v2(df):
     # Split the DataFrame into rows that need processing and rows that don't
     needs_processing = df[df['SEQUENCENAME'].astype(bool)].copy()
     untouched = df[~df['SEQUENCENAME'].astype(bool)].copy()
+    untouched['SEQUENCEPOSITION'] = position_lists(untouched['SEQUENCEPOSITION'])
     
     # Select one row per group to preserve all the identical values
     # This will be merged back after the aggregation
@@ -66,29 +67,20 @@ def seqs_tidyup_v2(df):
     
     # Define the aggregation operations for necessary columns
     agg_operations = {
-        'SEQUENCEPOSITION': lambda x: sorted(set([i for sublist in x for i in sublist])),  # flatten and sort
         'FILESIZE': 'sum',
         'CREATION_TIME': 'max'
     }
     
-    # Group by 'SEQUENCENAME' and aggregate
+    # Group by 'SEQUENCENAME' and aggregate, frames are summarised as sorted arrays per sequence
     grouped = needs_processing.groupby('SEQUENCENAME', as_index=False).agg(agg_operations)
+    frames = sequence_frame_summary(needs_processing['SEQUENCENAME'], needs_processing['SEQUENCEPOSITION'])
+    grouped = pd.merge(frames, grouped, on='SEQUENCENAME', how='right')
     # Merge the base rows to preserve all unaffected columns
     final_processed = pd.merge(base_rows.drop(columns=['SEQUENCEPOSITION', 'FILESIZE', 'CREATION_TIME']), grouped, on='SEQUENCENAME', how='left')
 
     # Update the 'FILE' column with 'SEQUENCENAME'
     final_processed['FILE'] = final_processed['SEQUENCENAME']
     
-    # Extract the FIRST and LAST frames from SEQUENCEPOSITION
-    final_processed['FIRSTFRAME'] = final_processed['SEQUENCEPOSITION'].apply(lambda x: str(x[0]) if x else '')
-    final_processed['LASTFRAME'] = final_processed['SEQUENCEPOSITION'].apply(lambda x: str(x[-1]) if x else '')
-    final_processed['FRAMERANGE'] = final_processed['SEQUENCEPOSITION'].apply(lambda x: format_ranges(x) if x else '')
-
-    
-
-    # Calculate the missing frames
-    final_processed['MISSINGFRAMES'] = final_processed['SEQUENCEPOSITION'].apply(lambda x: calculate_missing_frames(x) if x else '')
-    
     # Combine the processed rows with the untouched rows and retain all columns
     final_df = pd.concat([final_processed, untouched], ignore_index=True, sort=False)
     
@@ -98,53 +90,173 @@ def seqs_tidyup_v2(df):
     
     return final_df
 
-def parse_missing_frames(missing_frames_str):
-    """Parse a MISSINGFRAMES string and return a set of individual missing frame numbers."""
-    frame_set = set()
-    for part in missing_frames_str.split(', '):
+def parse_frame_runs(frames_str):
+    """Parse a FRAMERANGE or MISSINGFRAMES string into a list of (start, end) runs."""
+    runs = []
+    for part in frames_str.split(', '):
         if '-' in part:
             start, end = map(int, part.split('-'))
-            frame_set.update(range(start, end + 1))
         else:
-            frame_set.add(int(part))
+            start = end = int(part)
+        if start <= end:
+            runs.append((start, end))
+    return runs
+
+def parse_missing_frames(missing_frames_str):
+    """Parse a MISSINGFRAMES string and return a set of individual missing frame numbers."""
+    frame_set = set()
+    for start, end in parse_frame_runs(missing_frames_str):
+        frame_set.update(range(start, end + 1))
     return frame_set
 
 def aggregate_missing_frames(missing_frames_series):
     """Aggregate MISSINGFRAMES from a series of strings into a single string."""
-    all_frames = set()
-    for frames_str in missing_frames_series:
-        all_frames.update(parse_missing_frames(frames_str))
-    return format_ranges(sorted(all_frames))
+    # Merge the runs directly rather than expanding them to frames
+    merged = []
+    for start, end in sorted(run for frames_str in missing_frames_series for run in parse_frame_runs(frames_str)):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return format_runs([run[0] for run in merged], [run[1] for run in merged])
+
+def frame_runs(frames):
+    """
+    Splits an array of frame numbers into runs of consecutive frames.
+
+    Args:
+        frames (array-like of int): Frame numbers, normally sorted and unique.
+
+    Returns:
+        tuple: (starts, ends) arrays, one entry per run.
+    """
+    frames = np.asarray(frames)
+    if len(frames) == 0:
+        return frames[:0], frames[:0]
+    breaks = np.flatnonzero(np.diff(frames) != 1) + 1
+    starts = frames[np.concatenate(([0], breaks))]
+    ends = frames[np.concatenate((breaks - 1, [len(frames) - 1]))]
+    return starts, ends
+
+def format_runs(starts, ends):
+    """Formats runs as '1001-1010, 1012, 1014-1020'."""
+    return ", ".join(str(start) if start == end else f"{start}-{end}" for start, end in zip(list(starts), list(ends)))
 
 def format_ranges(number_list):
     # Ensure all elements are integers
     cleaned_list = [int(x) for x in number_list if isinstance(x, int) or (isinstance(x, str) and x.isdigit())]
-    ranges = []
-    for k, g in itertools.groupby(enumerate(cleaned_list), lambda ix: ix[0] - ix[1]):
-        group = list(map(lambda x: x[1], g))
-        if len(group) > 1:
-            ranges.append(f"{group[0]}-{group[-1]}")
-        else:
-            ranges.append(str(group[0]))
-    return ", ".join(ranges)
+    return format_runs(*frame_runs(cleaned_list))
 
 def calculate_missing_frames(sequence_positions):
     """Calculate missing frames from a list of sequence positions."""
-    if not sequence_positions:
+    if len(sequence_positions) == 0:
         return ''
     
-    full_range = set(range(sequence_positions[0], sequence_positions[-1] + 1))
-    existing_frames = set(sequence_positions)
-    missing_frames = sorted(full_range - existing_frames)
+    positions = np.asarray(sequence_positions)
+    first, last = positions[0], positions[-1]
+    existing_frames = np.unique(positions[(positions >= first) & (positions <= last)])
+    starts, ends = frame_runs(existing_frames)
     
-    return format_ranges(missing_frames)
+    # The missing frames are the gaps between runs of existing ones
+    return format_runs(ends[:-1] + 1, starts[1:] - 1)
+
+def position_lists(positions):
+    """Convert SEQUENCEPOSITION strings to lists of integers, keeping only digit strings. Nulls stay as they are."""
+    return positions.apply(lambda x: [int(i) for i in x.split(',') if i.isdigit()] if pd.notnull(x) else x)
+
+def sequence_position_frames(positions):
+    """
+    Parses SEQUENCEPOSITION strings ('1001', or '1001,1002') into frame numbers without
+    building a list per row. Only digit strings count as frames, as in position_lists.
+
+    Args:
+        positions (pd.Series): SEQUENCEPOSITION strings.
+
+    Returns:
+        tuple: (rows, frames) int arrays, the row number in positions each frame came from and the frame.
+    """
+    positions = positions.reset_index(drop=True)
+    single = positions.str.isdigit().eq(True).to_numpy()
+    rows = [np.flatnonzero(single)]
+    frames = [positions[single].astype(np.int64).to_numpy()]
+
+    multiple = positions[~single & positions.str.contains(',', regex=False).eq(True).to_numpy()]
+    if len(multiple):
+        parts = multiple.str.split(',').explode()
+        parts = parts[parts.str.isdigit().eq(True)]
+        rows.append(parts.index.to_numpy())
+        frames.append(parts.astype(np.int64).to_numpy())
+
+    return np.concatenate(rows).astype(np.int64), np.concatenate(frames).astype(np.int64)
+
+def sequence_frame_summary(sequence_names, positions):
+    """
+    Summarises the frames of each sequence using sorted integer arrays, so the frame
+    ranges come straight from the runs of consecutive frames.
+
+    Args:
+        sequence_names (pd.Series): SEQUENCENAME of each row.
+        positions (pd.Series): SEQUENCEPOSITION string of each row.
+
+    Returns:
+        pd.DataFrame: One row per sequence with SEQUENCENAME, SEQUENCEPOSITION (sorted unique frames
+                      as a list), FIRSTFRAME, LASTFRAME, FRAMERANGE and MISSINGFRAMES.
+    """
+    codes, names = pd.factorize(sequence_names)
+    rows, frames = sequence_position_frames(positions)
+    frame_codes = codes[rows]
+
+    # Sort by sequence then frame and drop duplicate frames
+    keep = frame_codes >= 0
+    frames, frame_codes = frames[keep], frame_codes[keep]
+    order = np.lexsort((frames, frame_codes))
+    frames, frame_codes = frames[order], frame_codes[order]
+    unique = np.ones(len(frames), dtype=bool)
+    unique[1:] = (frame_codes[1:] != frame_codes[:-1]) | (frames[1:] != frames[:-1])
+    frames, frame_codes = frames[unique], frame_codes[unique]
+
+    if len(frames) == 0:
+        # No row has a digit frame, so every sequence gets an empty summary
+        return pd.DataFrame({
+            'SEQUENCENAME': names,
+            'SEQUENCEPOSITION': [[] for _ in range(len(names))],
+            'FIRSTFRAME': '',
+            'LASTFRAME': '',
+            'FRAMERANGE': '',
+            'MISSINGFRAMES': '',
+        })
+
+    # A run starts wherever the sequence changes or the frames stop being consecutive
+    run_start = np.ones(len(frames), dtype=bool)
+    run_start[1:] = (frame_codes[1:] != frame_codes[:-1]) | (np.diff(frames) != 1)
+    run_starts_at = np.flatnonzero(run_start)
+    run_ends_at = np.append(run_starts_at[1:] - 1, len(frames) - 1).astype(np.int64)
+    starts = frames[run_starts_at].tolist()
+    ends = frames[run_ends_at].tolist()
+
+    group_ids = np.arange(len(names) + 1)
+    frame_bounds = np.searchsorted(frame_codes, group_ids).tolist()
+    run_bounds = np.searchsorted(frame_codes[run_starts_at], group_ids).tolist()
+    frames = frames.tolist()
+
+    summary = {'SEQUENCEPOSITION': [], 'FIRSTFRAME': [], 'LASTFRAME': [], 'FRAMERANGE': [], 'MISSINGFRAMES': []}
+    for group in range(len(names)):
+        first_run, last_run = run_bounds[group], run_bounds[group + 1]
+        group_starts, group_ends = starts[first_run:last_run], ends[first_run:last_run]
+        summary['SEQUENCEPOSITION'].append(frames[frame_bounds[group]:frame_bounds[group + 1]])
+        summary['FIRSTFRAME'].append(str(group_starts[0]) if group_starts else '')
+        summary['LASTFRAME'].append(str(group_ends[-1]) if group_ends else '')
+        summary['FRAMERANGE'].append(format_runs(group_starts, group_ends))
+        summary['MISSINGFRAMES'].append(format_runs([end + 1 for end in group_ends[:-1]], [start - 1 for start in group_starts[1:]]))
+
+    summary_df = pd.DataFrame(summary)
+    summary_df.insert(0, 'SEQUENCENAME', names)
+    return summary_df
 
 def seqs_tidyup_v3(df):
     # Ensure CREATION_TIME is parsed as datetime
     df['CREATION_TIME'] = pd.to_datetime(df['CREATION_TIME'], errors='coerce')
     
-    # Convert SEQUENCEPOSITION to a list of integers if they are digit strings, otherwise keep as None
-    df['SEQUENCEPOSITION'] = df['SEQUENCEPOSITION'].apply(lambda x: [int(i) for i in x.split(',') if i.isdigit()] if pd.notnull(x) else x)
 
     # Count sequences to determine which need processing and which are single
     sequence_counts = df.groupby('SEQUENCENAME').size()
@@ -152,29 +264,23 @@ def seqs_tidyup_v3(df):
 
     # Identify single file sequences
     singles = sequence_counts[sequence_counts == 1].index
-    print(singles)
-    print("let's see if the singles get processed")
     
     # Clean up sequence metadata for singles
     if not singles.empty:
         singles_df = df[df['SEQUENCENAME'].isin(singles)].copy()
-        print(singles_df)
-        print("did we get our singles into a dataframe????")
         # Assuming FILE is formatted like 'filename.%04d.ext' and FIRSTFRAME is an integer
         singles_df['FILE'] = singles_df.apply(lambda row: '.'.join([row['FILE'].split('.')[0], str(row['FIRSTFRAME']), row['FILE'].split('.')[-1]]), axis=1)
-        print(singles_df)
-        print("did we get our single's names sorted????")
         singles_df.drop(['FIRSTFRAME', 'LASTFRAME', 'PADDING', 'MISSINGFRAMES'], axis=1, inplace=True)
     else:
         singles_df = pd.DataFrame()
 
     # Check for sequences that require work (more than one row with the same 'SEQUENCENAME')
-    print(singles_df)
     if sequence_counts.max() <= 1:
+        df['SEQUENCEPOSITION'] = position_lists(df['SEQUENCEPOSITION'])
+        singles_df['SEQUENCEPOSITION'] = position_lists(singles_df['SEQUENCEPOSITION'])
         return pd.concat([singles_df, df[~df['SEQUENCENAME'].isin(singles)]], ignore_index=True, sort=False)
 
     sequences_to_process = sequence_counts[sequence_counts > 1].index
-    print(sequences_to_process)
     
     # Split the DataFrame into rows that need processing and rows that don't
     needs_processing = df[df['SEQUENCENAME'].isin(sequences_to_process)].copy()
@@ -183,11 +289,13 @@ def seqs_tidyup_v3(df):
     # Process sequences with more than one file
     needs_processing['FILESIZE'] = pd.to_numeric(needs_processing['FILESIZE'], errors='coerce')
     agg_operations = {
-        'SEQUENCEPOSITION': lambda x: format_ranges(sorted(set([i for sublist in x for i in sublist]))),
         'FILESIZE': 'sum',
         'CREATION_TIME': 'max'
     }
     grouped = needs_processing.groupby('SEQUENCENAME', as_index=False).agg(agg_operations)
+    frames = sequence_frame_summary(needs_processing['SEQUENCENAME'], needs_processing['SEQUENCEPOSITION'])
+    frames = frames[['SEQUENCENAME', 'FRAMERANGE']].rename(columns={'FRAMERANGE': 'SEQUENCEPOSITION'})
+    grouped = pd.merge(frames, grouped, on='SEQUENCENAME', how='right')
     base_rows = needs_processing.drop_duplicates(subset='SEQUENCENAME', keep='first')
     final_processed = pd.merge(base_rows.drop(columns=['SEQUENCEPOSITION', 'FILESIZE', 'CREATION_TIME']), grouped, on='SEQUENCENAME', how='left')
     
@@ -200,8 +308,52 @@ def seqs_tidyup_v3(df):
     
     return final_df
 
-def expand_sequences(row):
-    """Expands sequence rows into individual frame rows if applicable, preserving action_type."""
+# Matches printf style frame tokens such as %04d or %d
+FRAME_TOKEN_PATTERN = re.compile(r'%(\d*)d')
+
+def sequence_format_template(path, token=None):
+    """
+    Turns a sequence path into a str.format template with the frame as field 0, so each
+    frame is a single format call, e.g. 'a.%04d.exr' -> 'a.{0:04d}.exr'.
+
+    Args:
+        path (str): Sequence path.
+        token (str, optional): Only replace this literal token, e.g. '%04d'. By default every
+                               %d style token is replaced with its own padding.
+
+    Returns:
+        str: The format template.
+    """
+    def escape(text):
+        return text.replace('{', '{{').replace('}', '}}')
+
+    if token is not None:
+        field = f'{{0:{token[1:-1]}d}}'
+        return field.join(escape(part) for part in path.split(token))
+
+    parts = FRAME_TOKEN_PATTERN.split(path)
+    template = []
+    for i, part in enumerate(parts):
+        if i % 2 == 0:
+            template.append(escape(part))
+        else:
+            template.append(f'{{0:0{part}d}}' if part else '{0}')
+    return ''.join(template)
+
+def iter_in_chunks(iterable, chunk_size):
+    """Yields lists of up to chunk_size items from iterable."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def iter_expanded_sequence(row):
+    """
+    Lazily expands a sequence row into one row per frame, preserving action_type.
+    Yields the same dicts expand_sequences returns, one at a time.
+    """
     # Normalize keys to expected format
     normalized_row = {
         'src': row.get('SRC') or row.get('src'),
@@ -212,27 +364,19 @@ def expand_sequences(row):
         'inputfirstframe': int(row.get('INPUTFIRSTFRAME') or row.get('inputfirstframe')),
         'increment': int(row.get('INCREMENT') or row.get('increment', 1))
     }
-    # print("Normalised row dest: ")
-    # print(normalized_row['dest'])
-    expanded_rows = []
-    pattern = re.compile(r'%(\d*)d')
+    src_template = sequence_format_template(normalized_row['src'])
+    dest_template = sequence_format_template(normalized_row['dest'])
+    target_template = sequence_format_template(normalized_row['target'])
+
     for i in range(normalized_row['numberofframes']):
         frame = normalized_row['inputfirstframe'] + i * normalized_row['increment']
-        def replacer(match):
-            padding = match.group(1)
-            format_str = f'{{:0{padding}d}}' if padding else '{}'
-            return format_str.format(frame)
-        
-        src_formatted = pattern.sub(replacer, normalized_row['src'])
-        dest_formatted = pattern.sub(replacer, normalized_row['dest'])
-        target_formatted = pattern.sub(replacer, normalized_row['target'])
-        
-        expanded_rows.append({
-            'src': src_formatted,
-            'dest': dest_formatted,
-            'target': target_formatted,
+        yield {
+            'src': src_template.format(frame),
+            'dest': dest_template.format(frame),
+            'target': target_template.format(frame),
             'action_type': normalized_row['actiontype'],  # Ensure this matches the DataFrame column exactly
-        })
-        
-    return expanded_rows
+        }
 
+def expand_sequences(row):
+    """Expands sequence rows into individual frame rows if applicable, preserving action_type."""
+    return list(iter_expanded_sequence(row))
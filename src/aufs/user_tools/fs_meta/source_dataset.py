@@ -0,0 +1,193 @@
+# src/aufs/user_tools/fs_meta/source_dataset.py
+
+import os
+import uuid
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# source_main is laid out as CLIENT=.../PROJECT=.../SHOTNAME=.../*.parquet
+SOURCE_PARTITION_COLUMNS = ['CLIENT', 'PROJECT', 'SHOTNAME']
+
+def source_partitioning(partition_cols=None):
+    """
+    Hive partitioning with every partition column read as a string, so shots like '0010' keep their zeros.
+    """
+    partition_cols = partition_cols or SOURCE_PARTITION_COLUMNS
+    return ds.partitioning(pa.schema([(column, pa.string()) for column in partition_cols]), flavor='hive')
+
+def open_source_dataset(dataset_dir, partition_cols=None):
+    """
+    Opens a partitioned source_main directory as a pyarrow dataset. Only the directory listing
+    and file footers are read here, rows are read when the dataset is scanned.
+    """
+    return ds.dataset(os.fspath(dataset_dir), format='parquet', partitioning=source_partitioning(partition_cols))
+
+def source_filter(filters=None, client=None, project=None, shotname=None):
+    """
+    Builds a dataset filter expression.
+
+    Args:
+        filters (list or ds.Expression, optional): Either an expression, or pandas/pyarrow style
+                                                   [(column, op, value), ...] tuples that must all hold.
+        client, project, shotname (str or list, optional): Partition values to keep. A list keeps any of them.
+
+    Returns:
+        ds.Expression or None: None if there's nothing to filter on.
+    """
+    expression = None
+    if filters is not None:
+        expression = filters if isinstance(filters, ds.Expression) else pq.filters_to_expression(filters)
+
+    for column, value in (('CLIENT', client), ('PROJECT', project), ('SHOTNAME', shotname)):
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            condition = ds.field(column).isin(list(value))
+        else:
+            condition = ds.field(column) == value
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def read_source_dataset(dataset_dir, filters=None, columns=None, client=None, project=None, shotname=None,
+                        partition_cols=None):
+    """
+    Reads rows of a partitioned source_main.
+
+    Conditions on the partition columns skip whole partition directories without opening
+    them, and conditions on other columns (e.g. FILE) skip row groups whose statistics
+    can't match, so reading one shot only touches that shot's files.
+
+    Args:
+        dataset_dir (str): Root of the partitioned source_main.
+        filters (list or ds.Expression, optional): See source_filter.
+        columns (list, optional): Columns to read, all of them if None.
+        client, project, shotname (str or list, optional): Partition values to keep.
+        partition_cols (list, optional): Partition columns, SOURCE_PARTITION_COLUMNS by default.
+
+    Returns:
+        pd.DataFrame: The matching rows. Empty if the dataset doesn't exist yet.
+    """
+    if not os.path.isdir(dataset_dir):
+        return pd.DataFrame(columns=columns or [])
+    dataset = open_source_dataset(dataset_dir, partition_cols)
+    expression = source_filter(filters, client, project, shotname)
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+def source_dataset_partitions(dataset_dir, partition_cols=None):
+    """
+    Lists the partitions of a source_main dataset from its directory structure, without reading any rows.
+
+    Returns:
+        pd.DataFrame: One row per partition directory, with a column per partition column.
+    """
+    partition_cols = partition_cols or SOURCE_PARTITION_COLUMNS
+    if not os.path.isdir(dataset_dir):
+        return pd.DataFrame(columns=partition_cols)
+    dataset = open_source_dataset(dataset_dir, partition_cols)
+    partitions = [ds.get_partition_keys(fragment.partition_expression) for fragment in dataset.get_fragments()]
+    return pd.DataFrame(partitions, columns=partition_cols).drop_duplicates().reset_index(drop=True)
+
+def write_source_dataset(df, dataset_dir, partition_cols=None, replace_partitions=True, sort_by='FILE'):
+    """
+    Writes rows to a partitioned source_main.
+
+    Args:
+        df (pd.DataFrame or pa.Table): Rows to write. Missing partition columns are added as ''.
+        dataset_dir (str): Root of the partitioned source_main.
+        partition_cols (list, optional): Partition columns, SOURCE_PARTITION_COLUMNS by default.
+        replace_partitions (bool): Replace the partitions df has rows for, leaving the others as they are.
+                                   When False the rows are added to those partitions.
+        sort_by (str, optional): Sort rows by this column within each file, which makes row group
+                                 statistics useful for filters on it.
+    """
+    partition_cols = partition_cols or SOURCE_PARTITION_COLUMNS
+    if isinstance(df, pd.DataFrame):
+        df = df.copy()
+        for column in partition_cols:
+            if column not in df.columns:
+                df[column] = ''
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    else:
+        table = df
+        for column in partition_cols:
+            if column not in table.column_names:
+                table = table.append_column(column, pa.array([''] * table.num_rows, pa.string()))
+
+    # Partition values are always strings, see source_partitioning
+    for column in partition_cols:
+        if not pa.types.is_string(table.schema.field(column).type):
+            table = table.set_column(table.schema.get_field_index(column), column, table[column].cast(pa.string()))
+    if sort_by and sort_by in table.column_names:
+        table = table.sort_by(sort_by)
+
+    os.makedirs(dataset_dir, exist_ok=True)
+    ds.write_dataset(
+        table,
+        os.fspath(dataset_dir),
+        format='parquet',
+        partitioning=source_partitioning(partition_cols),
+        # Unique names, so added rows never overwrite another write's files
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior='delete_matching' if replace_partitions else 'overwrite_or_ignore',
+    )
+
+def source_partition_dir(dataset_dir, values, partition_cols=None):
+    """
+    The directory holding one partition, e.g. {'CLIENT': 'c', 'PROJECT': 'p', 'SHOTNAME': '0010'}.
+    Leading partition columns can be given alone for the directory above them.
+    """
+    partition_cols = partition_cols or SOURCE_PARTITION_COLUMNS
+    path = os.fspath(dataset_dir)
+    for column in partition_cols:
+        if column not in values:
+            break
+        path = os.path.join(path, f"{column}={values[column]}")
+    return path
+
+def delete_source_entries(dataset_dir, files=None, sequence_names=None, partition_cols=None, **values):
+    """
+    Removes rows by FILE or SEQUENCENAME from one partition of a source_main dataset. Only that
+    partition is read and rewritten.
+
+    Args:
+        dataset_dir (str): Root of the partitioned source_main.
+        files (list, optional): FILE values to remove.
+        sequence_names (list, optional): SEQUENCENAME values to remove. Empty names are ignored.
+        partition_cols (list, optional): Partition columns, SOURCE_PARTITION_COLUMNS by default.
+        **values: The partition, e.g. CLIENT='c', PROJECT='p', SHOTNAME='0010'.
+
+    Returns:
+        int: Rows removed.
+    """
+    partition_cols = partition_cols or SOURCE_PARTITION_COLUMNS
+    partition_dir = source_partition_dir(dataset_dir, values, partition_cols)
+    if not os.path.isdir(partition_dir):
+        return 0
+    filters = [(column, '==', value) for column, value in values.items()]
+    df = read_source_dataset(dataset_dir, filters=filters, partition_cols=partition_cols)
+
+    remove = pd.Series(False, index=df.index)
+    if files is not None and 'FILE' in df.columns:
+        remove |= df['FILE'].isin(list(files))
+    sequence_names = [name for name in (sequence_names or []) if isinstance(name, str) and name]
+    if sequence_names and 'SEQUENCENAME' in df.columns:
+        remove |= df['SEQUENCENAME'].isin(sequence_names)
+    if not remove.any():
+        return 0
+
+    # An empty partition writes no files, so the old ones are removed here rather than replaced
+    shutil.rmtree(partition_dir)
+    kept = df[~remove]
+    if len(kept):
+        write_source_dataset(kept, dataset_dir, partition_cols)
+    return int(remove.sum())
+
+def convert_source_main_to_dataset(source_path, dataset_dir, partition_cols=None):
+    """
+    Writes a single-file source_main out as a partitioned dataset.
+    """
+    write_source_dataset(pq.read_table(source_path), dataset_dir, partition_cols)
+    print(f"Partitioned {source_path} into {dataset_dir}.")
@@ -0,0 +1,245 @@
+# src/aufs/user_tools/fs_meta/source_dedup.py
+
+import os
+import json
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from .parquet_tools import df_write_to_pq
+from .parquet_lookup import LOOKUP_ROW_GROUP_SIZE
+from .start_manifest import live_start_files
+
+# Columns the dedup decisions are made on, the only ones kept in the index
+DEDUP_KEY_COLUMNS = ['HASHEDFILE', 'ENTRYTIME', 'FILE']
+INDEX_FILE_NAME = 'hashedfile_index.parquet'
+
+def start_files(start_dir, pattern="*.parquet"):
+    """
+    Returns the live scrape files in start_dir matching pattern, sorted by name. Scrape files are
+    named '{timestamp}-{scrape_id}.parquet', so this is the order they were written in. Files
+    merged by start_compaction are listed as the compacted file holding their rows.
+    """
+    return live_start_files(start_dir, pattern)
+
+def dedup_source_frame(df):
+    """
+    The start/ dedup rules: keep the row with the latest ENTRYTIME for each HASHEDFILE (the last
+    one read if there's a tie), then the first row for each FILE, in HASHEDFILE order.
+    """
+    df_sorted = df.sort_values(by=["HASHEDFILE", "ENTRYTIME"])
+    df_deduplicated = df_sorted.drop_duplicates(subset=["HASHEDFILE"], keep='last')
+    return df_deduplicated.drop_duplicates(subset=["FILE"], keep='first')
+
+def full_source_dedup(start_dir, pattern="*.parquet"):
+    """
+    Dedups every scrape file in start_dir from scratch.
+
+    Returns:
+        pd.DataFrame: The deduplicated rows, with a fresh index.
+    """
+    files = start_files(start_dir, pattern)
+    if not files:
+        return pd.DataFrame()
+    df = pd.concat([pd.read_parquet(file) for file in files], ignore_index=True)
+    return dedup_source_frame(df).reset_index(drop=True)
+
+def _file_signature(path):
+    stat_result = os.stat(path)
+    return [os.path.basename(path), stat_result.st_size, stat_result.st_mtime_ns]
+
+def _data_columns(path):
+    """
+    The columns pd.read_parquet gives for path, leaving out any stored pandas index.
+    """
+    schema = pq.read_schema(path)
+    pandas_metadata = schema.pandas_metadata or {}
+    index_columns = {column for column in pandas_metadata.get('index_columns', []) if isinstance(column, str)}
+    return [name for name in schema.names if name not in index_columns]
+
+def load_dedup_index(state_dir):
+    """
+    Reads the HASHEDFILE index kept by incremental_source_dedup.
+
+    Returns:
+        tuple: (index DataFrame, dict of index metadata). The DataFrame is None if there is no usable index.
+    """
+    index_path = os.path.join(state_dir, INDEX_FILE_NAME)
+    if not os.path.exists(index_path):
+        return None, {}
+    try:
+        table = pq.read_table(index_path)
+        metadata = {k.decode('utf-8'): json.loads(v) for k, v in (table.schema.metadata or {}).items()
+                    if not k.startswith(b'pandas')}
+        return table.to_pandas(), metadata
+    except Exception as e:
+        print(f"Could not read dedup index {index_path}, rebuilding: {e}")
+        return None, {}
+
+def _index_file_state(index_path):
+    if not os.path.exists(index_path):
+        return None
+    stat_result = os.stat(index_path)
+    return (stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns)
+
+def _write_dedup_index(state_dir, index_df, processed, columns):
+    os.makedirs(state_dir, exist_ok=True)
+    index_path = os.path.join(state_dir, INDEX_FILE_NAME)
+    previous_state = _index_file_state(index_path)
+    # Replaced in one rename, so readers see either the old index or the new one
+    df_write_to_pq(index_df, index_path, metadata={
+        'PROCESSED': json.dumps(processed),
+        'COLUMNS': json.dumps(columns),
+        'STATE_ID': json.dumps(uuid.uuid4().hex),
+    })
+    if _index_file_state(index_path) in (None, previous_state):
+        raise RuntimeError(f"Could not write dedup index {index_path}")
+
+def _read_keys(path):
+    keys = pd.read_parquet(path, columns=DEDUP_KEY_COLUMNS)
+    keys['SOURCE'] = os.path.basename(path)
+    keys['ROW'] = np.arange(len(keys), dtype=np.int64)
+    return keys
+
+def update_dedup_index(start_dir, state_dir, pattern="*.parquet", rebuild=False):
+    """
+    Folds scrape files that arrived in start_dir since the last call into the HASHEDFILE index.
+
+    The index holds one row per HASHEDFILE that has survived the first dedup stage so far:
+    its ENTRYTIME and FILE, and the row's location as the scrape file name (SOURCE) and row
+    number (ROW). New files compete against the index only, so the cost depends on the
+    number of distinct files and new rows, not on the whole scrape history.
+    The index is rebuilt from scratch if a scrape file it already holds has changed or
+    gone, or a new file sorts before one it already holds, as ties are decided by file order.
+
+    Args:
+        start_dir (str): Directory the scrapes are written to.
+        state_dir (str): Directory the index is kept in.
+        pattern (str): Glob pattern of the scrape files.
+        rebuild (bool): Ignore any existing index.
+
+    Returns:
+        tuple: (index DataFrame, list of processed file signatures, list of columns of the scrape files).
+    """
+    files = start_files(start_dir, pattern)
+    signatures = {os.path.basename(path): _file_signature(path) for path in files}
+
+    index_df, metadata = (None, {}) if rebuild else load_dedup_index(state_dir)
+    processed = metadata.get('PROCESSED', [])
+    columns = metadata.get('COLUMNS', [])
+
+    if index_df is not None:
+        unchanged = all(signatures.get(name) == [name, size, mtime_ns] for name, size, mtime_ns in processed)
+        processed_names = {entry[0] for entry in processed}
+        last_processed = max(processed_names, default='')
+        in_order = all(name > last_processed for name in signatures if name not in processed_names)
+        if not (unchanged and in_order):
+            print("Scrape files have changed since the dedup index was built, rebuilding it.")
+            index_df, processed, columns = None, [], []
+
+    processed_names = {entry[0] for entry in processed}
+    new_files = [path for path in files if os.path.basename(path) not in processed_names]
+    if index_df is not None and not new_files:
+        return index_df, processed, columns
+
+    # Existing entries go first, so a new row with the same ENTRYTIME wins the tie as it would
+    # in a full rebuild, where the files are read in name order
+    key_frames = [] if index_df is None else [index_df]
+    for path in new_files:
+        key_frames.append(_read_keys(path))
+        columns.extend(column for column in _data_columns(path) if column not in columns)
+        processed.append(signatures[os.path.basename(path)])
+
+    if key_frames:
+        keys = pd.concat(key_frames, ignore_index=True)
+        index_df = keys.sort_values(by=["HASHEDFILE", "ENTRYTIME"]).drop_duplicates(subset=["HASHEDFILE"], keep='last')
+        index_df = index_df.reset_index(drop=True)
+    else:
+        index_df = pd.DataFrame({column: pd.Series(dtype=object) for column in DEDUP_KEY_COLUMNS + ['SOURCE', 'ROW']})
+
+    _write_dedup_index(state_dir, index_df, processed, columns)
+    return index_df, processed, columns
+
+def materialize_dedup_index(start_dir, index_df, columns=None):
+    """
+    Reads the rows an index points at back from the scrape files, applying the FILE stage of the dedup.
+
+    Args:
+        start_dir (str): Directory the scrapes are written to.
+        index_df (pd.DataFrame): Index from update_dedup_index.
+        columns (list, optional): Column order of the output, e.g. the columns update_dedup_index returns.
+
+    Returns:
+        pd.DataFrame: The deduplicated rows in HASHEDFILE order, with a fresh index.
+    """
+    final_keys = index_df.drop_duplicates(subset=["FILE"], keep='first').reset_index(drop=True)
+    final_keys['_ORDER'] = np.arange(len(final_keys))
+
+    pieces = []
+    # Name order, so columns are unified in the same order as a full rebuild
+    for source, group in sorted(final_keys.groupby('SOURCE', sort=False), key=lambda item: item[0]):
+        piece = pd.read_parquet(os.path.join(start_dir, source)).reset_index(drop=True)
+        piece = piece.iloc[group['ROW'].to_numpy()]
+        piece.index = group['_ORDER'].to_numpy()
+        pieces.append(piece)
+
+    if not pieces:
+        return pd.DataFrame(columns=columns or [])
+    df = pd.concat(pieces).sort_index().reset_index(drop=True)
+    if columns:
+        df = df.reindex(columns=columns)
+    return df
+
+def incremental_source_dedup(start_dir, state_dir, pattern="*.parquet", output_path=None, rebuild=False, verify=False):
+    """
+    Dedups the scrape files in start_dir like full_source_dedup, folding only the files that
+    arrived since the last call into the index kept in state_dir.
+
+    Args:
+        start_dir (str): Directory the scrapes are written to.
+        state_dir (str): Directory the index is kept in.
+        pattern (str): Glob pattern of the scrape files.
+        output_path (str, optional): Also write the deduplicated rows to this Parquet file.
+        rebuild (bool): Ignore any existing index.
+        verify (bool): Also run a full rebuild and print whether the results match.
+
+    Returns:
+        pd.DataFrame: The deduplicated rows in HASHEDFILE order, with a fresh index.
+    """
+    index_df, processed, columns = update_dedup_index(start_dir, state_dir, pattern, rebuild)
+    df = materialize_dedup_index(start_dir, index_df, columns)
+
+    if verify:
+        compare_dedup_results(df, full_source_dedup(start_dir, pattern))
+
+    if output_path is not None:
+        # Already in HASHEDFILE order, so row group statistics cover HASHEDFILE lookups and the side index FILE ones
+        df_write_to_pq(df, output_path, row_group_size=LOOKUP_ROW_GROUP_SIZE, index_columns=['FILE'])
+    return df
+
+def compare_dedup_results(incremental_df, full_df):
+    """
+    Checks an incremental dedup result against a full rebuild, printing any differences.
+
+    Returns:
+        bool: True if they match.
+    """
+    try:
+        pd.testing.assert_frame_equal(incremental_df.reset_index(drop=True), full_df.reset_index(drop=True))
+    except AssertionError as e:
+        print(f"Incremental dedup doesn't match a full rebuild: {e}")
+        return False
+    print(f"Incremental dedup matches a full rebuild ({len(full_df)} rows).")
+    return True
+
+def verify_incremental_dedup(start_dir, state_dir, pattern="*.parquet"):
+    """
+    Brings the index in state_dir up to date and checks the result against a full rebuild.
+
+    Returns:
+        bool: True if they match.
+    """
+    index_df, processed, columns = update_dedup_index(start_dir, state_dir, pattern)
+    return compare_dedup_results(materialize_dedup_index(start_dir, index_df, columns),
+                                 full_source_dedup(start_dir, pattern))
@@ -1,9 +1,22 @@
 import os
 import pandas as pd
-import glob
-from pyspark.sql import SparkSession, DataFrame
-from pyspark.sql.functions import col, max
-from pyspark.sql.window import Window
+try:
+    from pyspark.sql import SparkSession, DataFrame
+    from pyspark.sql.functions import col, max
+    from pyspark.sql.window import Window
+except ImportError:
+    # Spark is only needed by the Spark variants below, the pandas and Arrow ones work without it
+    SparkSession = DataFrame = col = Window = None
+
+from .source_dedup import dedup_source_frame, start_files
+from .arrow_dedup import arrow_source_dedup
+from .source_dataset import SOURCE_PARTITION_COLUMNS, delete_source_entries
+from .multi_file_loader import MultiFileLoader
+
+def _spark_session(app_name):
+    if SparkSession is None:
+        raise ImportError(f"{app_name} needs pyspark, use the pandas or Arrow variants without it")
+    return SparkSession.builder.appName(app_name).getOrCreate()
 
 def hashedfile_parquet_dedup_forIntranet(input_path):
     # Specify the path to the Python executable for Spark
@@ -11,7 +24,7 @@ def hashedfile_parquet_dedup_forIntranet(input_path):
     os.environ['PYSPARK_PYTHON'] = python_executable_path
     
     # Start Spark session
-    spark = SparkSession.builder.appName("HashedParquetDeduplicationIntranet").getOrCreate()
+    spark = _spark_session("HashedParquetDeduplicationIntranet")
 
     # Read your data into a DataFrame
     df = spark.read.parquet(input_path)
@@ -39,25 +52,19 @@ def hashedfile_parquet_dedup_forIntranet_pandas(input_path):
     file_pattern = input_path + "source_main*.parquet"
     # print(file_pattern)
     
-    # Use glob to find all files matching the pattern
-    files = glob.glob(file_pattern)
+    # Use the start manifest to find all live files matching the pattern
+    # In name (so scrape time) order, which decides ENTRYTIME ties
+    files = start_files(os.path.dirname(file_pattern), os.path.basename(file_pattern))
     # print("Files matched:", files)
     
-    # Read each file into a DataFrame and concatenate them
-    dfs = [pd.read_parquet(file) for file in files]
-    df = pd.concat(dfs, ignore_index=True)
+    # Read the files in parallel and concatenate them as Arrow, in order
+    df = MultiFileLoader().load_parquet_df(files)
     # print("BOO-hassshhhhed")
     # print(df)
 
-    # Deduplication logic, first focusing on "HASHEDFILE"
-    df_sorted = df.sort_values(by=["HASHEDFILE", "ENTRYTIME"])
-    df_deduplicated = df_sorted.drop_duplicates(subset=["HASHEDFILE"], keep='last')
-
-    # Second deduplication stage based on "FILE" column, keeping the first occurrence
-    df_deduplicated_final = df_deduplicated.drop_duplicates(subset=["FILE"], keep='first')
-
-    # Return the deduplicated pandas DataFrame
-    return df_deduplicated_final
+    # Latest ENTRYTIME per "HASHEDFILE", then the first occurrence per "FILE"
+    # (incremental_source_dedup in source_dedup.py gives the same result without re-reading everything)
+    return dedup_source_frame(df)
 
 def source_from_start_pandas_dedup(input_path):
     # print("INPUT PATH???? BOO!")
@@ -67,54 +74,37 @@ def source_from_start_pandas_dedup(input_path):
     file_pattern = input_path + "*.parquet"
     # print(file_pattern)
     
-    # Use glob to find all files matching the pattern
-    files = glob.glob(file_pattern)
+    # Use the start manifest to find all live files matching the pattern
+    # In name (so scrape time) order, which decides ENTRYTIME ties
+    files = start_files(os.path.dirname(file_pattern), os.path.basename(file_pattern))
     # print("Files matched:", files)
     
-    # Read each file into a DataFrame and concatenate them
-    dfs = [pd.read_parquet(file) for file in files]
-    df = pd.concat(dfs, ignore_index=True)
+    # Read the files in parallel and concatenate them as Arrow, in order
+    df = MultiFileLoader().load_parquet_df(files)
     # print("BOO-hassshhhhed")
     # print(df)
 
-    # Deduplication logic, first focusing on "HASHEDFILE"
-    df_sorted = df.sort_values(by=["HASHEDFILE", "ENTRYTIME"])
-    df_deduplicated = df_sorted.drop_duplicates(subset=["HASHEDFILE"], keep='last')
-
-    # Second deduplication stage based on "FILE" column, keeping the first occurrence
-    df_deduplicated_final = df_deduplicated.drop_duplicates(subset=["FILE"], keep='first')
-
-    # Return the deduplicated pandas DataFrame
-    return df_deduplicated_final
+    # Latest ENTRYTIME per "HASHEDFILE", then the first occurrence per "FILE"
+    # (incremental_source_dedup in source_dedup.py gives the same result without re-reading everything)
+    return dedup_source_frame(df)
 
-def hashedfile_parquet_dedup_forIntranet_duckdb(input_path):
-    con = duckdb.connect(database=':memory:')  # Use an in-memory database for processing
+def hashedfile_parquet_dedup_forIntranet_arrow(input_path):
+    """
+    Same result as hashedfile_parquet_dedup_forIntranet_pandas, deduped in Arrow. Only the
+    HASHEDFILE, ENTRYTIME and FILE columns are read for every row, the rest for the surviving rows only.
+    """
+    files = start_files(input_path, "source_main*.parquet")
+    return arrow_source_dedup(files).to_pandas()
 
-    # Construct the file pattern for matching Parquet files (DuckDB can handle wildcards in file paths)
-    file_pattern = input_path + "source_main*.parquet"
+def source_from_start_arrow_dedup(input_path):
+    """
+    Same result as source_from_start_pandas_dedup, deduped in Arrow.
+    """
+    files = start_files(input_path)
+    return arrow_source_dedup(files).to_pandas()
 
-    # Load all matching Parquet files into a DuckDB table
-    df = con.execute(f"SELECT * FROM '{file_pattern}'").df()
-
-    # Deduplication logic, first focusing on "HASHEDFILE"
-    # Sort by HASHEDFILE and ENTRYTIME, then deduplicate keeping the last occurrence
-    con.execute("""
-    CREATE TEMPORARY VIEW dedup1 AS
-    SELECT *, ROW_NUMBER() OVER (PARTITION BY HASHEDFILE ORDER BY ENTRYTIME DESC) as rn
-    FROM df
-    """)
-    df_deduplicated = con.execute("SELECT * FROM dedup1 WHERE rn = 1").df()
-
-    # Second deduplication stage based on "FILE" column, keeping the first occurrence
-    con.execute("""
-    CREATE TEMPORARY VIEW dedup2 AS
-    SELECT *, ROW_NUMBER() OVER (PARTITION BY FILE ORDER BY ENTRYTIME ASC) as rn
-    FROM df_deduplicated
-    """)
-    df_deduplicated_final = con.execute("SELECT * FROM dedup2 WHERE rn = 1").df()
-
-    con.close()
-    return df_deduplicated_final
+# duckdb was never a dependency, so the old duckdb variant couldn't run; callers get the Arrow one
+hashedfile_parquet_dedup_forIntranet_duckdb = hashedfile_parquet_dedup_forIntranet_arrow
 
 def write_parquet_output(df, dest_pq, partition_base_dir=None, partition_cols=None):
     """
@@ -147,7 +137,7 @@ def write_parquet_output(df, dest_pq, partition_base_dir=None, partition_cols=No
 
 def hashedfile_parquet_dedup(input_path):
     # Start Spark session
-    spark = SparkSession.builder.appName("HashedParquetDeduplication").getOrCreate()
+    spark = _spark_session("HashedParquetDeduplication")
 
     # Read your data into a DataFrame
     df = spark.read.parquet(input_path)
@@ -168,7 +158,7 @@ def hashedfile_parquet_dedup(input_path):
     return pandas_df_deduplicated
 
 def intranet_delete_entries_from_source_main_simple(input_path, dest_pq, partition_base_dir, partition_cols, file_values_to_delete, seq_values_to_delete):
-    spark = SparkSession.builder.appName("DeleteEntriesAndFinalize").getOrCreate()
+    spark = _spark_session("DeleteEntriesAndFinalize")
 
     # Initial empty DataFrame for accumulating results
     final_df = spark.createDataFrame([], schema=spark.read.parquet(input_path).schema)
@@ -212,7 +202,7 @@ def intranet_delete_entries_from_source_main_simple_PROJECT(df, dest_pq, partiti
     print("partition cols")
     print(partition_cols)
     print("now over to SPARK")
-    spark = SparkSession.builder.appName("DeleteEntriesByProject").getOrCreate()
+    spark = _spark_session("DeleteEntriesByProject")
     spark.sparkContext.setLogLevel("INFO")
 
 
@@ -300,7 +290,7 @@ def delete_unwanted_dt_entries_basic(df, dest_pq):
     return dest_pq
 
 def intranet_delete_entries_from_source_main_simple_SHOTNAME(df, dest_pq, partition_base_dir, partition_cols):
-    spark = SparkSession.builder.appName("DeleteEntriesByShotname").getOrCreate()
+    spark = _spark_session("DeleteEntriesByShotname")
 
     final_df = spark.createDataFrame([], schema=df.schema)
 
@@ -328,9 +318,40 @@ def intranet_delete_entries_from_source_main_simple_SHOTNAME(df, dest_pq, partit
 
     return dest_pq
 
+def intranet_delete_entries_from_source_main_arrow(df, dataset_dir, partition_cols=None):
+    """
+    Same deletes as intranet_delete_entries_from_source_main_simple_SHOTNAME, on a partitioned
+    source_main (see source_dataset.py) and without Spark. Each shot's entries are removed from
+    its own partition, which is the only one read and rewritten.
+
+    Args:
+        df (pd.DataFrame): Entries to delete, with FILE, SEQUENCENAME and the partition columns.
+        dataset_dir (str): Root of the partitioned source_main.
+        partition_cols (list, optional): Partition columns, SOURCE_PARTITION_COLUMNS by default.
+
+    Returns:
+        str: dataset_dir
+    """
+    partition_cols = partition_cols or SOURCE_PARTITION_COLUMNS
+    missing = [column for column in partition_cols if column not in df.columns]
+    if missing:
+        raise ValueError(f"Entries to delete need the partition columns {missing}")
+
+    removed = 0
+    for values, shot_df in df.groupby(partition_cols, dropna=False):
+        partition = {column: str(value) for column, value in zip(partition_cols, values)}
+        removed += delete_source_entries(
+            dataset_dir,
+            files=shot_df['FILE'].dropna().unique() if 'FILE' in shot_df.columns else None,
+            sequence_names=shot_df['SEQUENCENAME'].dropna().unique() if 'SEQUENCENAME' in shot_df.columns else None,
+            partition_cols=partition_cols,
+            **partition)
+    print(f"Deleted {removed} entries from {dataset_dir}")
+    return dataset_dir
+
 def hashedfile_parquet_dedup_and_partition_write_main_plus_partitions(input_path, dest_pq, partition_base_dir, partition_cols):
     # Start Spark session
-    spark = SparkSession.builder.appName("HashedParquetDeduplicationAndPartitioning").getOrCreate()
+    spark = _spark_session("HashedParquetDeduplicationAndPartitioning")
 
     # Read your data into a DataFrame
     df = spark.read.parquet(input_path)
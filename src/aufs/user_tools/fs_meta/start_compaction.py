@@ -0,0 +1,190 @@
+# src/aufs/user_tools/fs_meta/start_compaction.py
+
+import os
+import json
+import time
+import uuid
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .locking import FileLock, atomic_write, lock_path_for
+from .arrow_dedup import unified_schema, conform_to_schema
+from .start_manifest import (COMPACTED_SUFFIX, load_start_manifest, save_start_manifest, start_manifest_path,
+                             live_start_files, scrape_id_from_name)
+
+# Compacted files are written up to about this size, files under SMALL_FILE_BYTES are merged
+TARGET_FILE_BYTES = 128 * 1024 * 1024
+SMALL_FILE_BYTES = TARGET_FILE_BYTES // 2
+# Compacted-away files stay on disk this long, for readers that listed start/ before the compaction
+RETIRED_GRACE_SECONDS = 3600
+
+def plan_compaction(files, target_bytes=TARGET_FILE_BYTES, small_bytes=SMALL_FILE_BYTES, min_files=2):
+    """
+    Groups runs of consecutive small files into groups of about target_bytes. Only consecutive
+    files are grouped, so reading the compacted files in name order gives the rows in the same
+    order as before, which is what decides ENTRYTIME ties in the dedup.
+
+    Returns:
+        list: Lists of files to merge, in order.
+    """
+    groups, group, group_bytes = [], [], 0
+    for path in files:
+        size = os.path.getsize(path)
+        if size >= small_bytes or (group and group_bytes + size > target_bytes):
+            if len(group) >= min_files:
+                groups.append(group)
+            group, group_bytes = [], 0
+        if size < small_bytes:
+            group.append(path)
+            group_bytes += size
+    if len(group) >= min_files:
+        groups.append(group)
+    return groups
+
+def split_unifiable(group, min_files=2):
+    """
+    Splits a group into runs of consecutive files whose schemas unify, e.g. a file whose FILE
+    column came out as double from an all-NaN frame can't be merged with files where it's a
+    string. Such files are left as they are.
+
+    Returns:
+        list: Runs of at least min_files files, in order.
+    """
+    runs, run, schemas = [], [], []
+    for path in group:
+        schema = pq.read_schema(path)
+        try:
+            pa.unify_schemas(schemas + [schema], promote_options='permissive')
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            if len(run) >= min_files:
+                runs.append(run)
+            run, schemas = [], []
+        run.append(path)
+        schemas.append(schema)
+    if len(run) >= min_files:
+        runs.append(run)
+    return runs
+
+def _source_entries(path, table, offset, live):
+    name = os.path.basename(path)
+    if name in live:
+        # Already compacted, its sources move along with its rows
+        return [dict(source, offset=source['offset'] + offset) for source in live[name]['sources']]
+
+    entry = {'file': name, 'scrape_id': scrape_id_from_name(name), 'offset': offset, 'rows': table.num_rows}
+    if 'ENTRYTIME' in table.column_names and table.num_rows:
+        entrytimes = pc.min_max(table['ENTRYTIME'])
+        for key, value in (('entrytime_min', entrytimes['min']), ('entrytime_max', entrytimes['max'])):
+            value = value.as_py()
+            entry[key] = value.isoformat() if hasattr(value, 'isoformat') else value
+    return [entry]
+
+def _write_group(start_dir, group, live):
+    """
+    Merges a group of files into one compacted file, named after the last file in the group so
+    it sorts where its rows were.
+
+    Returns:
+        tuple: (compacted file name, its manifest entry)
+    """
+    last_name = os.path.basename(group[-1])
+    stem = last_name[:-len(COMPACTED_SUFFIX)] if last_name.endswith(COMPACTED_SUFFIX) else os.path.splitext(last_name)[0]
+    compacted_name = f"{stem}.{uuid.uuid4().hex[:8]}{COMPACTED_SUFFIX}"
+
+    schema = unified_schema(group)
+    tables, sources, offset = [], [], 0
+    for path in group:
+        table = conform_to_schema(pq.read_table(path), schema)
+        sources.extend(_source_entries(path, table, offset, live))
+        tables.append(table)
+        offset += table.num_rows
+
+    table = pa.concat_tables(tables)
+    # Provenance is kept in the file too, so it survives the manifest
+    table = table.replace_schema_metadata({b'START_SOURCES': json.dumps(sources).encode('utf-8')})
+    with atomic_write(os.path.join(start_dir, compacted_name)) as temp_path:
+        pq.write_table(table, temp_path)
+
+    return compacted_name, {
+        'rows': table.num_rows,
+        'bytes': os.path.getsize(os.path.join(start_dir, compacted_name)),
+        'created': datetime.utcnow().isoformat(),
+        'sources': sources,
+    }
+
+def _expire_retired(manifest, grace_seconds):
+    # Files past their grace period are forgotten, to be deleted, their rows are in the live files
+    expired = []
+    now = time.time()
+    for name, entry in list(manifest['retired'].items()):
+        if now - entry['time'] >= grace_seconds:
+            del manifest['retired'][name]
+            expired.append(name)
+    return expired
+
+def compact_start_files(start_dir, target_bytes=TARGET_FILE_BYTES, small_bytes=SMALL_FILE_BYTES, min_files=2,
+                        grace_seconds=RETIRED_GRACE_SECONDS, pattern="*.parquet"):
+    """
+    Merges the small scrape files in start_dir into compacted files of about target_bytes.
+
+    Each compacted file keeps the rows of the files it replaced in the same order, unchanged,
+    with the scrape_id, row range and ENTRYTIME range of each recorded in the start manifest
+    and in the file's own metadata. Readers that list start/ through start_files see the
+    compacted files in place of the ones they replaced, with the same dedup results, and
+    read_start_rows still finds a scrape file's rows, e.g. a scrape manifest's SNAPSHOT.
+    Replaced files are deleted grace_seconds after they're replaced, on a later compaction.
+    Files whose schemas can't be unified with their neighbours' are left as they are.
+
+    A compaction changes the files the incremental dedup index was built from, so the next
+    incremental_source_dedup rebuilds it.
+
+    Args:
+        start_dir (str): Directory the scrapes are written to.
+        target_bytes (int): Size to aim for, going by the on-disk size of the files merged.
+        small_bytes (int): Files at least this big are left as they are.
+        min_files (int): Fewest files worth merging.
+        grace_seconds (float): How long replaced files stay on disk.
+        pattern (str): Glob pattern of the scrape files.
+
+    Returns:
+        dict: 'compacted' (new file names), 'replaced' (number of files they replaced), 'removed' (files deleted).
+    """
+    start_dir = os.fspath(start_dir)
+    with FileLock(lock_path_for(start_manifest_path(start_dir)), timeout=60):
+        manifest = load_start_manifest(start_dir)
+        groups = plan_compaction(live_start_files(start_dir, pattern, manifest), target_bytes, small_bytes, min_files)
+        groups = [run for group in groups for run in split_unifiable(group, min_files)]
+
+        compacted = []
+        replaced = 0
+        retire_time = time.time()
+        for group in groups:
+            try:
+                compacted_name, entry = _write_group(start_dir, group, manifest['live'])
+            except (pa.ArrowTypeError, pa.ArrowInvalid) as e:
+                # Left uncompacted, the rest of the groups carry on
+                print(f"Could not compact {len(group)} files ending with {os.path.basename(group[-1])}: {e}")
+                continue
+            manifest['live'][compacted_name] = entry
+            for path in group:
+                name = os.path.basename(path)
+                manifest['live'].pop(name, None)
+                manifest['retired'][name] = {'into': compacted_name, 'time': retire_time}
+            compacted.append(compacted_name)
+            replaced += len(group)
+
+        removed = _expire_retired(manifest, grace_seconds)
+        # Deleted before the manifest forgets them, or an interrupted compaction could bring them back to life
+        for name in removed:
+            path = os.path.join(start_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+        if compacted or removed:
+            # The new files only become live here
+            save_start_manifest(start_dir, manifest)
+
+    if compacted:
+        print(f"Compacted {replaced} files in {start_dir} into {len(compacted)}.")
+    return {'compacted': compacted, 'replaced': replaced, 'removed': removed}
@@ -0,0 +1,155 @@
+# src/aufs/user_tools/fs_meta/start_manifest.py
+
+import os
+import json
+import glob
+import pandas as pd
+import pyarrow.parquet as pq
+
+from .locking import atomic_write
+
+START_MANIFEST_NAME = 'start_manifest.json'
+COMPACTED_SUFFIX = '.compacted.parquet'
+
+def start_manifest_path(start_dir):
+    return os.path.join(os.fspath(start_dir), START_MANIFEST_NAME)
+
+def empty_start_manifest():
+    """
+    'live' holds every compacted file in start/, with the scrape files it holds as 'sources':
+    their name, scrape_id, where their rows start in it ('offset'), row count and ENTRYTIME range.
+    'retired' holds files that were compacted away but may still be on disk for readers that
+    listed start/ before the compaction, with the file their rows went 'into' and the 'time'.
+    """
+    return {'version': 1, 'live': {}, 'retired': {}}
+
+def load_start_manifest(start_dir):
+    path = start_manifest_path(start_dir)
+    if not os.path.exists(path):
+        return empty_start_manifest()
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not read start manifest {path}: {e}")
+        return empty_start_manifest()
+
+def save_start_manifest(start_dir, manifest):
+    """
+    Replaces the manifest in one rename, which is the moment a compaction takes effect.
+    The caller is expected to hold the manifest's lock.
+    """
+    with atomic_write(start_manifest_path(start_dir)) as temp_path:
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+def scrape_id_from_name(file_name):
+    """
+    Scrape files are named '{timestamp}-{scrape_id}.parquet'.
+    """
+    stem = os.path.basename(file_name)
+    for suffix in (COMPACTED_SUFFIX, '.parquet'):
+        if stem.endswith(suffix):
+            stem = stem[:-len(suffix)]
+            break
+    return stem.split('-', 1)[1] if '-' in stem else None
+
+def is_compacted_name(file_name):
+    return os.path.basename(file_name).endswith(COMPACTED_SUFFIX)
+
+def live_start_files(start_dir, pattern="*.parquet", manifest=None):
+    """
+    Returns the files in start_dir holding live rows, sorted by name, which is the order their
+    rows were scraped in. Files compacted away are left out, as are compacted files a
+    compaction didn't get as far as recording (e.g. it was interrupted).
+    """
+    if manifest is None:
+        manifest = load_start_manifest(start_dir)
+    live = manifest.get('live', {})
+    retired = manifest.get('retired', {})
+    files = []
+    for path in sorted(glob.glob(os.path.join(os.fspath(start_dir), pattern))):
+        name = os.path.basename(path)
+        if name in retired:
+            continue
+        if is_compacted_name(name) and name not in live:
+            continue
+        files.append(path)
+    return files
+
+def locate_start_rows(path, manifest=None):
+    """
+    Finds where a scrape file's rows are now.
+
+    Returns:
+        tuple: (path of the file holding them, offset of the first row, row count), with a None
+               offset and count if the file holds only those rows. None if they can't be found.
+    """
+    path = os.fspath(path)
+    start_dir, name = os.path.split(path)
+    if manifest is None:
+        manifest = load_start_manifest(start_dir)
+    for compacted_name, entry in manifest.get('live', {}).items():
+        for source in entry['sources']:
+            if source['file'] == name:
+                return os.path.join(start_dir, compacted_name), source['offset'], source['rows']
+    if os.path.exists(path):
+        return path, None, None
+    return None
+
+def read_start_rows(path, columns=None):
+    """
+    Reads the rows a scrape file was written with, from the compacted file they're in if it has
+    been compacted since. Only the row groups holding them are read.
+
+    Args:
+        path (str): The scrape file as originally written, e.g. a scrape manifest's SNAPSHOT.
+        columns (list, optional): Columns to read, all of them if None.
+
+    Returns:
+        pd.DataFrame or None: The rows, or None if they can't be found.
+    """
+    location = locate_start_rows(path)
+    if location is None:
+        return None
+    holder, offset, rows = location
+    if offset is None:
+        return pd.read_parquet(holder, columns=columns)
+
+    parquet_file = pq.ParquetFile(holder)
+    row_groups, group_start, first_row = [], 0, None
+    for row_group in range(parquet_file.num_row_groups):
+        group_rows = parquet_file.metadata.row_group(row_group).num_rows
+        if group_start < offset + rows and group_start + group_rows > offset:
+            if first_row is None:
+                first_row = group_start
+            row_groups.append(row_group)
+        group_start += group_rows
+    if not row_groups:
+        table = parquet_file.schema_arrow.empty_table()
+        if columns is not None:
+            table = table.select(columns)
+    else:
+        table = parquet_file.read_row_groups(row_groups, columns=columns).slice(offset - first_row, rows)
+    return table.to_pandas()
+
+def source_provenance(start_dir):
+    """
+    Lists every scrape file whose rows are in a compacted file, with where they are.
+
+    Returns:
+        pd.DataFrame: One row per scrape file: COMPACTED, FILE, SCRAPEID, OFFSET, ROWS, ENTRYTIME_MIN, ENTRYTIME_MAX.
+    """
+    rows = []
+    for compacted_name, entry in load_start_manifest(start_dir).get('live', {}).items():
+        for source in entry['sources']:
+            rows.append({
+                'COMPACTED': compacted_name,
+                'FILE': source['file'],
+                'SCRAPEID': source.get('scrape_id'),
+                'OFFSET': source['offset'],
+                'ROWS': source['rows'],
+                'ENTRYTIME_MIN': source.get('entrytime_min'),
+                'ENTRYTIME_MAX': source.get('entrytime_max'),
+            })
+    return pd.DataFrame(rows, columns=['COMPACTED', 'FILE', 'SCRAPEID', 'OFFSET', 'ROWS', 'ENTRYTIME_MIN', 'ENTRYTIME_MAX'])
@@ -17,6 +17,7 @@ src_path = os.path.join(current_dir, '..', '..', '..', '..')
 sys.path.insert(0, src_path)
 
 from src.aufs.user_tools.fs_meta.fs_info_from_paths import file_details_df_from_path
+from src.aufs.user_tools.fs_meta.last_scraped_index import load_last_scraped_index, record_scrape
 from src.aufs.user_tools.deep_editor import DeepEditor
 
 
@@ -233,24 +234,17 @@ class DirectoryLoaderUI(QMainWindow):
             # )
             return
 
-        files = [f for f in os.listdir(path_list_dir) if f.endswith("-path_list.csv")]
-        files.sort()
-
-        # Use a dictionary to consolidate paths with the latest timestamps
-        consolidated_data = {}
-
-        for file_name in files:
-            csv_path = os.path.join(path_list_dir, file_name)
-            scrape_time = self.extract_time_from_filename(file_name)
+        # The last scrape of every directory, kept up to date by run_scraper and rebuilt from the CSVs if missing
+        try:
+            index_df = load_last_scraped_index(path_list_dir)
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Failed to load the last scraped index in {path_list_dir}\n{str(e)}")
+            return
 
-            try:
-                df = pd.read_csv(csv_path)
-                for directory in df["Directory Paths"]:
-                    # If the path exists, keep the latest timestamp
-                    if directory not in consolidated_data or scrape_time > consolidated_data[directory]:
-                        consolidated_data[directory] = scrape_time
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Failed to load CSV: {csv_path}\n{str(e)}")
+        consolidated_data = {
+            directory: scrape_time.to_pydatetime().astimezone()
+            for directory, scrape_time in zip(index_df["DIRECTORY"], index_df["SCRAPE_TIME"])
+        }
 
         # Add consolidated data to the table
         for directory, scrape_time in consolidated_data.items():
@@ -326,6 +320,7 @@ class DirectoryLoaderUI(QMainWindow):
         self.cancel_button.setEnabled(True)
         self.cancel_requested = False
 
+        directory_rows = {}
         try:
             for i, directory in enumerate(self.directories):
                 if self.cancel_requested:
@@ -335,11 +330,13 @@ class DirectoryLoaderUI(QMainWindow):
                 # Scrape details for the current directory
                 print("Directory: ", directory)
                 df = file_details_df_from_path([directory], client=client, project=project, shots_df=shots_df, output_csv=output_csv)
+                directory_rows[directory] = len(df)
                 if not df.empty:
                     self.open_editor(df)
 
             if not self.cancel_requested:
                 dir_list_df.to_csv(path_list_csv, index=False)
+                record_scrape(os.path.dirname(path_list_csv), path_list_csv, directory_rows)
                 QMessageBox.information(self, "Scraping Complete", f"Scraped data saved to {path_list_csv}")
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to scrape directories: {str(e)}")
@@ -11,8 +11,8 @@ src_path = os.path.join(current_dir, '..', '..', '..')  # Adjust to point to the
 sys.path.insert(0, src_path)
 
 from src.aufs.core.extractor import extract_table
+from src.aufs.core.directory_tree import DirectoryTree
 import re
-import ast  # To convert string representation of metadata back to a dictionary
 
 class ParquetDirRebuilderApp(QMainWindow):
     def __init__(self):
@@ -95,58 +95,61 @@ class ParquetDirRebuilderApp(QMainWindow):
             QMessageBox.critical(self, "Error", "Parquet file does not contain directory tree metadata.")
             return
 
-        # Load the directory tree metadata
-        tree_metadata = metadata[b'directory_tree'].decode('utf-8')
-        tree_structure = ast.literal_eval(tree_metadata)  # Convert string back to dict
+        # Load the directory tree metadata, either the encoded tree or the legacy JSON
+        tree = self.parse_metadata(metadata)
 
         # Build the directory tree from the full tree structure
-        self.build_directory_tree_from_metadata(tree_structure)
+        self.build_directory_tree_from_metadata(tree)
 
-    def add_node_to_tree(self, parent_item, node_id, tree_structure, merge):
+    def add_node_to_tree(self, parent_item, row, tree, merge):
         """
         Recursively adds nodes (directories) to the QTreeWidget based on the tree structure.
         """
         # Get the children of the current node from the tree structure
-        if node_id in tree_structure:
-            for child in tree_structure[node_id]:
-                # Create a new tree item for each child
-                child_item = QTreeWidgetItem(parent_item, [child['name']])
-                
-                # Debugging print statement
-                print(f"Processing child: {child['name']} (ID: {child['id']})")
-                
-                # Recur to add children of this child node
-                self.add_node_to_tree(child_item, child['id'], tree_structure, merge)
+        for child in tree.children(row):
+            name = tree.name(child)
+            if name is None:
+                # A placeholder such as tree_root, its children go straight under parent_item
+                self.add_node_to_tree(parent_item, child, tree, merge)
+                continue
+
+            # Create a new tree item for each child
+            child_item = QTreeWidgetItem(parent_item, [name])
+
+            # Debugging print statement
+            print(f"Processing child: {name} (ID: {tree.ids[child]})")
+
+            # Recur to add children of this child node
+            self.add_node_to_tree(child_item, child, tree, merge)
 
     def parse_metadata(self, metadata):
         """
         Parses the directory tree from the Parquet metadata.
         """
-        # Decode and evaluate the directory tree from the metadata
-        tree_structure = eval(metadata[b'directory_tree'].decode('utf-8'))
-        
-        # Print the tree structure for debugging
-        print(f"Parsed tree structure: {tree_structure}")
-        
-        return tree_structure
-
-    def build_directory_tree_from_metadata(self, tree_structure):
+        tree = DirectoryTree.from_metadata(metadata)
+
+        # Print the tree size for debugging
+        print(f"Parsed tree structure: {len(tree)} directories")
+
+        return tree
+
+    def build_directory_tree_from_metadata(self, tree):
         """
         Rebuilds the directory tree from the metadata and displays it in the QTreeWidget.
         """
         self.dir_tree.clear()
 
-        # Root ID based on the metadata structure
-        root_id = 'f2355e9ac075b04cb2a9b6e419e1077638a700fec39fd1847a207d70d59a495c'
-        print(f"Root ID: {root_id}")
-
         # Add the root directory
         root_node = QTreeWidgetItem(self.dir_tree, ["Root Directory"])
 
-        # Add the children of the root directory
-        if root_id in tree_structure:
-            print(f"Adding children of {root_id}")
-            self.add_node_to_tree(root_node, root_id, tree_structure, self.merge_checkbox.isChecked())
+        # Add every top-level directory of the tree under it
+        for root_row in tree.roots():
+            print(f"Adding children of {tree.ids[root_row]}")
+            if tree.name(root_row) is None:
+                self.add_node_to_tree(root_node, root_row, tree, self.merge_checkbox.isChecked())
+            else:
+                root_item = QTreeWidgetItem(root_node, [tree.name(root_row)])
+                self.add_node_to_tree(root_item, root_row, tree, self.merge_checkbox.isChecked())
 
         self.dir_tree.expandAll()
 
@@ -2,7 +2,7 @@ import os
 import sys
 import pandas as pd
 from PySide6.QtWidgets import (
-    QWidget, QVBoxLayout, QPushButton, QCheckBox, QLabel
+    QWidget, QVBoxLayout, QPushButton, QCheckBox, QLabel, QFileDialog
 )
 from PySide6.QtCore import Qt
 
@@ -12,15 +12,21 @@ src_path = os.path.join(current_dir, '..', '..', '..', '..')  # Adjust to point
 sys.path.insert(0, src_path)
 
 from src.aufs.user_tools.deep_editor import DeepEditor
+from src.aufs.user_tools.fs_meta.sequences import sequence_format_template, iter_in_chunks
 from contextlib import contextmanager
+from itertools import islice
+
+# The expanded preview only shows this many rows, the full list is used for processing and export
+EXPANDED_PREVIEW_ROWS = 100000
 
 class DataProvisioningWidget(QWidget):
     def __init__(self, input_df, root_package_path, parent=None):
         super().__init__(parent)
         self.root_package_path = root_package_path
         self.input_df = input_df.copy()  # Copy the input DataFrame
-        self.working_files_df = input_df.copy()  # Main DataFrame for preview and processing
-        self.working_seqs_df = None  # Temporary DataFrame for sequence rows
+        self.working_files_df = input_df.copy()  # Single-file rows for preview and processing
+        self.working_seqs_df = None  # Sequence rows, kept collapsed and expanded lazily
+        self.sequence_templates = []  # (FILE template, PROVISIONEDLINK template, first frame, last frame) per sequence
         self.editor_instance = None  # Keep track of the active DeepEditor instance
         self.init_ui()
 
@@ -54,6 +60,11 @@ class DataProvisioningWidget(QWidget):
         self.process_button.clicked.connect(self.process_data)
         layout.addWidget(self.process_button)
 
+        # Button to export every file and frame to csv
+        self.export_button = QPushButton("Export Expanded CSV")
+        self.export_button.clicked.connect(self.export_expanded_csv)
+        layout.addWidget(self.export_button)
+
         self.setLayout(layout)
         self.separate_sequences()
 
@@ -68,7 +79,10 @@ class DataProvisioningWidget(QWidget):
 
         if self.display_checkbox.isChecked():
             # Use expanded view
-            input_dataframe = self.working_files_df
+            input_dataframe = pd.DataFrame(islice(self.iter_expanded_paths(), EXPANDED_PREVIEW_ROWS),
+                                           columns=["FILE", "PROVISIONEDLINK"])
+            if len(input_dataframe) == EXPANDED_PREVIEW_ROWS:
+                print(f"Preview limited to the first {EXPANDED_PREVIEW_ROWS} files.")
         else:
             # Use unexpanded view and transform paths
             input_dataframe = self.transform_paths(self.input_df[["FILE", "PROVISIONEDLINK"]])
@@ -89,43 +103,49 @@ class DataProvisioningWidget(QWidget):
         self.working_seqs_df = self.working_files_df[seq_mask].copy()
         self.working_files_df = self.working_files_df[~seq_mask].reset_index(drop=True)
 
-        # Expand sequences into working_files_df for processing
+        # Sequences stay collapsed, their frames are generated by iter_expanded_paths as needed
         self.expand_sequences()
 
         # Transform paths to ensure consistency
-        self.working_files_df = self.transform_paths(self.working_files_df)
+        if self.working_files_df.empty:
+            self.working_files_df = pd.DataFrame(columns=["FILE", "PROVISIONEDLINK"])
+        else:
+            self.working_files_df = self.transform_paths(self.working_files_df)
 
         # Update display after processing
         self.preview_data()
 
     def expand_sequences(self):
         """
-        Expand each sequence row in working_seqs_df into individual rows in working_files_df.
+        Prepare each sequence row in working_seqs_df for lazy expansion, as format templates
+        for FILE and the transformed PROVISIONEDLINK plus the frame range.
         """
+        self.sequence_templates = []
         if self.working_seqs_df is None or self.working_seqs_df.empty:
             print("No sequences to expand.")
             return
 
-        expanded_data = []
-
-        for _, row in self.working_seqs_df.iterrows():
-            source = row["FILE"]
-            destination = row["PROVISIONEDLINK"]
-            padding = int(row["PADDING"])
-            first_frame = int(row["FIRSTFRAME"])
-            last_frame = int(row["LASTFRAME"])
-
+        transformed = self.transform_paths(self.working_seqs_df)
+        for source, destination, padding, first_frame, last_frame in zip(
+                transformed["FILE"], transformed["PROVISIONEDLINK"], self.working_seqs_df["PADDING"],
+                self.working_seqs_df["FIRSTFRAME"], self.working_seqs_df["LASTFRAME"]):
+            token = "%0{}d".format(int(padding))
+            self.sequence_templates.append((
+                sequence_format_template(source, token),
+                sequence_format_template(destination, token),
+                int(first_frame),
+                int(last_frame),
+            ))
+
+    def iter_expanded_paths(self):
+        """
+        Yields (FILE, PROVISIONEDLINK) for every single file and then every frame of every
+        sequence, with PROVISIONEDLINK relative to self.root_package_path.
+        """
+        yield from zip(self.working_files_df["FILE"], self.working_files_df["PROVISIONEDLINK"])
+        for source_template, destination_template, first_frame, last_frame in self.sequence_templates:
             for frame in range(first_frame, last_frame + 1):
-                frame_str = f"{frame:0{padding}d}"
-                expanded_data.append({
-                    "type": "sequence",
-                    "FILE": source.replace("%0{}d".format(padding), frame_str),
-                    "PROVISIONEDLINK": destination.replace("%0{}d".format(padding), frame_str),
-                    "frame": frame,
-                })
-
-        expanded_df = pd.DataFrame(expanded_data)
-        self.working_files_df = pd.concat([self.working_files_df, expanded_df], ignore_index=True)
+                yield source_template.format(frame), destination_template.format(frame)
 
     def transform_paths(self, df, source_col="FILE", destination_col="PROVISIONEDLINK"):
         """
@@ -134,34 +154,43 @@ class DataProvisioningWidget(QWidget):
         if df is None or df.empty:
             raise ValueError("Input DataFrame is empty or not initialized.")
 
-        transformed_rows = []
+        # Transform the destination path to be relative to self.root_package_path
+        destinations_rel = [
+            os.path.relpath(os.path.join(self.root_package_path, destination), self.root_package_path)
+            for destination in df[destination_col]
+        ]
 
-        for _, row in df.iterrows():
-            source_abs = row[source_col]
-
-            # Transform the destination path to be relative to self.root_package_path
-            destination_abs = os.path.join(self.root_package_path, row[destination_col])
-            destination_rel = os.path.relpath(destination_abs, self.root_package_path)
-
-            # Add transformed values to a new row
-            transformed_rows.append({
-                source_col: source_abs,
-                destination_col: destination_rel,  # Relative to root_package_path
-            })
-
-        return pd.DataFrame(transformed_rows, columns=[source_col, destination_col])
+        return pd.DataFrame({
+            source_col: df[source_col].to_numpy(),
+            destination_col: destinations_rel,  # Relative to root_package_path
+        }, columns=[source_col, destination_col])
 
     def process_data(self):
         """
-        Transform paths and process the data directly from working_files_df.
+        Create symlinks for every single file and every sequence frame, expanding sequences as we go.
         """
-        for _, row in self.working_files_df.iterrows():
-            source = row["FILE"]
-            destination = row["PROVISIONEDLINK"]
-
+        for source, destination in self.iter_expanded_paths():
             # print(f"Processing: {source} -> {destination}")
             self.create_relative_symlink(source, destination)
 
+    def export_expanded_csv(self, file_path=None, chunk_size=100000):
+        """
+        Write every file and sequence frame to a csv, a chunk at a time.
+        """
+        if not file_path:
+            file_path, _ = QFileDialog.getSaveFileName(self, "Export Expanded CSV", self.root_package_path, "CSV Files (*.csv)")
+            if not file_path:
+                return
+
+        header = True
+        for chunk in iter_in_chunks(self.iter_expanded_paths(), chunk_size):
+            pd.DataFrame(chunk, columns=["FILE", "PROVISIONEDLINK"]).to_csv(
+                file_path, mode='w' if header else 'a', header=header, index=False)
+            header = False
+        if header:
+            pd.DataFrame(columns=["FILE", "PROVISIONEDLINK"]).to_csv(file_path, index=False)
+        print(f"Exported expanded paths to {file_path}")
+
     def create_relative_symlink(self, source, destination):
         """
         Create a symlink from the absolute source to the relative destination, anchored to self.root_package_path.
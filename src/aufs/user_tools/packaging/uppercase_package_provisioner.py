@@ -23,6 +23,7 @@ from src.aufs.user_tools.packaging.string_mapping_manager import StringMappingMa
 from src.aufs.user_tools.packaging.string_mapping_snagging import StringRemappingSnaggingWidget
 from src.aufs.user_tools.editable_pandas_model import EditablePandasModel
 from src.aufs.user_tools.fs_meta.update_fs_info import DirectoryLoaderUI
+from src.aufs.user_tools.fs_meta.multi_file_loader import MultiFileLoader
 from aufs.user_tools.packaging.uppercase_template_manager import UppercaseTemplateManager
 from aufs.user_tools.packaging.data_provisioning_widget import DataProvisioningWidget
 from src.aufs.user_tools.deep_editor import DeepEditor
@@ -1364,18 +1365,17 @@ class RequestorUI(QWidget):
                     latest_requests[request_name] = file
 
             # Load and combine the latest request files into a single DataFrame
-            for request_file in latest_requests.values():
-                request_file_path = os.path.join(requests_dir, request_file)
-            
-                dtype_mapping = {
-                    'PADDING': str,
-                    'FIRSTFRAME': str,
-                    'LASTFRAME': str,
-                }  # , dtype=dtype_mapping Default to an empty dictionary if no mapping is provided
-                # self.dataframe = pd.read_csv(self.file_path, dtype=dtype_mapping)
-
-                request_df = pd.read_csv(request_file_path, dtype=dtype_mapping)
-                session_df = pd.concat([session_df, request_df], ignore_index=True)
+            request_file_paths = [os.path.join(requests_dir, request_file) for request_file in latest_requests.values()]
+
+            dtype_mapping = {
+                'PADDING': str,
+                'FIRSTFRAME': str,
+                'LASTFRAME': str,
+            }  # , dtype=dtype_mapping Default to an empty dictionary if no mapping is provided
+            # self.dataframe = pd.read_csv(self.file_path, dtype=dtype_mapping)
+
+            # Read in parallel and concatenated once, in the same order as before
+            session_df = MultiFileLoader().load_csv_df(request_file_paths, dtype=dtype_mapping)
 
             # self.session_df = self.filter_session_data(session_df)
             self.session_df = session_df
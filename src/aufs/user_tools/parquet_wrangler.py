@@ -26,6 +26,8 @@ sys.path.insert(0, src_path)
 
 from src.aufs.core.rendering.render_processor import InputManager
 from src.aufs.utils import validate_schema
+from src.aufs.core.directory_tree import DirectoryTree
+from src.aufs.core.schema_layout import to_node_layout
 from src.aufs.core.rendering.the_third_embedder import TheThirdEmbedder
 from user_adder_smb import SMBUserAdder
 import src_dest_linking_01
@@ -201,6 +203,10 @@ class WranglerApp(QMainWindow):
         schema_layout.addWidget(self.zip_as_dir_checkbox)
         self.zip_as_dir_checkbox.stateChanged.connect(self.toggle_zip_as_dir)
 
+        # Writes one row per directory rather than one column, for jobs with many directories
+        self.node_layout_checkbox = QCheckBox("Store directories as rows (node layout)", self)
+        schema_layout.addWidget(self.node_layout_checkbox)
+
         schema_driver.setWidget(self.schema_tool)
         self.addDockWidget(Qt.LeftDockWidgetArea, schema_driver)
 
@@ -248,13 +254,19 @@ class WranglerApp(QMainWindow):
     def generate_id(self, parent_name, dir_name):
         return hashlib.sha256(f"{parent_name}-{dir_name}".encode()).hexdigest()
 
-    def build_directory_tree_metadata(self, dir_ids, parent_ids, dir_names):
-        tree = {}
-        for dir_id, parent_id, dir_name in zip(dir_ids, parent_ids, dir_names):
-            if parent_id not in tree:
-                tree[parent_id] = []
-            tree[parent_id].append({"id": dir_id, "name": dir_name})
-        return tree
+    def build_directory_tree_metadata(self, dir_ids, parent_rows, dir_names):
+        """
+        Encodes the directory tree for the schema metadata, see src.aufs.core.directory_tree.
+
+        Args:
+            dir_ids (list): UUID of each directory.
+            parent_rows (list): Position in dir_ids of each directory's parent, -1 for none.
+            dir_names (list): Name of each directory, None for none.
+
+        Returns:
+            bytes: The 'directory_tree' metadata value.
+        """
+        return DirectoryTree.from_nodes(dir_ids, parent_rows, dir_names).to_bytes()
 
     def dynamic_schema_field_maker(self, package_full_df):
         """
@@ -265,14 +277,11 @@ class WranglerApp(QMainWindow):
 
         # Check if HASHEDFILE column exists, if not, generate one
         if 'HASHEDFILE' not in package_full_df.columns:
-            package_full_df['HASHEDFILE'] = package_full_df.apply(
-                lambda row: self.generate_id(row['DEST'], row['SRC']), axis=1)
+            package_full_df['HASHEDFILE'] = [self.generate_id(dest, src) for dest, src in
+                                             zip(package_full_df['DEST'].tolist(), package_full_df['SRC'].tolist())]
 
         # Go through each file link in the DEST field and create fields for it
-        for idx, row in package_full_df.iterrows():
-            dest = row['DEST']
-            hashed_file = row['HASHEDFILE']
-
+        for dest, hashed_file in zip(package_full_df['DEST'].tolist(), package_full_df['HASHEDFILE'].tolist()):
             # Create column name (following directory naming convention, but with '-file')
             file_column_name = f"{dest}-file"
 
@@ -294,40 +303,48 @@ class WranglerApp(QMainWindow):
         try:
             fields = []  # Holds PyArrow fields for each directory and file (column)
             dir_ids = []  # List of UUIDs for each directory
-            parent_ids = []  # List of UUIDs for parent directories
+            parent_rows = []  # Position in dir_ids of each directory's parent, -1 for top-level ones
             dir_names = []  # List of directory names
             uuid_dirname_mapping = {}  # UUID to directory name mapping
-            directory_tree = {}  # Directory tree to store parent-child relationships
+            dir_rows = {}  # Directory UUID to its position in dir_ids
+            dir_uuids = {}  # Directory path to its UUID, so each directory is only hashed once
+            dir_field_names = set()  # Directory fields already added
 
-            # Iterate over each DEST value (file path) in the package_full_df
-            for dest in package_full_df['DEST']:
+            # One pass over the DEST values (file paths) in the package_full_df
+            for dest in package_full_df['DEST'].tolist():
                 directories = dest.split(os.sep)[:-1]  # Split the DEST path into directories, exclude the file
                 file_name = os.path.basename(dest)
 
-                parent_uuid = None
-                for i, directory in enumerate(directories):
-                    # Full path of the directory up to this level
-                    dir_path = os.sep.join(directories[:i + 1])
-                    # Generate UUID for this directory level
-                    dir_uuid = self.generate_id(directory, dir_path)
-
-                    # Map UUID to directory name if not already mapped
-                    if dir_uuid not in uuid_dirname_mapping:
-                        uuid_dirname_mapping[dir_uuid] = directory
-
-                        # Link parent to child in the directory tree if there's a parent
-                        if parent_uuid:
-                            if parent_uuid not in directory_tree:
-                                directory_tree[parent_uuid] = []
-                            directory_tree[parent_uuid].append({"id": dir_uuid, "name": directory})
-
-                    parent_uuid = dir_uuid  # Update parent for the next level
-
-                    # Add field for the directory if we haven't done it yet
-                    if i == len(directories) - 1:  # Only create field for the final directory in the path
-                        dir_field_name = f"{directory}-dir"
-                        if dir_field_name not in [f.name for f in fields]:
-                            fields.append(pa.field(dir_field_name, pa.string()))
+                # Only a directory not seen before needs its levels walked
+                if os.sep.join(directories) not in dir_uuids:
+                    parent_uuid = None
+                    for i, directory in enumerate(directories):
+                        # Full path of the directory up to this level
+                        dir_path = os.sep.join(directories[:i + 1])
+                        dir_uuid = dir_uuids.get(dir_path)
+                        if dir_uuid is None:
+                            # Generate UUID for this directory level
+                            dir_uuid = self.generate_id(directory, dir_path)
+                            dir_uuids[dir_path] = dir_uuid
+
+                            # Map UUID to directory name if not already mapped
+                            if dir_uuid not in uuid_dirname_mapping:
+                                uuid_dirname_mapping[dir_uuid] = directory
+
+                                # Add the directory to the tree, under its parent if there's one
+                                dir_rows[dir_uuid] = len(dir_ids)
+                                dir_ids.append(dir_uuid)
+                                parent_rows.append(dir_rows.get(parent_uuid, -1) if parent_uuid else -1)
+                                dir_names.append(directory)
+
+                        parent_uuid = dir_uuid  # Update parent for the next level
+
+                # Add a field for the final directory in the path if we haven't done it yet
+                if directories:
+                    dir_field_name = f"{directories[-1]}-dir"
+                    if dir_field_name not in dir_field_names:
+                        dir_field_names.add(dir_field_name)
+                        fields.append(pa.field(dir_field_name, pa.string()))
 
                 # Now handle the file part of the DEST
                 file_uuid = self.generate_id(directories[-1], file_name)
@@ -340,7 +357,7 @@ class WranglerApp(QMainWindow):
 
             # Add metadata for directory tree and UUID mapping
             metadata = schema.metadata or {}
-            metadata[b'directory_tree'] = json.dumps(directory_tree).encode('utf-8')
+            metadata[b'directory_tree'] = self.build_directory_tree_metadata(dir_ids, parent_rows, dir_names)
             metadata[b'uuid_dirname_mapping'] = json.dumps(uuid_dirname_mapping).encode('utf-8')
 
             # Retrieve platform scripts and add to metadata
@@ -411,9 +428,11 @@ class WranglerApp(QMainWindow):
             scraped_dirs = self.scrape_directories(root_path)
 
             fields = []  # Holds PyArrow fields for each directory (column)
-            dir_ids = []  # List of UUIDs for each directory
-            parent_ids = []  # List of UUIDs for parent directories
-            dir_names = []  # List of directory names
+            # The tree starts from an unnamed 'tree_root' directory standing for root_path
+            dir_ids = [self.generate_id('tree_root', 'tree_root')]  # List of UUIDs for each directory
+            parent_rows = [-1]  # Position in dir_ids of each directory's parent
+            dir_names = [None]  # List of directory names
+            dir_rows = {root_path: 0}  # Directory path to its position in dir_ids
             uuid_dirname_mapping = {}  # UUID to directory name mapping
 
             # Iterate over each scraped directory to generate fields and UUIDs
@@ -426,9 +445,10 @@ class WranglerApp(QMainWindow):
                 dir_id = self.generate_id(parent_name, dir_name)
                 parent_id = self.generate_id('tree_root', parent_name) if parent_name == 'tree_root' else self.generate_id(os.path.basename(os.path.dirname(parent_path)), parent_name)
 
-                # Store directory names and their corresponding UUIDs
+                # Store directory names and their corresponding UUIDs, os.walk lists parents first
+                dir_rows[dir_path] = len(dir_ids)
                 dir_ids.append(dir_id)
-                parent_ids.append(parent_id)
+                parent_rows.append(dir_rows[parent_path])
                 dir_names.append(dir_name)
                 uuid_dirname_mapping[dir_id] = dir_name  # UUID to directory name mapping
 
@@ -446,11 +466,11 @@ class WranglerApp(QMainWindow):
             schema = pa.schema(fields)
 
             # Build directory tree metadata using UUIDs
-            tree_metadata = self.build_directory_tree_metadata(dir_ids, parent_ids, dir_names)
+            tree_metadata = self.build_directory_tree_metadata(dir_ids, parent_rows, dir_names)
 
             # Add metadata to the schema
             metadata = schema.metadata or {}
-            metadata[b'directory_tree'] = json.dumps(tree_metadata).encode('utf-8')  # Encode the full directory tree
+            metadata[b'directory_tree'] = tree_metadata  # Encode the full directory tree
             metadata[b'uuid_dirname_mapping'] = json.dumps(uuid_dirname_mapping).encode('utf-8')  # Add UUID mapping
             platform_dictionary = get_platform_dictionary()
             metadata[b'platform_scripts'] = json.dumps(platform_dictionary).encode('utf-8')  # Add platform scripts
@@ -977,8 +997,14 @@ class WranglerApp(QMainWindow):
 
         metadata = self.metadata if self.metadata else None
 
+        schema, data = self.schema, self.data
+        if self.node_layout_checkbox.isChecked():
+            # Same metadata and scripts, with the directory columns turned into rows
+            data = to_node_layout(data)
+            schema = data.schema
+
         try:
-            self.input_manager.process_render(self.schema, self.data, metadata, output_path)
+            self.input_manager.process_render(schema, data, metadata, output_path)
             QMessageBox.information(self, "Success", f"Parquet file successfully written to {output_path}")
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Render failed: {str(e)}")
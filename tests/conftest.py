@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules are imported as src.aufs..., the same as the scripts do
+repo_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.abspath(repo_root))
@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.aufs.user_tools.fs_meta.arrow_dedup import arrow_source_dedup
+from src.aufs.user_tools.fs_meta.source_dedup import start_files
+from src.aufs.user_tools.fs_meta.spark_tools import source_from_start_pandas_dedup
+
+
+def write_scrape(start_dir, number, minute, df):
+    df['ENTRYTIME'] = pd.Timestamp('2026-01-01') + pd.Timedelta(minutes=minute)
+    df.to_parquet(os.path.join(start_dir, f"20260101{number:06d}-scrape{number}.parquet"))
+
+
+def test_arrow_dedup_matches_pandas_on_mixed_schemas(tmp_path):
+    start_dir = str(tmp_path)
+    write_scrape(start_dir, 0, 0, pd.DataFrame({
+        'FILE': ['/job/a', '/job/b', '/job/c'],
+        'HASHEDFILE': ['ha', 'hb', 'hc'],
+        'FILESIZE': pd.Series([1, 2, 3], dtype='int32'),
+    }))
+    # Later scrapes with a wider FILESIZE, a new column and stored indexes
+    write_scrape(start_dir, 1, 1, pd.DataFrame({
+        'FILE': ['/job/b', '/job/d'],
+        'HASHEDFILE': ['hb', 'hd'],
+        'FILESIZE': pd.Series([20, 4], dtype='int64'),
+        'SCRAPEID': ['s1', 's1'],
+    }, index=[7, 8]))
+    # Same ENTRYTIME as the last one, so name order decides the tie
+    write_scrape(start_dir, 2, 1, pd.DataFrame({
+        'FILE': ['/job/c', '/job/e'],
+        'HASHEDFILE': ['hc', 'hb'],
+        'FILESIZE': pd.Series([30, 5], dtype='int64'),
+        'SCRAPEID': ['s2', 's2'],
+    }, index=['x', 'y']))
+
+    expected = source_from_start_pandas_dedup(start_dir + os.sep).reset_index(drop=True)
+    result = arrow_source_dedup(start_files(start_dir)).to_pandas()
+    # Strings missing from a scrape come back as None from Arrow and NaN from pandas
+    pd.testing.assert_frame_equal(result.where(result.notna(), np.nan), expected.where(expected.notna(), np.nan))
+    assert expected.set_index('HASHEDFILE')['FILE'].to_dict() == {'ha': '/job/a', 'hb': '/job/e', 'hc': '/job/c', 'hd': '/job/d'}
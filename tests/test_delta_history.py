@@ -0,0 +1,71 @@
+import pandas as pd
+
+from src.aufs.user_tools.fs_meta.delta_history import DeltaHistory
+from src.aufs.user_tools.fs_meta.parquet_tools import ParquetFileWithLock
+
+
+def files(*names):
+    return pd.DataFrame({'FILE': list(names), 'FILESIZE': [len(name) for name in names]})
+
+
+def test_versions_are_rebuilt_from_deltas(tmp_path):
+    history = DeltaHistory(tmp_path / 'source.parquet')
+    history.commit(files('/a', '/b'))
+    entry = history.commit(files('/a', '/b', '/c'))
+    assert 'delta' in entry
+    history.commit(files('/b', '/c', '/d'))
+
+    assert history.read_version(1)['FILE'].tolist() == ['/a', '/b']
+    assert history.read_version(2)['FILE'].tolist() == ['/a', '/b', '/c']
+    assert history.read_version()['FILE'].tolist() == ['/b', '/c', '/d']
+
+
+def test_writes_outside_the_history_are_not_lost(tmp_path):
+    path = tmp_path / 'source.parquet'
+    manager = ParquetFileWithLock(str(path))
+    manager.copy_to_historical_then_replace_parquet_file(files('/a', '/b'))
+    # Written without going through the history
+    manager.write_parquet_file(files('/a', '/b', '/c'))
+    manager.copy_to_historical_then_replace_parquet_file(files('/a', '/b', '/c', '/d'))
+
+    history = DeltaHistory(path)
+    assert history.read_version(2)['FILE'].tolist() == ['/a', '/b', '/c', '/d']
+    assert history.read_version()['FILE'].tolist() == pd.read_parquet(path)['FILE'].tolist()
+
+
+def test_existing_file_is_the_first_version(tmp_path):
+    path = tmp_path / 'source.parquet'
+    files('/a', '/b').to_parquet(path, index=False)
+    history = DeltaHistory(path)
+    entry = history.commit(files('/a', '/b', '/c'))
+
+    assert entry['version'] == 2 and 'delta' in entry
+    assert history.read_version(1)['FILE'].tolist() == ['/a', '/b']
+    assert history.read_version(2)['FILE'].tolist() == ['/a', '/b', '/c']
+
+
+def test_index_is_kept(tmp_path):
+    path = tmp_path / 'source.parquet'
+    df = files('/a', '/b').set_index(pd.Index(['x', 'y'], name='ID'))
+    history = DeltaHistory(path)
+    history.commit(df)
+    history.commit(df.assign(FILESIZE=[5, 6]))
+
+    assert pd.read_parquet(path).index.tolist() == ['x', 'y']
+    assert history.read_version(1).index.tolist() == ['x', 'y']
+    assert history.read_version(2)['FILESIZE'].tolist() == [5, 6]
+
+
+def test_read_as_of_converts_offsets_to_utc(tmp_path):
+    history = DeltaHistory(tmp_path / 'source.parquet')
+    history.commit(files('/a'))
+    history.commit(files('/a', '/b'))
+    versions = history.load_log()
+    versions[0]['time'] = '2026-10-17T07:00:00'
+    versions[1]['time'] = '2026-10-17T09:00:00'
+    history._save_log(versions)
+
+    # 08:00 UTC, before version 2
+    assert history.read_as_of('2026-10-17T10:00:00+02:00')['FILE'].tolist() == ['/a']
+    assert history.read_as_of('2026-10-17T09:30:00')['FILE'].tolist() == ['/a', '/b']
+    assert history.read_as_of(pd.Timestamp('2026-10-17T09:00:00', tz='UTC'))['FILE'].tolist() == ['/a', '/b']
@@ -0,0 +1,48 @@
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.aufs.core.directory_tree import (DirectoryTree, is_encoded_directory_tree, directory_tree_metadata,
+                                          convert_directory_tree_metadata, convert_parquet_directory_tree)
+
+LEGACY_TREE = {
+    'root': [{'id': 'job', 'name': 'job'}],
+    'job': [{'id': 'shot', 'name': 'shot'}, {'id': 'edit', 'name': 'edit'}],
+    'shot': [{'id': 'plates', 'name': 'plates'}],
+}
+
+
+def test_legacy_paths():
+    tree = DirectoryTree.from_legacy(LEGACY_TREE)
+    assert tree.path_of('plates', sep='/') == 'job/shot/plates'
+    assert tree.id_path(tree.node_index('plates'), sep='/') == 'root/job/shot/plates'
+    assert [tree.ids[row] for row in tree.roots()] == ['root']
+    assert sorted(tree.ids[row] for row in tree.leaves()) == ['edit', 'plates']
+
+
+def test_bytes_round_trip():
+    tree = DirectoryTree.from_legacy(LEGACY_TREE)
+    value = tree.to_bytes()
+    assert is_encoded_directory_tree(value)
+    decoded = DirectoryTree.from_bytes(value)
+    assert decoded.to_legacy() == tree.to_legacy() == LEGACY_TREE
+
+
+def test_cycles_are_cut():
+    tree = DirectoryTree.from_legacy({'a': [{'id': 'b', 'name': 'b'}], 'b': [{'id': 'a', 'name': 'a'}], 'r': [{'id': 'a', 'name': 'a'}]})
+    assert tree.path_of('b', sep='/') == 'a/b'
+
+
+def test_metadata_in_either_format(tmp_path):
+    legacy_metadata = {b'directory_tree': json.dumps(LEGACY_TREE).encode('utf-8'), b'other': b'kept'}
+    encoded_metadata = convert_directory_tree_metadata(legacy_metadata)
+    assert is_encoded_directory_tree(encoded_metadata[b'directory_tree'])
+    assert encoded_metadata[b'other'] == b'kept'
+    assert directory_tree_metadata(encoded_metadata) == directory_tree_metadata(legacy_metadata) == LEGACY_TREE
+
+    path = str(tmp_path / 'package.parquet')
+    pq.write_table(pa.table({'a': ['x']}).replace_schema_metadata(legacy_metadata), path)
+    convert_parquet_directory_tree(path)
+    assert directory_tree_metadata(pq.read_schema(path).metadata) == LEGACY_TREE
+    assert pq.read_table(path)['a'].to_pylist() == ['x']
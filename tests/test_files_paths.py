@@ -0,0 +1,39 @@
+from pathlib import Path
+
+import pandas as pd
+
+from src.aufs.user_tools.fs_meta.files_paths import paths_exist, FileStatusChecker
+
+
+def test_paths_exist_matches_os_path_exists(tmp_path):
+    (tmp_path / 'a.exr').write_text('x')
+    (tmp_path / 'broken').symlink_to(tmp_path / 'missing')
+    paths = [str(tmp_path / 'a.exr'), str(tmp_path / 'b.exr'), str(tmp_path / 'broken'), str(tmp_path / 'nope' / 'c'),
+             None, float('nan')]
+    assert paths_exist(paths).tolist() == [True, False, False, False, False, False]
+
+
+def test_path_objects_are_checked(tmp_path):
+    (tmp_path / 'a.exr').write_text('x')
+    assert paths_exist([tmp_path / 'a.exr', Path(tmp_path / 'b.exr'), str(tmp_path / 'a.exr')]).tolist() == [True, False, True]
+
+
+def test_file_status_checker(tmp_path):
+    (tmp_path / 'a.exr').write_text('x')
+    df = pd.DataFrame({'FILE': [tmp_path / 'a.exr', str(tmp_path / 'b.exr')]})
+    assert FileStatusChecker(df).process()['STATUS'].tolist() == ['online', 'offline']
+
+
+def test_mismatched_case_on_case_insensitive_platforms(tmp_path, monkeypatch):
+    from src.aufs.user_tools.fs_meta import files_paths
+
+    (tmp_path / 'a.exr').write_text('x')
+    upper = str(tmp_path / 'A.EXR')
+    real_exists = files_paths.os.path.exists
+    # A case-insensitive filesystem, as macOS's default APFS is
+    monkeypatch.setattr(files_paths.os.path, 'exists', lambda path: real_exists(path) or path == upper)
+
+    monkeypatch.setattr(files_paths.sys, 'platform', 'linux')
+    assert paths_exist([upper]).tolist() == [False]
+    monkeypatch.setattr(files_paths.sys, 'platform', 'darwin')
+    assert paths_exist([upper, str(tmp_path / 'B.EXR')]).tolist() == [True, False]
@@ -0,0 +1,28 @@
+import pandas as pd
+
+from src.aufs.user_tools.fs_meta.fs_info_from_paths import file_details_df_from_path
+
+
+def make_files(directory, names):
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        (directory / name).write_text('x')
+
+
+def test_directory_without_sequences(tmp_path):
+    make_files(tmp_path / 'shot', ['a.mov', 'b.txt', 'c.nk'])
+    df = file_details_df_from_path([str(tmp_path / 'shot')], 'internal', 'staging', pd.DataFrame({'SHOTNAME': []}),
+                                   str(tmp_path / 'details.csv'))
+    assert sorted(df['FILE'].str.rsplit('/', n=1).str[-1]) == ['a.mov', 'b.txt', 'c.nk']
+
+
+def test_batch_without_sequences(tmp_path):
+    # Batches hold whole directories, so with a small batch_size the plain directory is a batch of its own
+    make_files(tmp_path / 'root' / 'plates', [f'plate.{frame:04d}.exr' for frame in range(1001, 1006)])
+    make_files(tmp_path / 'root' / 'edit', ['a.mov', 'b.txt', 'c.nk'])
+    df = file_details_df_from_path([str(tmp_path / 'root')], 'internal', 'staging', pd.DataFrame({'SHOTNAME': []}),
+                                   str(tmp_path / 'details.csv'), batch_size=2)
+    names = df['FILE'].str.rsplit('/', n=1).str[-1]
+    assert {'a.mov', 'b.txt', 'c.nk'} <= set(names)
+    assert df.loc[names == 'plate.%04d.exr', 'FRAMERANGE'].tolist() == ['1001-1005']
+    assert len(pd.read_csv(tmp_path / 'details.csv')) == len(df)
@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+from src.aufs.user_tools.fs_meta.hashing import HashCache, hash_value
+from src.aufs.user_tools.fs_meta.dataframe_meta_work import add_hashedfile_entrytime_columns_noRoot_noSlashes
+
+
+def test_hash_series_matches_hash_value():
+    series = pd.Series(['/a', '/b', '/a', 1, 1.0, None])
+    result = HashCache().hash_series(series)
+    assert list(result) == [hash_value(value) for value in series]
+
+
+def test_cache_drops_oldest_entries_past_max_entries():
+    cache = HashCache(max_entries=3)
+    cache.hash_series(pd.Series(['a', 'b', 'c']))
+    cache.hash_series(pd.Series(['d']))
+    assert list(cache.digests) == ['b', 'c', 'd']
+
+
+def test_cache_is_saved_and_loaded(tmp_path):
+    cache_path = tmp_path / 'hash_cache.parquet'
+    cache = HashCache(cache_path)
+    cache.hash_series(pd.Series(['/x', '/y']))
+    cache.save()
+    assert HashCache(cache_path).digests == cache.digests
+
+
+def test_non_string_paths_raise_rather_than_hash_as_nan():
+    df = pd.DataFrame({'FILE': ['/a/b', 3]})
+    with pytest.raises(AttributeError):
+        add_hashedfile_entrytime_columns_noRoot_noSlashes(df, 'FILE')
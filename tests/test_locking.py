@@ -0,0 +1,110 @@
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from src.aufs.user_tools.fs_meta.locking import FileLock, LockTimeout, lock_path_for, read_lock_owner
+from src.aufs.user_tools.fs_meta.files_paths import Singleton
+from src.aufs.user_tools.fs_meta.parquet_tools import ParquetFileWithSingleton
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Exits 0 if it got the lock, 1 if it timed out
+TRY_LOCK = """
+import sys
+from src.aufs.user_tools.fs_meta.locking import FileLock, LockTimeout
+try:
+    with FileLock(sys.argv[1], timeout=0):
+        pass
+except LockTimeout:
+    sys.exit(1)
+"""
+
+
+def other_process_gets_lock(lock_path):
+    result = subprocess.run([sys.executable, '-c', TRY_LOCK, lock_path], cwd=REPO_ROOT)
+    return result.returncode == 0
+
+
+def test_lock_kept_after_another_thread_times_out(tmp_path):
+    lock_path = lock_path_for(tmp_path / 'source.parquet')
+    with FileLock(lock_path):
+        errors = []
+
+        def wait_for_lock():
+            try:
+                FileLock(lock_path, timeout=0.1).acquire()
+            except LockTimeout as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=wait_for_lock)
+        thread.start()
+        thread.join()
+        assert errors and f"pid {os.getpid()}" in str(errors[0])
+        assert not other_process_gets_lock(lock_path)
+
+    assert other_process_gets_lock(lock_path)
+
+
+def test_lock_kept_after_check_lock(tmp_path):
+    target = str(tmp_path / 'source.parquet')
+    writer = Singleton(target, lock_path=lock_path_for(target))
+    assert writer.acquire_lock()
+    try:
+        assert Singleton(target, lock_path=lock_path_for(target)).check_lock()
+        assert read_lock_owner(writer.lock_file)['pid'] == os.getpid()
+        assert not other_process_gets_lock(writer.lock_file)
+    finally:
+        writer.release_lock()
+    assert read_lock_owner(writer.lock_file) is None
+
+
+def test_shared_locks_exclude_writers(tmp_path):
+    lock_path = lock_path_for(tmp_path / 'source.parquet')
+    with FileLock(lock_path, shared=True), FileLock(lock_path, shared=True):
+        with pytest.raises(LockTimeout):
+            FileLock(lock_path, timeout=0).acquire()
+
+
+def test_parquet_writers_share_the_lock_next_to_the_file(tmp_path):
+    target = str(tmp_path / 'source.parquet')
+    assert ParquetFileWithSingleton(target).lock.lock_file == lock_path_for(target)
+
+
+# Holds the lock until stdin closes
+HOLD_LOCK = """
+import sys
+from src.aufs.user_tools.fs_meta.locking import FileLock
+with FileLock(sys.argv[1], timeout=0):
+    print('locked', flush=True)
+    sys.stdin.read()
+"""
+
+
+def test_forced_singleton_takes_the_lock(tmp_path):
+    target = str(tmp_path / 'source.parquet')
+    holder = subprocess.Popen([sys.executable, '-c', HOLD_LOCK, lock_path_for(target)], cwd=REPO_ROOT,
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == 'locked'
+        assert not Singleton(target, lock_path=lock_path_for(target)).acquire_lock()
+
+        writer = Singleton(target, force=True, lock_path=lock_path_for(target))
+        assert writer.acquire_lock()
+        try:
+            assert writer.lock.held
+            assert read_lock_owner(writer.lock_file)['pid'] == os.getpid()
+            assert not other_process_gets_lock(writer.lock_file)
+        finally:
+            writer.release_lock()
+    finally:
+        holder.communicate('')
+
+
+def test_forced_singleton_waits_for_threads_of_this_process(tmp_path):
+    target = str(tmp_path / 'source.parquet')
+    with FileLock(lock_path_for(target)):
+        assert not Singleton(target, force=True, lock_path=lock_path_for(target)).acquire_lock()
+        assert not other_process_gets_lock(lock_path_for(target))
@@ -0,0 +1,51 @@
+import os
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.aufs.user_tools.fs_meta.parquet_lookup import lookup_rows, candidate_row_groups, lookup_index_path, _load_blooms
+from src.aufs.user_tools.fs_meta.parquet_tools import df_write_to_pq
+from src.aufs.user_tools.fs_meta.files_paths import FileStatusChecker
+
+
+def write_source(path, files):
+    df = pd.DataFrame({'FILE': files, 'FILESIZE': range(len(files))})
+    df_write_to_pq(df, str(path), row_group_size=10, index_columns=['FILE'])
+
+
+def test_lookup_reads_only_matching_row_groups(tmp_path):
+    source = tmp_path / 'source.parquet'
+    files = [f'/job/shot/file_{i:03d}' for i in range(100)]
+    write_source(source, files)
+
+    df = lookup_rows(str(source), 'FILE', ['/job/shot/file_042', '/job/shot/missing'])
+    assert df['FILE'].tolist() == ['/job/shot/file_042']
+    _, row_groups = candidate_row_groups(str(source), 'FILE', ['/job/shot/file_042'])
+    assert row_groups == [4]
+
+
+def test_index_of_an_older_file_is_ignored(tmp_path):
+    source = tmp_path / 'source.parquet'
+    index = lookup_index_path(str(source))
+    write_source(source, [f'/a/{i:03d}' for i in range(20)])
+    old_index = open(index, 'rb').read()
+    old_size = os.path.getsize(source)
+
+    # Same rows, row groups and size, but not the same file, with the older file's index left behind
+    write_source(source, [f'/b/{i:03d}' for i in range(20)])
+    assert os.path.getsize(source) == old_size
+    with open(index, 'wb') as f:
+        f.write(old_index)
+
+    assert _load_blooms(str(source), pq.ParquetFile(source), 'FILE') is None
+    assert lookup_rows(str(source), 'FILE', '/b/005')['FILE'].tolist() == ['/b/005']
+
+
+def test_file_status_from_parquet(tmp_path):
+    present = tmp_path / 'present.exr'
+    present.write_text('x')
+    source = tmp_path / 'source.parquet'
+    write_source(source, [str(present), str(tmp_path / 'gone.exr'), str(tmp_path / 'other.exr')])
+
+    df = FileStatusChecker.from_parquet(str(source), [str(present), str(tmp_path / 'gone.exr')], columns=['FILE']).process()
+    assert dict(zip(df['FILE'], df['STATUS'])) == {str(present): 'online', str(tmp_path / 'gone.exr'): 'offline'}
@@ -0,0 +1,48 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.aufs.core.schema_layout import (NODE_LAYOUT, WIDE_LAYOUT, schema_layout, to_node_layout, to_wide_layout,
+                                         read_wide_fields, convert_parquet_layout)
+
+
+def wide_table():
+    fields = [
+        pa.field('tree_root', pa.string()),
+        pa.field('0-1-dir', pa.string()),
+        pa.field('plate.exr-file', pa.string(), metadata={'HASHEDFILE': 'abc'}),
+    ]
+    return pa.Table.from_arrays([
+        pa.array(['linux script', 'windows script', 'mac script']),
+        pa.nulls(3, pa.string()),
+        pa.array(['/a', None, '/b']),
+    ], schema=pa.schema(fields, metadata={b'directory_tree': b'{}'}))
+
+
+def test_round_trip():
+    table = wide_table()
+    nodes = to_node_layout(table)
+    assert schema_layout(nodes.schema.metadata) == NODE_LAYOUT
+    assert nodes.column('FIELD').to_pylist() == ['tree_root', '0-1-dir', 'plate.exr-file']
+
+    wide = to_wide_layout(nodes)
+    assert schema_layout(wide.schema.metadata) == WIDE_LAYOUT
+    assert wide.equals(table, check_metadata=True)
+
+
+def test_more_fields_than_rows():
+    table = pa.table({f'{i}-{i + 1}-dir': pa.nulls(1, pa.string()) for i in range(5)})
+    assert to_wide_layout(to_node_layout(table)).equals(table)
+
+
+def test_convert_file_and_read_fields(tmp_path):
+    path = str(tmp_path / 'package.parquet')
+    pq.write_table(wide_table(), path)
+    convert_parquet_layout(path, NODE_LAYOUT)
+    assert schema_layout(pq.read_schema(path).metadata) == NODE_LAYOUT
+
+    fields = read_wide_fields(path)
+    assert [field.name for field in fields] == ['tree_root', '0-1-dir', 'plate.exr-file']
+    assert fields[2].metadata == {b'HASHEDFILE': b'abc'}
+
+    convert_parquet_layout(path, WIDE_LAYOUT)
+    assert pq.read_table(path).equals(wide_table())
@@ -0,0 +1,61 @@
+import os
+import time
+
+import pandas as pd
+
+from src.aufs.user_tools.fs_meta.parquet_get_fs_data_for_source import FileSystemScraper, SCRAPE_EXCLUDE_PATTERNS
+from src.aufs.user_tools.fs_meta.parquet_tools import df_write_to_pq
+from src.aufs.user_tools.fs_meta.scrape_manifest import scrape_manifest_path, load_scrape_manifest, write_scrape_manifest
+
+
+def make_files(directory, names):
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        (directory / name).write_text('x')
+
+
+def age_directories(root, seconds=3600):
+    # Older than MTIME_GRACE_NS, so the manifest trusts their mtimes
+    past = time.time() - seconds
+    for dir_path, _, _ in os.walk(root):
+        os.utime(dir_path, (past, past))
+
+
+def scrape_with_manifest(scraper, root, tmp_path, snapshot_name):
+    # As defaultScrapeToParquet.scrape_and_prepare_data does, without the hashing
+    manifest_path = scrape_manifest_path(str(tmp_path / 'manifests'), [str(root)], SCRAPE_EXCLUDE_PATTERNS)
+    previous_dirs, metadata = load_scrape_manifest(manifest_path)
+    scrape_start_ns = time.time_ns()
+    df, blocks = scraper.scrape_directories_incremental([str(root)], previous_dirs, metadata.get('SNAPSHOT'))
+    snapshot = str(tmp_path / 'start' / snapshot_name)
+    os.makedirs(os.path.dirname(snapshot), exist_ok=True)
+    df_write_to_pq(df, snapshot)
+    write_scrape_manifest(manifest_path, blocks, scrape_start_ns, metadata={'SNAPSHOT': snapshot})
+    return df, blocks
+
+
+def test_rescrape_matches_full_scrape(tmp_path):
+    root = tmp_path / 'job'
+    make_files(root / 'shot_a', ['a.exr', 'b.exr', 'old.nk'])
+    make_files(root / 'shot_b' / 'comp', ['c.exr', 'd.exr'])
+    make_files(root / 'shot_b' / 'data' / 'thumbs', ['c.jpg'])
+    age_directories(root)
+
+    scraper = FileSystemScraper(max_workers=2)
+    first_df, _ = scrape_with_manifest(scraper, root, tmp_path, 'first.parquet')
+    pd.testing.assert_frame_equal(first_df, scraper.scrape_directories([str(root)]))
+    assert not first_df['FILE'].str.contains('/thumbs/').any()
+
+    # One directory changes, and the excluded subtree changes without being scraped
+    make_files(root / 'shot_a', ['new.nk'])
+    os.remove(root / 'shot_a' / 'old.nk')
+    make_files(root / 'shot_b' / 'data' / 'thumbs', ['d.jpg'])
+
+    df, blocks = scrape_with_manifest(scraper, root, tmp_path, 'second.parquet')
+    relisted = [dir_path for dir_path, found, _, _, _ in blocks if found is not None]
+    assert relisted == [str(root / 'shot_a')]
+
+    pd.testing.assert_frame_equal(df, scraper.scrape_directories([str(root)]))
+    names = set(df['FILE'].str.rsplit('/', n=1).str[-1])
+    assert 'new.nk' in names and 'old.nk' not in names
+    assert not df['FILE'].str.contains('/thumbs/').any()
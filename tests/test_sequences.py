@@ -0,0 +1,21 @@
+import pandas as pd
+
+from src.aufs.user_tools.fs_meta.sequences import sequence_frame_summary
+
+
+def test_frame_summary_runs_and_missing_frames():
+    names = pd.Series(['shot.%04d.exr'] * 5)
+    positions = pd.Series(['1', '2', '3', '5', '5'])
+    summary = sequence_frame_summary(names, positions).iloc[0]
+    assert summary['SEQUENCEPOSITION'] == [1, 2, 3, 5]
+    assert (summary['FIRSTFRAME'], summary['LASTFRAME']) == ('1', '5')
+    assert summary['MISSINGFRAMES'] == '4'
+
+
+def test_frame_summary_without_digit_frames():
+    names = pd.Series(['', '', 'shot.%04d.exr'])
+    positions = pd.Series(['', None, 'abc'])
+    summary = sequence_frame_summary(names, positions)
+    assert list(summary['SEQUENCENAME']) == ['', 'shot.%04d.exr']
+    assert list(summary['SEQUENCEPOSITION']) == [[], []]
+    assert list(summary['FRAMERANGE']) == ['', '']
@@ -0,0 +1,45 @@
+import pandas as pd
+
+from src.aufs.user_tools.fs_meta.source_dataset import (write_source_dataset, read_source_dataset,
+                                                        source_dataset_partitions)
+from src.aufs.user_tools.fs_meta.parquet_tools import source_create_and_or_read
+from src.aufs.user_tools.fs_meta.spark_tools import intranet_delete_entries_from_source_main_arrow
+
+
+def source_rows():
+    return pd.DataFrame({
+        'CLIENT': 'acme',
+        'PROJECT': 'film',
+        'SHOTNAME': ['0010', '0010', '0020', '0020'],
+        'FILE': ['/0010/a.exr', '/0010/b.nk', '/0020/c.exr', '/0020/d.nk'],
+        'SEQUENCENAME': ['/0010/a.%04d.exr', '', '/0020/c.%04d.exr', ''],
+    })
+
+
+def test_shot_reads_touch_one_partition(tmp_path):
+    dataset_dir = str(tmp_path / 'source_main')
+    write_source_dataset(source_rows(), dataset_dir)
+
+    assert source_dataset_partitions(dataset_dir)['SHOTNAME'].tolist() == ['0010', '0020']
+    df = read_source_dataset(dataset_dir, shotname='0010', filters=[('FILE', '==', '/0010/b.nk')])
+    assert df['FILE'].tolist() == ['/0010/b.nk']
+    assert df['SHOTNAME'].tolist() == ['0010']
+    assert source_create_and_or_read(dataset_dir, shotname='0020', columns=['FILE'])['FILE'].tolist() == ['/0020/c.exr', '/0020/d.nk']
+
+
+def test_single_file_reads_push_filters_down(tmp_path):
+    path = str(tmp_path / 'source_main.parquet')
+    source_rows().to_parquet(path, index=False)
+    assert source_create_and_or_read(path, shotname='0010')['FILE'].tolist() == ['/0010/a.exr', '/0010/b.nk']
+    assert len(source_create_and_or_read(path)) == 4
+
+
+def test_intranet_deletes_only_rewrite_their_shots(tmp_path):
+    dataset_dir = str(tmp_path / 'source_main')
+    write_source_dataset(source_rows(), dataset_dir)
+    deletes = pd.DataFrame({'CLIENT': ['acme'], 'PROJECT': ['film'], 'SHOTNAME': ['0010'],
+                            'FILE': ['/0010/b.nk'], 'SEQUENCENAME': ['/0010/a.%04d.exr']})
+    intranet_delete_entries_from_source_main_arrow(deletes, dataset_dir)
+
+    assert sorted(read_source_dataset(dataset_dir)['FILE']) == ['/0020/c.exr', '/0020/d.nk']
+    assert source_dataset_partitions(dataset_dir)['SHOTNAME'].tolist() == ['0020']
@@ -0,0 +1,32 @@
+import os
+
+import pandas as pd
+
+from src.aufs.user_tools.fs_meta.source_dedup import full_source_dedup, incremental_source_dedup, verify_incremental_dedup
+
+
+def write_scrape(start_dir, number, rows):
+    df = pd.DataFrame(rows, columns=['FILE', 'HASHEDFILE', 'FILESIZE'])
+    df['ENTRYTIME'] = pd.Timestamp('2026-01-01') + pd.Timedelta(minutes=number)
+    df.to_parquet(os.path.join(start_dir, f"20260101{number:06d}-scrape{number}.parquet"), index=False)
+
+
+def test_incremental_dedup_matches_full_dedup(tmp_path, capsys):
+    start_dir = str(tmp_path / 'start')
+    state_dir = str(tmp_path / 'state')
+    os.makedirs(start_dir)
+
+    write_scrape(start_dir, 0, [('/job/a', 'ha', 1), ('/job/b', 'hb', 1)])
+    write_scrape(start_dir, 1, [('/job/c', 'hc', 1), ('/job/b', 'hb', 2)])
+    first = incremental_source_dedup(start_dir, state_dir)
+    pd.testing.assert_frame_equal(first, full_source_dedup(start_dir))
+
+    # Second round: a HASHEDFILE already in the index comes back, plus a new one
+    write_scrape(start_dir, 2, [('/job/a', 'ha', 3), ('/job/d', 'hd', 1)])
+    second = incremental_source_dedup(start_dir, state_dir)
+    assert 'rebuilding' not in capsys.readouterr().out
+    pd.testing.assert_frame_equal(second, full_source_dedup(start_dir))
+
+    assert second['HASHEDFILE'].tolist() == ['ha', 'hb', 'hc', 'hd']
+    assert second.set_index('HASHEDFILE')['FILESIZE'].to_dict() == {'ha': 3, 'hb': 2, 'hc': 1, 'hd': 1}
+    assert verify_incremental_dedup(start_dir, state_dir)
@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.aufs.user_tools.fs_meta.start_compaction import compact_start_files
+from src.aufs.user_tools.fs_meta.start_manifest import read_start_rows
+from src.aufs.user_tools.fs_meta.source_dedup import start_files, full_source_dedup
+
+
+def write_scrape(start_dir, number, files):
+    df = pd.DataFrame({
+        'FILE': files,
+        'HASHEDFILE': [str(file) for file in files],
+        'ENTRYTIME': pd.Timestamp('2026-01-01') + pd.Timedelta(minutes=number),
+    })
+    path = os.path.join(start_dir, f"20260101{number:06d}-scrape{number}.parquet")
+    df.to_parquet(path, index=False)
+    return path
+
+
+def test_compaction_keeps_rows_and_dedup(tmp_path):
+    start_dir = str(tmp_path)
+    paths = [write_scrape(start_dir, number, [f'/job/{number}/a', '/job/shared']) for number in range(4)]
+    before = full_source_dedup(start_dir)
+
+    result = compact_start_files(start_dir, grace_seconds=0)
+    assert result['replaced'] == 4 and len(start_files(start_dir)) == 1
+    assert read_start_rows(paths[2])['FILE'].tolist() == ['/job/2/a', '/job/shared']
+    pd.testing.assert_frame_equal(full_source_dedup(start_dir), before)
+
+
+def test_files_that_wont_unify_are_left_alone(tmp_path):
+    start_dir = str(tmp_path)
+    scrapes = {write_scrape(start_dir, number, [f'/job/{number}/a']): f'/job/{number}/a' for number in (0, 1, 3, 4)}
+    # An empty scrape whose FILE column came out as double
+    odd = write_scrape(start_dir, 2, [np.nan])
+
+    result = compact_start_files(start_dir, grace_seconds=3600)
+    assert result['replaced'] == 4 and len(result['compacted']) == 2
+    assert odd in start_files(start_dir)
+    for path, file in scrapes.items():
+        assert read_start_rows(path)['FILE'].tolist() == [file]